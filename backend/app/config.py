@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 class Settings(BaseSettings):
     mongodb_url: str = "mongodb://localhost:27017"
@@ -7,6 +8,46 @@ class Settings(BaseSettings):
     secret_key: str = "your-super-secret-key-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    jwt_backend: str = "jose"  # "jose" or "pyjwt" (needs PyJWT installed)
+    token_cache_max_bytes: int = 8 * 1024 * 1024
+    key_cache_size: int = 10000
+    key_cache_ttl_seconds: float = 30.0
+    key_cache_sync_seconds: float = 1.0  # how often workers pick up each other's key/user/plan changes
+    user_cache_size: int = 10000
+    user_cache_ttl_seconds: float = 15.0
+    rate_limit_scope: str = "user"  # "user" or "key"
+    rate_limit_max_buckets: int = 100000
+    rate_limit_backend: str = "memory"  # "memory" (per process) or "mongo" (shared)
+    rate_limit_lease_size: int = 10
+    usage_queue_size: int = 10000
+    usage_batch_size: int = 500
+    usage_flush_interval_seconds: float = 1.0
+    usage_stream_interval_seconds: float = 1.0  # at most one live update per user per interval
+    usage_stream_queue_size: int = 4
+    usage_stream_refresh_seconds: float = 30.0
+    usage_logs_timeseries: bool = False  # only applies when usage_logs is first created
+    usage_logs_ttl_days: Optional[int] = None  # None keeps raw events forever
+    usage_archive_dir: str = "usage_archive"  # written by scripts/export_usage.py
+    quota_lease_size: int = 10  # 1 = exact, one round trip per request
+    quota_reconcile_interval_seconds: float = 30.0
+    quota_sweep_interval_seconds: float = 300.0
+    quota_sweep_batch_size: int = 100
+    quota_sweep_pause_seconds: float = 1.0
+    upstream_timeout_seconds: float = 10.0
+    upstream_max_connections: int = 100
+    upstream_max_keepalive_connections: int = 20
+    upstream_keepalive_expiry_seconds: float = 30.0
+    service_registry_refresh_seconds: float = 10.0
+    response_cache_size: int = 10000
+    response_cache_max_bytes: int = 64 * 1024 * 1024
+    response_cache_stale_seconds: float = 30.0
+    weather_data_path: Optional[str] = None  # built by scripts/build_weather_index.py
+    geoip_data_path: Optional[str] = None  # built by scripts/build_geoip_index.py
+    geoip_cache_size: int = 100000
+    geoip_cache_ttl_seconds: float = 3600.0
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_max_waiting: int = 256
 
     class Config:
         env_file = ".env"
@@ -1,5 +1,6 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.config import settings
+from app.utils.usage_storage import ensure_usage_logs
 
 client: AsyncIOMotorClient = None
 db = None
@@ -12,10 +13,18 @@ async def connect_db():
     # Create indexes
     await db.users.create_index("email", unique=True)
     await db.api_keys.create_index("prefix", unique=True)
+    await db.api_keys.create_index("key_hash", unique=True)
     await db.api_keys.create_index("user_id")
-    await db.usage_logs.create_index([("user_id", 1), ("timestamp", -1)])
-    await db.usage_logs.create_index([("api_key_id", 1), ("timestamp", -1)])
+    await ensure_usage_logs(db, settings.usage_logs_timeseries, settings.usage_logs_ttl_days)
     await db.subscriptions.create_index("user_id", unique=True)
+    await db.subscriptions.create_index("reset_at")
+    await db.usage_periods.create_index([("user_id", 1), ("period_end", -1)])
+    await db.services.create_index("name", unique=True)
+    await db.key_cache_invalidations.create_index("at", expireAfterSeconds=3600)
+    await db.usage_daily.create_index([("user_id", 1), ("day", 1), ("endpoint", 1)], unique=True)
+    await db.usage_daily_global.create_index([("day", 1), ("endpoint", 1)], unique=True)
+    if settings.rate_limit_backend == "mongo":
+        await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
 
 async def close_db():
     global client
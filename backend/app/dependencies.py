@@ -1,11 +1,30 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from app.utils.security import decode_token
+from app.utils.cache import TTLCache
 from app.database import get_db
+from app.config import settings
 from bson import ObjectId
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Principals by user id; suspend/activate invalidate, the TTL bounds staleness across workers
+principal_cache = TTLCache(settings.user_cache_size, settings.user_cache_ttl_seconds)
+
+async def load_principal(user_id: str):
+    db = get_db()
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"password_hash": 0})
+    if user is None:
+        return None
+    
+    return {
+        "id": str(user["_id"]),
+        "email": user["email"],
+        "role": user["role"],
+        "is_active": user["is_active"],
+        "created_at": user["created_at"]
+    }
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -20,20 +39,17 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     if user_id is None:
         raise credentials_exception
     
-    db = get_db()
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    user = principal_cache.get(user_id)
     if user is None:
-        raise credentials_exception
+        user = await load_principal(user_id)
+        if user is None:
+            raise credentials_exception
+        principal_cache.set(user_id, user)
     
     if not user.get("is_active", True):
         raise HTTPException(status_code=403, detail="User is suspended")
     
-    return {
-        "id": str(user["_id"]),
-        "email": user["email"],
-        "role": user["role"],
-        "is_active": user["is_active"]
-    }
+    return user
 
 async def require_admin(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "admin":
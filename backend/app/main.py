@@ -2,12 +2,32 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.database import connect_db, close_db
+from app.utils.metering import usage_recorder
+from app.utils.usage_stream import usage_stream
+from app.utils.quota import quota_leaser, quota_sweeper
+from app.utils.proxy import upstream_pool
+from app.utils.service_registry import service_registry
+from app.utils.gateway import GatewayMiddleware
+from app.utils.key_cache import key_invalidations
 from app.routers import auth, api_keys, plans, subscriptions, usage, services, admin
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_db()
+    await usage_recorder.start()
+    await usage_stream.start()
+    await quota_leaser.start()
+    await quota_sweeper.start()
+    await service_registry.start()
+    await key_invalidations.start()
     yield
+    await key_invalidations.stop()
+    await service_registry.stop()
+    await upstream_pool.close()
+    await quota_sweeper.stop()
+    await usage_stream.stop()
+    await usage_recorder.stop()
+    await quota_leaser.stop()
     await close_db()
 
 app = FastAPI(
@@ -17,12 +37,16 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Added first so CORS wraps it and applies to the gateway's own rejections
+app.add_middleware(GatewayMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://localhost:3000"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset", "Retry-After", "X-Next-Cursor"],
 )
 
 # Include routers
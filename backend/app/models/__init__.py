@@ -2,4 +2,8 @@ from app.models.user import UserCreate, UserLogin, UserResponse, UserInDB, Token
 from app.models.api_key import APIKeyCreate, APIKeyResponse, APIKeyCreated, APIKeyInDB
 from app.models.plan import PlanCreate, PlanUpdate, PlanResponse, PlanInDB
 from app.models.subscription import SubscriptionCreate, SubscriptionResponse, SubscriptionInDB
-from app.models.usage import UsageLog, UsageStats
+from app.models.usage import UsageLog, UsageStats, UsageBreakdown, UsageArchive
+from app.models.service import ServiceCreate, ServiceResponse, ServiceInDB, ServiceCall, ServiceBatch
+from app.models.currency import Conversion, ConversionBatch, ConversionResult, ConversionBatchResponse
+from app.models.weather import WeatherReport, WeatherBulkRequest, WeatherBulkResponse
+from app.models.geoip import IPLocation, IPLookupBatch, IPLookupBatchResponse
@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+MAX_BATCH_CONVERSIONS = 1000
+
+class Conversion(BaseModel):
+    base: str
+    target: str
+    amount: float = 1.0
+
+class ConversionBatch(BaseModel):
+    items: List[Conversion] = Field(..., min_length=1, max_length=MAX_BATCH_CONVERSIONS)
+
+class ConversionResult(Conversion):
+    rate: float
+    converted: float
+
+class ConversionBatchResponse(BaseModel):
+    results: List[ConversionResult]
@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+MAX_BATCH_IPS = 1000
+
+class IPLocation(BaseModel):
+    ip: str
+    country: Optional[str] = None
+    city: Optional[str] = None
+    isp: Optional[str] = None
+    timezone: Optional[str] = None
+
+class IPLookupBatch(BaseModel):
+    ips: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_IPS)
+
+class IPLookupBatchResponse(BaseModel):
+    results: List[IPLocation]
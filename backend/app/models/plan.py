@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 class PlanCreate(BaseModel):
@@ -7,12 +7,14 @@ class PlanCreate(BaseModel):
     monthly_limit: int
     rate_limit_per_minute: int
     allowed_services: List[str]
+    batch_metering: Literal["call", "item"] = "call"  # batch endpoints charge once or per item
 
 class PlanUpdate(BaseModel):
     name: Optional[str] = None
     monthly_limit: Optional[int] = None
     rate_limit_per_minute: Optional[int] = None
     allowed_services: Optional[List[str]] = None
+    batch_metering: Optional[Literal["call", "item"]] = None
 
 class PlanResponse(BaseModel):
     id: str
@@ -20,6 +22,7 @@ class PlanResponse(BaseModel):
     monthly_limit: int
     rate_limit_per_minute: int
     allowed_services: List[str]
+    batch_metering: str = "call"
     created_at: datetime
 
 class PlanInDB(BaseModel):
@@ -27,4 +30,5 @@ class PlanInDB(BaseModel):
     monthly_limit: int
     rate_limit_per_minute: int
     allowed_services: List[str]
+    batch_metering: str = "call"
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from datetime import datetime
+
+class ServiceCreate(BaseModel):
+    description: str = ""
+    handler: Optional[str] = None  # built-in handler name
+    upstream: Optional[str] = None  # base URL to proxy to
+    timeout_seconds: Optional[float] = None
+    cache_ttl_seconds: int = 0
+    enabled: bool = True
+
+class ServiceResponse(ServiceCreate):
+    name: str
+    updated_at: datetime
+
+class ServiceInDB(ServiceCreate):
+    name: str
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+MAX_BATCH_CALLS = 100
+
+class ServiceCall(BaseModel):
+    id: Optional[str] = None  # echoed back so clients can match results
+    service: str
+    path: str = ""
+    params: Dict[str, str] = {}
+
+class ServiceBatch(BaseModel):
+    requests: List[ServiceCall] = Field(..., min_length=1, max_length=MAX_BATCH_CALLS)
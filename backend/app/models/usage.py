@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional
 
 class UsageLog(BaseModel):
     user_id: str
@@ -8,6 +8,15 @@ class UsageLog(BaseModel):
     endpoint: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     status_code: int
+    items: int = 1  # batch calls record how many items they carried
+
+class UsageArchive(BaseModel):
+    file: str
+    start: datetime
+    end: datetime
+    rows: int
+    bytes: int
+    created_at: datetime
 
 class UsageStats(BaseModel):
     total_requests: int
@@ -15,3 +24,9 @@ class UsageStats(BaseModel):
     failed_requests: int
     requests_by_endpoint: dict
     requests_by_day: dict
+
+class UsageBreakdown(BaseModel):
+    total_requests: int
+    successful_requests: int
+    failed_requests: int
+    breakdown: Dict[str, Dict[str, int]]
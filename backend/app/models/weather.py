@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+MAX_BULK_CITIES = 1000
+
+class WeatherReport(BaseModel):
+    city: str
+    temp: int
+    condition: str
+
+class WeatherBulkRequest(BaseModel):
+    cities: List[str] = Field(..., min_length=1, max_length=MAX_BULK_CITIES)
+
+class WeatherBulkResponse(BaseModel):
+    results: List[WeatherReport]
+    not_found: List[str]
@@ -1,26 +1,69 @@
-from fastapi import APIRouter, HTTPException, Depends
-from app.models import UserResponse
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.responses import FileResponse
+from app.models import UserResponse, ServiceCreate, ServiceResponse, UsageArchive
 from app.database import get_db
-from app.dependencies import require_admin
+from app.dependencies import require_admin, principal_cache
+from app.utils.key_cache import key_cache, key_invalidations
+from app.utils.rate_limit import rate_limiter
+from app.utils.metering import usage_recorder
+from app.utils.quota import quota_leaser, quota_sweeper
+from app.utils.proxy import upstream_pool
+from app.utils.service_registry import service_registry
+from app.utils.response_cache import response_cache
+from app.utils.builtin_services import BUILTIN_HANDLERS, currency_rates, weather_index, geoip
+from datetime import datetime
+from app.utils.security import password_hasher, token_cache
+from app.utils.pagination import paginate, stream_ndjson
+from app.utils.usage_archive import usage_archive
+from app.utils.usage_stream import usage_stream
 from bson import ObjectId
-from typing import List
+from typing import List, Optional
 
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
 
+USER_FIELDS = {"email": 1, "role": 1, "is_active": 1, "created_at": 1}
+KEY_FIELDS = {
+    "user_id": 1, "name": 1, "prefix": 1, "allowed_services": 1,
+    "is_active": 1, "created_at": 1, "expires_at": 1
+}
+
+def _user_item(u: dict) -> dict:
+    return {
+        "id": str(u["_id"]),
+        "email": u["email"],
+        "role": u["role"],
+        "is_active": u["is_active"],
+        "created_at": u["created_at"]
+    }
+
+def _key_item(k: dict) -> dict:
+    return {
+        "id": str(k["_id"]),
+        "user_id": k["user_id"],
+        "name": k["name"],
+        "prefix": k["prefix"],
+        "allowed_services": k["allowed_services"],
+        "is_active": k["is_active"],
+        "created_at": k["created_at"],
+        "expires_at": k.get("expires_at")
+    }
+
 @router.get("/users", response_model=List[UserResponse])
-async def list_users(_: dict = Depends(require_admin)):
+async def list_users(
+    response: Response,
+    after: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    output: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    _: dict = Depends(require_admin)
+):
     db = get_db()
-    users = await db.users.find().to_list(1000)
-    
-    return [
-        UserResponse(
-            id=str(u["_id"]),
-            email=u["email"],
-            role=u["role"],
-            is_active=u["is_active"],
-            created_at=u["created_at"]
-        ) for u in users
-    ]
+    
+    if output == "ndjson":
+        return stream_ndjson(db.users, {}, USER_FIELDS, after, _user_item)
+    
+    users = await paginate(db.users, {}, USER_FIELDS, after, limit, response)
+    
+    return [UserResponse(**_user_item(u)) for u in users]
 
 @router.post("/users/{user_id}/suspend")
 async def suspend_user(user_id: str, _: dict = Depends(require_admin)):
@@ -34,11 +77,14 @@ async def suspend_user(user_id: str, _: dict = Depends(require_admin)):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    principal_cache.pop(user_id)
+    
     # Also deactivate all their API keys
     await db.api_keys.update_many(
         {"user_id": user_id},
         {"$set": {"is_active": False}}
     )
+    await key_invalidations.invalidate_user(user_id)
     
     return {"message": "User suspended"}
 
@@ -54,25 +100,26 @@ async def activate_user(user_id: str, _: dict = Depends(require_admin)):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    principal_cache.pop(user_id)
+    
     return {"message": "User activated"}
 
 @router.get("/keys", response_model=list)
-async def list_all_keys(_: dict = Depends(require_admin)):
+async def list_all_keys(
+    response: Response,
+    after: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    output: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    _: dict = Depends(require_admin)
+):
     db = get_db()
-    keys = await db.api_keys.find().to_list(1000)
-    
-    return [
-        {
-            "id": str(k["_id"]),
-            "user_id": k["user_id"],
-            "name": k["name"],
-            "prefix": k["prefix"],
-            "allowed_services": k["allowed_services"],
-            "is_active": k["is_active"],
-            "created_at": k["created_at"],
-            "expires_at": k.get("expires_at")
-        } for k in keys
-    ]
+    
+    if output == "ndjson":
+        return stream_ndjson(db.api_keys, {}, KEY_FIELDS, after, _key_item)
+    
+    keys = await paginate(db.api_keys, {}, KEY_FIELDS, after, limit, response)
+    
+    return [_key_item(k) for k in keys]
 
 @router.post("/keys/{key_id}/revoke")
 async def admin_revoke_key(key_id: str, _: dict = Depends(require_admin)):
@@ -86,4 +133,85 @@ async def admin_revoke_key(key_id: str, _: dict = Depends(require_admin)):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="API key not found")
     
+    await key_invalidations.invalidate_key(key_id)
+    
     return {"message": "API key revoked"}
+
+@router.get("/metrics")
+async def get_metrics(_: dict = Depends(require_admin)):
+    return {
+        "key_cache": key_cache.stats(),
+        "key_invalidations": key_invalidations.stats(),
+        "principal_cache": principal_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "usage_recorder": usage_recorder.stats(),
+        "usage_stream": usage_stream.stats(),
+        "quota_leaser": quota_leaser.stats(),
+        "quota_sweeper": quota_sweeper.stats(),
+        "upstreams": upstream_pool.stats(),
+        "service_registry": service_registry.stats(),
+        "response_cache": response_cache.stats(),
+        "currency_rates": currency_rates.stats(),
+        "weather_index": weather_index.stats(),
+        "geoip": geoip.stats(),
+        "password_hasher": password_hasher.stats()
+    }
+
+@router.get("/services", response_model=List[ServiceResponse])
+async def list_services(_: dict = Depends(require_admin)):
+    db = get_db()
+    services = await db.services.find().to_list(1000)
+    return [ServiceResponse(**s) for s in services]
+
+@router.put("/services/{name}", response_model=ServiceResponse)
+async def upsert_service(name: str, service: ServiceCreate, _: dict = Depends(require_admin)):
+    if service.handler is None and not service.upstream:
+        raise HTTPException(status_code=400, detail="Service needs a handler or an upstream")
+    if service.handler is not None and service.handler not in BUILTIN_HANDLERS:
+        raise HTTPException(status_code=400, detail=f"Unknown handler: {service.handler}")
+    
+    db = get_db()
+    service_doc = {**service.model_dump(), "name": name, "updated_at": datetime.utcnow()}
+    await db.services.update_one({"name": name}, {"$set": service_doc}, upsert=True)
+    await service_registry.changed()
+    
+    return ServiceResponse(**service_doc)
+
+@router.delete("/services/{name}")
+async def delete_service(name: str, _: dict = Depends(require_admin)):
+    db = get_db()
+    
+    result = await db.services.delete_one({"name": name})
+    
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Service not found")
+    
+    await service_registry.changed()
+    
+    return {"message": "Service deleted"}
+
+@router.post("/datasets/reload")
+async def reload_datasets(_: dict = Depends(require_admin)):
+    """Re-open the on-disk lookup datasets on this worker"""
+    try:
+        weather_index.reload()
+        geoip.reload()
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
+    response_cache.clear()
+    
+    return {"weather": weather_index.stats(), "geoip": geoip.stats()}
+
+@router.get("/usage-archives", response_model=List[UsageArchive])
+async def list_usage_archives(_: dict = Depends(require_admin)):
+    """Finished Parquet archives of usage_logs, oldest first"""
+    return usage_archive.archives()
+
+@router.get("/usage-archives/{name}")
+async def download_usage_archive(name: str, _: dict = Depends(require_admin)):
+    archive = usage_archive.find(name)
+    if archive is None:
+        raise HTTPException(status_code=404, detail="Archive not found")
+    
+    return FileResponse(usage_archive.path(archive.file), media_type="application/vnd.apache.parquet", filename=archive.file)
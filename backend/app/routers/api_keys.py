@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from app.models import APIKeyCreate, APIKeyResponse, APIKeyCreated
 from app.utils.security import generate_api_key
+from app.utils.key_cache import key_invalidations
 from app.database import get_db
 from app.dependencies import get_current_user
 from datetime import datetime, timedelta
@@ -72,6 +73,8 @@ async def revoke_api_key(key_id: str, current_user: dict = Depends(get_current_u
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="API key not found")
     
+    await key_invalidations.invalidate_key(key_id)
+    
     return {"message": "API key revoked"}
 
 @router.post("/{key_id}/rotate", response_model=APIKeyCreated)
@@ -84,6 +87,7 @@ async def rotate_api_key(key_id: str, current_user: dict = Depends(get_current_u
     
     # Revoke old key
     await db.api_keys.update_one({"_id": ObjectId(key_id)}, {"$set": {"is_active": False}})
+    await key_invalidations.invalidate_key(key_id)
     
     # Create new key
     full_key, prefix, key_hash = generate_api_key()
@@ -1,14 +1,20 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from app.models import UserCreate, UserResponse, Token
-from app.utils.security import hash_password, verify_password, create_access_token
+from app.utils.security import hash_password_async, verify_password_async, create_access_token, PasswordHasherBusy
 from app.database import get_db
 from app.dependencies import get_current_user
 from datetime import datetime
-from bson import ObjectId
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
+def _hasher_busy():
+    return HTTPException(
+        status_code=503,
+        detail="Too many authentication requests, try again shortly",
+        headers={"Retry-After": "1"}
+    )
+
 @router.post("/register", response_model=UserResponse)
 async def register(user: UserCreate):
     db = get_db()
@@ -17,9 +23,14 @@ async def register(user: UserCreate):
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
+    try:
+        password_hash = await hash_password_async(user.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    
     user_doc = {
         "email": user.email,
-        "password_hash": hash_password(user.password),
+        "password_hash": password_hash,
         "role": user.role,
         "is_active": True,
         "created_at": datetime.utcnow()
@@ -40,7 +51,12 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     db = get_db()
     user = await db.users.find_one({"email": form_data.username})
     
-    if not user or not verify_password(form_data.password, user["password_hash"]):
+    try:
+        valid = user is not None and await verify_password_async(form_data.password, user["password_hash"])
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     if not user.get("is_active", True):
@@ -52,12 +68,4 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 @router.get("/me", response_model=UserResponse)
 async def get_me(current_user: dict = Depends(get_current_user)):
-    db = get_db()
-    user = await db.users.find_one({"_id": ObjectId(current_user["id"])})
-    return UserResponse(
-        id=str(user["_id"]),
-        email=user["email"],
-        role=user["role"],
-        is_active=user["is_active"],
-        created_at=user["created_at"]
-    )
+    return UserResponse(**current_user)
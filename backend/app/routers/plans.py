@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from app.models import PlanCreate, PlanUpdate, PlanResponse
 from app.database import get_db
 from app.dependencies import require_admin, get_current_user
+from app.utils.key_cache import key_invalidations
 from datetime import datetime
 from bson import ObjectId
 from typing import List
@@ -17,6 +18,7 @@ async def create_plan(plan: PlanCreate, _: dict = Depends(require_admin)):
         "monthly_limit": plan.monthly_limit,
         "rate_limit_per_minute": plan.rate_limit_per_minute,
         "allowed_services": plan.allowed_services,
+        "batch_metering": plan.batch_metering,
         "created_at": datetime.utcnow()
     }
     
@@ -39,6 +41,7 @@ async def list_plans(_: dict = Depends(get_current_user)):
             monthly_limit=p["monthly_limit"],
             rate_limit_per_minute=p["rate_limit_per_minute"],
             allowed_services=p["allowed_services"],
+            batch_metering=p.get("batch_metering", "call"),
             created_at=p["created_at"]
         ) for p in plans
     ]
@@ -57,6 +60,7 @@ async def get_plan(plan_id: str, _: dict = Depends(get_current_user)):
         monthly_limit=plan["monthly_limit"],
         rate_limit_per_minute=plan["rate_limit_per_minute"],
         allowed_services=plan["allowed_services"],
+        batch_metering=plan.get("batch_metering", "call"),
         created_at=plan["created_at"]
     )
 
@@ -77,6 +81,8 @@ async def update_plan(plan_id: str, plan: PlanUpdate, _: dict = Depends(require_
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Plan not found")
     
+    await key_invalidations.invalidate_plan(plan_id)
+    
     updated = await db.plans.find_one({"_id": ObjectId(plan_id)})
     
     return PlanResponse(
@@ -85,6 +91,7 @@ async def update_plan(plan_id: str, plan: PlanUpdate, _: dict = Depends(require_
         monthly_limit=updated["monthly_limit"],
         rate_limit_per_minute=updated["rate_limit_per_minute"],
         allowed_services=updated["allowed_services"],
+        batch_metering=updated.get("batch_metering", "call"),
         created_at=updated["created_at"]
     )
 
@@ -97,4 +104,6 @@ async def delete_plan(plan_id: str, _: dict = Depends(require_admin)):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Plan not found")
     
+    await key_invalidations.invalidate_plan(plan_id)
+    
     return {"message": "Plan deleted"}
@@ -1,149 +1,229 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
-from app.database import get_db
-from app.utils.security import hash_api_key
-from datetime import datetime
-from bson import ObjectId
-import random
-import httpx
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import QueryParams
+from app.utils.gateway import usage_event
+from app.utils.metering import usage_recorder
+from app.utils.quota import quota_leaser
+from app.utils.rate_limit import rate_limiter, rate_limit_key
+from app.utils.proxy import upstream_pool, forwarded_headers
+from app.utils.service_registry import service_registry
+from app.utils.response_cache import response_cache, cache_key
+from app.utils import builtin_services
+from app.utils.currency_matrix import UnknownCurrency
+from app.models import ConversionBatch, ConversionBatchResponse, ConversionResult
+from app.models import WeatherBulkRequest, WeatherBulkResponse, WeatherReport
+from app.models import IPLookupBatch, IPLookupBatchResponse, IPLocation
+from app.models import ServiceCall, ServiceBatch
+from typing import List
+import asyncio
+import json
+import logging
 
+# Authentication, rate limiting, quota and metering for these routes happen
+# in GatewayMiddleware (app/utils/gateway.py), which puts the caller's
+# api_key, key_context and service spec on request.state.
 router = APIRouter(prefix="/api/services", tags=["API Services"])
+logger = logging.getLogger(__name__)
 
-# Sample data for services
-WEATHER_DATA = [
-    {"city": "New York", "temp": 72, "condition": "Sunny"},
-    {"city": "London", "temp": 58, "condition": "Cloudy"},
-    {"city": "Tokyo", "temp": 68, "condition": "Rainy"},
-    {"city": "Sydney", "temp": 82, "condition": "Clear"},
-    {"city": "Paris", "temp": 65, "condition": "Partly Cloudy"},
-]
-
-CURRENCY_RATES = {
-    "USD": 1.0, "EUR": 0.85, "GBP": 0.73, "JPY": 110.0, "AUD": 1.35,
-    "CAD": 1.25, "CHF": 0.92, "CNY": 6.45, "INR": 74.5, "MXN": 20.1
-}
-
-RANDOM_FACTS = [
-    "Honey never spoils.",
-    "Octopuses have three hearts.",
-    "Bananas are berries, but strawberries aren't.",
-    "A day on Venus is longer than a year on Venus.",
-    "The Eiffel Tower can grow 6 inches in summer.",
-]
-
-async def validate_api_key(x_api_key: str = Header(..., alias="X-API-Key")):
-    db = get_db()
-    key_hash = hash_api_key(x_api_key)
-    
-    api_key = await db.api_keys.find_one({"key_hash": key_hash})
-    
-    if not api_key:
-        raise HTTPException(status_code=401, detail="Invalid API key")
-    
-    if not api_key["is_active"]:
-        raise HTTPException(status_code=401, detail="API key is revoked")
-    
-    if api_key.get("expires_at") and api_key["expires_at"] < datetime.utcnow():
-        raise HTTPException(status_code=401, detail="API key has expired")
-    
-    # Check subscription and quota
-    sub = await db.subscriptions.find_one({"user_id": api_key["user_id"]})
-    if sub:
-        plan = await db.plans.find_one({"_id": ObjectId(sub["plan_id"])})
-        if plan and sub["usage_count"] >= plan["monthly_limit"]:
-            raise HTTPException(status_code=429, detail="Monthly quota exceeded")
-    
-    return api_key
-
-async def log_usage(api_key: dict, endpoint: str, status_code: int):
-    db = get_db()
-    
-    await db.usage_logs.insert_one({
-        "user_id": api_key["user_id"],
-        "api_key_id": str(api_key["_id"]),
-        "endpoint": endpoint,
-        "timestamp": datetime.utcnow(),
-        "status_code": status_code
-    })
-    
-    # Increment subscription usage
-    await db.subscriptions.update_one(
-        {"user_id": api_key["user_id"]},
-        {"$inc": {"usage_count": 1}}
-    )
-
-@router.get("/weather")
-async def get_weather(city: str = None, api_key: dict = Depends(validate_api_key)):
-    endpoint = "/api/services/weather"
-    
-    if "weather" not in api_key["allowed_services"] and api_key["allowed_services"]:
-        await log_usage(api_key, endpoint, 403)
-        raise HTTPException(status_code=403, detail="Service not allowed for this API key")
-    
-    if city:
-        data = next((w for w in WEATHER_DATA if w["city"].lower() == city.lower()), None)
-        if not data:
-            data = {"city": city, "temp": random.randint(50, 90), "condition": random.choice(["Sunny", "Cloudy", "Rainy"])}
-    else:
-        data = random.choice(WEATHER_DATA)
-    
-    await log_usage(api_key, endpoint, 200)
-    return data
-
-@router.get("/currency")
-async def get_currency(base: str = "USD", target: str = "EUR", api_key: dict = Depends(validate_api_key)):
-    endpoint = "/api/services/currency"
-    
-    if "currency" not in api_key["allowed_services"] and api_key["allowed_services"]:
-        await log_usage(api_key, endpoint, 403)
-        raise HTTPException(status_code=403, detail="Service not allowed for this API key")
-    
-    base_rate = CURRENCY_RATES.get(base.upper(), 1.0)
-    target_rate = CURRENCY_RATES.get(target.upper(), 1.0)
-    
-    rate = target_rate / base_rate
-    
-    await log_usage(api_key, endpoint, 200)
-    return {"base": base.upper(), "target": target.upper(), "rate": round(rate, 4)}
-
-@router.get("/random-fact")
-async def get_random_fact(api_key: dict = Depends(validate_api_key)):
-    endpoint = "/api/services/random-fact"
-    
-    if "random-fact" not in api_key["allowed_services"] and api_key["allowed_services"]:
-        await log_usage(api_key, endpoint, 403)
-        raise HTTPException(status_code=403, detail="Service not allowed for this API key")
-    
-    await log_usage(api_key, endpoint, 200)
-    return {"fact": random.choice(RANDOM_FACTS)}
-
-@router.get("/ip-lookup")
-async def ip_lookup(ip: str = None, api_key: dict = Depends(validate_api_key)):
-    endpoint = "/api/services/ip-lookup"
-    
-    if "ip-lookup" not in api_key["allowed_services"] and api_key["allowed_services"]:
-        await log_usage(api_key, endpoint, 403)
-        raise HTTPException(status_code=403, detail="Service not allowed for this API key")
-    
-    # Mock IP data
-    data = {
-        "ip": ip or "8.8.8.8",
-        "country": "United States",
-        "city": "Mountain View",
-        "isp": "Google LLC",
-        "timezone": "America/Los_Angeles"
-    }
-    
-    await log_usage(api_key, endpoint, 200)
-    return data
+BATCH_ENDPOINT = "/api/services/batch"
+
+# Metering tasks for batch calls, kept referenced until they finish
+_background = set()
+
+def batch_metering(request: Request) -> str:
+    plan = request.state.key_context.plan
+    return plan.get("batch_metering", "call") if plan else "call"
+
+async def charge_items(request: Request, items: int):
+    """Charge the rest of a multi-item call: rate limit tokens always, quota when the plan meters per item"""
+    if items <= 1:
+        return
+    ctx = request.state.key_context
+    plan = ctx.plan
+    # The gateway already took one token for the call itself
+    if plan and plan.get("rate_limit_per_minute"):
+        limit = await rate_limiter.acquire(rate_limit_key(ctx.api_key), plan["rate_limit_per_minute"], cost=items - 1)
+        request.state.rate_limit_headers = limit.headers()
+        if not limit.allowed:
+            raise HTTPException(status_code=429, detail="Rate limit exceeded")
+    
+    if batch_metering(request) != "item":
+        return
+    if ctx.subscription and not await quota_leaser.reserve(ctx.api_key["user_id"], plan["monthly_limit"], cost=items - 1):
+        raise HTTPException(status_code=429, detail="Monthly quota exceeded")
+    request.state.usage_items = items
+
+def builtin_service(request: Request, handler, suffix: str):
+    """Registry entry for a batch endpoint, which only exists while the service uses its built-in handler"""
+    spec = request.state.service
+    if spec.handler is not handler:
+        raise HTTPException(status_code=404, detail="Service not found")
+    request.state.usage_endpoint = f"{spec.endpoint}/{suffix}"
+    return spec
+
+async def _load(spec, path: str, params, headers=()):
+    if spec.handler is not None:
+        return 200, [("content-type", "application/json")], json.dumps(spec.handler(params), separators=(",", ":")).encode()
+    return await upstream_pool.fetch(spec.name, path, params, headers)
 
 @router.get("/available")
 async def list_available_services():
     """List all available API services (public endpoint)"""
     return {
         "services": [
-            {"name": "weather", "endpoint": "/api/services/weather", "description": "Get weather data"},
-            {"name": "currency", "endpoint": "/api/services/currency", "description": "Currency exchange rates"},
-            {"name": "random-fact", "endpoint": "/api/services/random-fact", "description": "Get random facts"},
-            {"name": "ip-lookup", "endpoint": "/api/services/ip-lookup", "description": "IP geolocation lookup"},
+            {"name": spec.name, "endpoint": spec.endpoint, "description": spec.description}
+            for spec in service_registry.all()
         ]
     }
+
+async def _run_call(index: int, call: ServiceCall, api_key: dict) -> dict:
+    """One item of a batch call; failures become the item's status instead of raising"""
+    result = {"index": index, "id": call.id, "service": call.service}
+    spec = service_registry.get(call.service)
+    if spec is None:
+        # Charged like any other item, so it is metered too (under the batch, not a made-up service name)
+        return {**result, "status": 404, "body": {"detail": "Service not found"}, "endpoint": BATCH_ENDPOINT}
+    
+    if call.service not in api_key["allowed_services"] and api_key["allowed_services"]:
+        return {**result, "status": 403, "body": {"detail": "Service not allowed for this API key"}, "endpoint": spec.endpoint}
+    
+    params = QueryParams(call.params)
+    try:
+        if spec.cache_ttl:
+            cached, _ = await response_cache.get(
+                cache_key(spec.name, call.path, params),
+                spec.cache_ttl,
+                lambda: _load(spec, call.path, params)
+            )
+            status_code, body = cached.status_code, _decode_body(cached.body)
+        elif spec.handler is not None:
+            status_code, body = 200, spec.handler(params)
+        else:
+            status_code, _, content = await upstream_pool.fetch(spec.name, call.path, params)
+            body = _decode_body(content)
+    except ValueError as e:
+        status_code, body = 400, {"detail": str(e)}
+    except HTTPException as e:
+        status_code, body = e.status_code, {"detail": e.detail}
+    except Exception:
+        logger.exception("Batch item for %s failed", spec.name)
+        status_code, body = 500, {"detail": "Internal error"}
+    
+    return {**result, "status": status_code, "body": body, "endpoint": spec.endpoint}
+
+def _decode_body(content: bytes):
+    try:
+        return json.loads(content)
+    except ValueError:
+        return content.decode("utf-8", errors="replace")
+
+async def _meter_batch(api_key: dict, calls: List[asyncio.Task]):
+    # Runs apart from the response stream, so items are metered even if the client goes away
+    results = await asyncio.gather(*calls)
+    await usage_recorder.record_many([
+        usage_event(api_key, r["endpoint"], r["status"]) for r in results
+    ])
+
+@router.post("/batch")
+async def call_services_batch(batch: ServiceBatch, request: Request):
+    """Run many service calls under one authentication, streaming NDJSON results as they finish.
+
+    Plans metering per call record one event for the whole batch; plans
+    metering per item record one event per item, under its own service
+    (items for unknown services under the batch endpoint).
+    """
+    api_key = request.state.api_key
+    request.state.usage_endpoint = BATCH_ENDPOINT
+    await charge_items(request, len(batch.requests))
+    
+    calls = [asyncio.create_task(_run_call(i, call, api_key)) for i, call in enumerate(batch.requests)]
+    if batch_metering(request) == "item":
+        request.state.usage_endpoint = None
+        metering = asyncio.create_task(_meter_batch(api_key, calls))
+        _background.add(metering)
+        metering.add_done_callback(_background.discard)
+    
+    async def stream():
+        for next_done in asyncio.as_completed(calls):
+            result = dict(await next_done)
+            result.pop("endpoint", None)
+            yield json.dumps(result, separators=(",", ":"), default=str) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.post("/currency/convert", response_model=ConversionBatchResponse)
+async def convert_currency_batch(batch: ConversionBatch, request: Request):
+    """Convert many (base, target, amount) tuples in one call"""
+    builtin_service(request, builtin_services.currency, "convert")
+    await charge_items(request, len(batch.items))
+    
+    try:
+        converted = builtin_services.currency_rates.convert_many(
+            (item.base, item.target, item.amount) for item in batch.items
+        )
+    except UnknownCurrency as e:
+        raise HTTPException(status_code=400, detail=f"Unknown currency: {e}")
+    
+    return ConversionBatchResponse(results=[
+        ConversionResult(
+            base=item.base.upper(),
+            target=item.target.upper(),
+            amount=item.amount,
+            rate=round(rate, 4),
+            converted=round(amount, 4)
+        ) for item, (rate, amount) in zip(batch.items, converted)
+    ])
+
+@router.post("/weather/bulk", response_model=WeatherBulkResponse)
+async def get_weather_bulk(bulk: WeatherBulkRequest, request: Request):
+    """Weather for many cities in one call; unknown cities are listed in not_found"""
+    builtin_service(request, builtin_services.weather, "bulk")
+    await charge_items(request, len(bulk.cities))
+    
+    results, not_found = [], []
+    for city, data in builtin_services.weather_index.get_many(bulk.cities).items():
+        if data is None:
+            not_found.append(city)
+        else:
+            results.append(WeatherReport(**data))
+    
+    return WeatherBulkResponse(results=results, not_found=not_found)
+
+@router.post("/ip-lookup/batch", response_model=IPLookupBatchResponse)
+async def ip_lookup_batch(batch: IPLookupBatch, request: Request):
+    """Geolocate many IPv4/IPv6 addresses in one call"""
+    builtin_service(request, builtin_services.ip_lookup, "batch")
+    await charge_items(request, len(batch.ips))
+    
+    try:
+        results = builtin_services.geoip.lookup_many(batch.ips)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return IPLookupBatchResponse(results=[IPLocation(**r) for r in results])
+
+@router.api_route("/{service}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+@router.api_route("/{service}/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+async def call_service(service: str, request: Request, path: str = ""):
+    """Dispatch to a registered service: a built-in handler or a proxied upstream"""
+    spec = getattr(request.state, "service", None)
+    if spec is None:
+        raise HTTPException(status_code=404, detail="Service not found")
+    
+    try:
+        if spec.cache_ttl and request.method == "GET":
+            # Shared across tenants; quota was already reserved, so hits are still metered
+            cached, state = await response_cache.get(
+                cache_key(service, path, request.query_params),
+                spec.cache_ttl,
+                lambda: _load(spec, path, request.query_params, forwarded_headers(request))
+            )
+            return cached.to_response(state)
+    
+        if spec.handler is not None:
+            return spec.handler(request.query_params)
+    except ValueError as e:
+        # Built-in handlers reject bad parameters with ValueError
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return await upstream_pool.forward(service, request, path)
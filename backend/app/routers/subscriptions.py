@@ -1,19 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from app.models import SubscriptionCreate, SubscriptionResponse
 from app.database import get_db
 from app.dependencies import require_admin, get_current_user
-from datetime import datetime, timedelta
+from app.utils.key_cache import key_invalidations
+from app.utils.quota import quota_leaser, get_next_reset_date, archive_period
+from pymongo import ReturnDocument
+from app.utils.pagination import paginate, stream_ndjson
+from datetime import datetime
 from bson import ObjectId
-from typing import List
+from typing import List, Optional
 
 router = APIRouter(prefix="/api/subscriptions", tags=["Subscriptions"])
 
-def get_next_reset_date():
-    now = datetime.utcnow()
-    if now.month == 12:
-        return datetime(now.year + 1, 1, 1)
-    return datetime(now.year, now.month + 1, 1)
-
 @router.post("/", response_model=SubscriptionResponse)
 async def assign_plan(sub: SubscriptionCreate, _: dict = Depends(require_admin)):
     db = get_db()
@@ -32,11 +30,17 @@ async def assign_plan(sub: SubscriptionCreate, _: dict = Depends(require_admin))
     existing = await db.subscriptions.find_one({"user_id": sub.user_id})
     
     if existing:
-        # Update existing subscription
-        await db.subscriptions.update_one(
+        # Close the current period for billing, then start the new plan's count
+        await quota_leaser.return_lease(sub.user_id)
+        before = await db.subscriptions.find_one_and_update(
             {"user_id": sub.user_id},
-            {"$set": {"plan_id": sub.plan_id, "usage_count": 0, "reset_at": get_next_reset_date()}}
+            # A new period_id so leases other workers hold on the old period are returned to it
+            {"$set": {"plan_id": sub.plan_id, "usage_count": 0, "reset_at": get_next_reset_date(),
+                      "period_id": ObjectId()}},
+            return_document=ReturnDocument.BEFORE
         )
+        await archive_period(db, before, ended_at=datetime.utcnow())
+        await key_invalidations.invalidate_user(sub.user_id)
         updated = await db.subscriptions.find_one({"user_id": sub.user_id})
         return SubscriptionResponse(
             id=str(updated["_id"]),
@@ -56,6 +60,7 @@ async def assign_plan(sub: SubscriptionCreate, _: dict = Depends(require_admin))
     }
     
     result = await db.subscriptions.insert_one(sub_doc)
+    await key_invalidations.invalidate_user(sub.user_id)
     
     return SubscriptionResponse(
         id=str(result.inserted_id),
@@ -79,18 +84,31 @@ async def get_my_subscription(current_user: dict = Depends(get_current_user)):
         created_at=sub["created_at"]
     )
 
+SUBSCRIPTION_FIELDS = {"user_id": 1, "plan_id": 1, "usage_count": 1, "reset_at": 1, "created_at": 1}
+
+def _subscription_item(s: dict) -> dict:
+    return {
+        "id": str(s["_id"]),
+        "user_id": s["user_id"],
+        "plan_id": s["plan_id"],
+        "usage_count": s["usage_count"],
+        "reset_at": s["reset_at"],
+        "created_at": s["created_at"]
+    }
+
 @router.get("/", response_model=List[SubscriptionResponse])
-async def list_subscriptions(_: dict = Depends(require_admin)):
+async def list_subscriptions(
+    response: Response,
+    after: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    output: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    _: dict = Depends(require_admin)
+):
     db = get_db()
-    subs = await db.subscriptions.find().to_list(1000)
     
-    return [
-        SubscriptionResponse(
-            id=str(s["_id"]),
-            user_id=s["user_id"],
-            plan_id=s["plan_id"],
-            usage_count=s["usage_count"],
-            reset_at=s["reset_at"],
-            created_at=s["created_at"]
-        ) for s in subs
-    ]
+    if output == "ndjson":
+        return stream_ndjson(db.subscriptions, {}, SUBSCRIPTION_FIELDS, after, _subscription_item)
+    
+    subs = await paginate(db.subscriptions, {}, SUBSCRIPTION_FIELDS, after, limit, response)
+    
+    return [SubscriptionResponse(**_subscription_item(s)) for s in subs]
@@ -1,81 +1,80 @@
-from fastapi import APIRouter, Depends, Query
-from app.models import UsageStats
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.models import UsageStats, UsageBreakdown
 from app.database import get_db
 from app.dependencies import get_current_user, require_admin
+from app.utils.rollups import read_usage_stats
+from app.utils.usage_analytics import usage_breakdown, validate_query
+from app.utils.usage_stream import usage_stream
 from datetime import datetime, timedelta
-from bson import ObjectId
-from typing import Optional
+from typing import List, Optional
+import asyncio
+import json
 
 router = APIRouter(prefix="/api/usage", tags=["Usage"])
 
+STREAM_KEEPALIVE_SECONDS = 15.0
+
+async def _breakdown(days: int, group_by: List[str], tz: str, user_id: Optional[str] = None):
+    error = validate_query(group_by, tz)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    start_date = datetime.utcnow() - timedelta(days=days)
+    return await usage_breakdown(get_db(), start_date, group_by, tz, user_id=user_id)
+
 @router.get("/my", response_model=UsageStats)
 async def get_my_usage(
     days: int = Query(30, ge=1, le=365),
     current_user: dict = Depends(get_current_user)
 ):
-    db = get_db()
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    logs = await db.usage_logs.find({
-        "user_id": current_user["id"],
-        "timestamp": {"$gte": start_date}
-    }).to_list(10000)
-    
-    total = len(logs)
-    successful = sum(1 for l in logs if 200 <= l["status_code"] < 300)
-    failed = total - successful
-    
-    by_endpoint = {}
-    by_day = {}
+    return await read_usage_stats(get_db(), days, user_id=current_user["id"])
+
+@router.get("/my/stream")
+async def stream_my_usage(current_user: dict = Depends(get_current_user)):
+    """Server-sent events with today's counters and the remaining quota, at most once a second"""
+    user_id = current_user["id"]
     
-    for log in logs:
-        ep = log["endpoint"]
-        by_endpoint[ep] = by_endpoint.get(ep, 0) + 1
-        
-        day = log["timestamp"].strftime("%Y-%m-%d")
-        by_day[day] = by_day.get(day, 0) + 1
+    async def events():
+        queue = await usage_stream.subscribe(user_id)
+        try:
+            while True:
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: usage\ndata: {json.dumps(snapshot, separators=(',', ':'))}\n\n"
+        finally:
+            usage_stream.unsubscribe(user_id, queue)
     
-    return UsageStats(
-        total_requests=total,
-        successful_requests=successful,
-        failed_requests=failed,
-        requests_by_endpoint=by_endpoint,
-        requests_by_day=by_day
-    )
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/my/breakdown", response_model=UsageBreakdown)
+async def get_my_usage_breakdown(
+    days: int = Query(30, ge=1, le=365),
+    group_by: List[str] = Query(["endpoint", "day"]),
+    tz: str = "UTC",
+    current_user: dict = Depends(get_current_user)
+):
+    return await _breakdown(days, group_by, tz, user_id=current_user["id"])
 
 @router.get("/global", response_model=UsageStats)
 async def get_global_usage(
     days: int = Query(30, ge=1, le=365),
     _: dict = Depends(require_admin)
 ):
-    db = get_db()
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    logs = await db.usage_logs.find({
-        "timestamp": {"$gte": start_date}
-    }).to_list(100000)
-    
-    total = len(logs)
-    successful = sum(1 for l in logs if 200 <= l["status_code"] < 300)
-    failed = total - successful
-    
-    by_endpoint = {}
-    by_day = {}
-    
-    for log in logs:
-        ep = log["endpoint"]
-        by_endpoint[ep] = by_endpoint.get(ep, 0) + 1
-        
-        day = log["timestamp"].strftime("%Y-%m-%d")
-        by_day[day] = by_day.get(day, 0) + 1
-    
-    return UsageStats(
-        total_requests=total,
-        successful_requests=successful,
-        failed_requests=failed,
-        requests_by_endpoint=by_endpoint,
-        requests_by_day=by_day
-    )
+    return await read_usage_stats(get_db(), days)
+
+@router.get("/global/breakdown", response_model=UsageBreakdown)
+async def get_global_usage_breakdown(
+    days: int = Query(30, ge=1, le=365),
+    group_by: List[str] = Query(["endpoint", "day"]),
+    tz: str = "UTC",
+    _: dict = Depends(require_admin)
+):
+    return await _breakdown(days, group_by, tz)
 
 @router.get("/user/{user_id}", response_model=UsageStats)
 async def get_user_usage(
@@ -83,32 +82,14 @@ async def get_user_usage(
     days: int = Query(30, ge=1, le=365),
     _: dict = Depends(require_admin)
 ):
-    db = get_db()
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    logs = await db.usage_logs.find({
-        "user_id": user_id,
-        "timestamp": {"$gte": start_date}
-    }).to_list(10000)
-    
-    total = len(logs)
-    successful = sum(1 for l in logs if 200 <= l["status_code"] < 300)
-    failed = total - successful
-    
-    by_endpoint = {}
-    by_day = {}
-    
-    for log in logs:
-        ep = log["endpoint"]
-        by_endpoint[ep] = by_endpoint.get(ep, 0) + 1
-        
-        day = log["timestamp"].strftime("%Y-%m-%d")
-        by_day[day] = by_day.get(day, 0) + 1
-    
-    return UsageStats(
-        total_requests=total,
-        successful_requests=successful,
-        failed_requests=failed,
-        requests_by_endpoint=by_endpoint,
-        requests_by_day=by_day
-    )
+    return await read_usage_stats(get_db(), days, user_id=user_id)
+
+@router.get("/user/{user_id}/breakdown", response_model=UsageBreakdown)
+async def get_user_usage_breakdown(
+    user_id: str,
+    days: int = Query(30, ge=1, le=365),
+    group_by: List[str] = Query(["endpoint", "day"]),
+    tz: str = "UTC",
+    _: dict = Depends(require_admin)
+):
+    return await _breakdown(days, group_by, tz, user_id=user_id)
@@ -1,4 +1,5 @@
 from app.utils.security import (
     hash_password, verify_password, create_access_token, 
-    decode_token, generate_api_key, hash_api_key
+    decode_token, generate_api_key, hash_api_key,
+    hash_password_async, verify_password_async, PasswordHasherBusy
 )
@@ -0,0 +1,77 @@
+from typing import Callable, Dict, Mapping
+import random
+from app.config import settings
+from app.utils.currency_matrix import RateMatrix, UnknownCurrency
+from app.utils.weather import WeatherIndex
+from app.utils.geoip import GeoIPDatabase
+
+# Sample data for services
+WEATHER_DATA = [
+    {"city": "New York", "temp": 72, "condition": "Sunny"},
+    {"city": "London", "temp": 58, "condition": "Cloudy"},
+    {"city": "Tokyo", "temp": 68, "condition": "Rainy"},
+    {"city": "Sydney", "temp": 82, "condition": "Clear"},
+    {"city": "Paris", "temp": 65, "condition": "Partly Cloudy"},
+]
+
+weather_index = WeatherIndex(WEATHER_DATA, settings.weather_data_path)
+
+CURRENCY_RATES = {
+    "USD": 1.0, "EUR": 0.85, "GBP": 0.73, "JPY": 110.0, "AUD": 1.35,
+    "CAD": 1.25, "CHF": 0.92, "CNY": 6.45, "INR": 74.5, "MXN": 20.1
+}
+
+currency_rates = RateMatrix(CURRENCY_RATES)
+
+geoip = GeoIPDatabase(settings.geoip_data_path, settings.geoip_cache_size, settings.geoip_cache_ttl_seconds)
+
+RANDOM_FACTS = [
+    "Honey never spoils.",
+    "Octopuses have three hearts.",
+    "Bananas are berries, but strawberries aren't.",
+    "A day on Venus is longer than a year on Venus.",
+    "The Eiffel Tower can grow 6 inches in summer.",
+]
+
+def weather(params: Mapping[str, str]) -> dict:
+    city = params.get("city")
+    if city:
+        data = weather_index.get(city)
+        if not data:
+            data = {"city": city, "temp": random.randint(50, 90), "condition": random.choice(["Sunny", "Cloudy", "Rainy"])}
+        return data
+    return weather_index.sample()
+
+def currency(params: Mapping[str, str]) -> dict:
+    base = params.get("base", "USD").upper()
+    target = params.get("target", "EUR").upper()
+
+    try:
+        rate = currency_rates.rate(base, target)
+    except UnknownCurrency:
+        # Unknown codes have always been quoted at 1.0
+        rate = currency_rates.rates.get(target, 1.0) / currency_rates.rates.get(base, 1.0)
+
+    return {"base": base, "target": target, "rate": round(rate, 4)}
+
+def random_fact(params: Mapping[str, str]) -> dict:
+    return {"fact": random.choice(RANDOM_FACTS)}
+
+def ip_lookup(params: Mapping[str, str]) -> dict:
+    return geoip.lookup(params.get("ip") or "8.8.8.8")
+
+# Handlers a registered service can point at instead of an upstream URL
+BUILTIN_HANDLERS: Dict[str, Callable[[Mapping[str, str]], dict]] = {
+    "weather": weather,
+    "currency": currency,
+    "random-fact": random_fact,
+    "ip-lookup": ip_lookup,
+}
+
+# Registry entries created on first start
+DEFAULT_SERVICES = [
+    {"name": "weather", "description": "Get weather data", "handler": "weather", "cache_ttl_seconds": 300},
+    {"name": "currency", "description": "Currency exchange rates", "handler": "currency", "cache_ttl_seconds": 60},
+    {"name": "random-fact", "description": "Get random facts", "handler": "random-fact"},
+    {"name": "ip-lookup", "description": "IP geolocation lookup", "handler": "ip-lookup", "cache_ttl_seconds": 3600},
+]
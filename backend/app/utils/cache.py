@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import time
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after `ttl` seconds.
+
+    With `max_bytes`, entries are also evicted until the summed `sizeof` of
+    the cached values fits the byte budget.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, max_bytes: Optional[int] = None,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (expires_at, value, nbytes)
+        self._data: "OrderedDict[Hashable, tuple[float, Any, int]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry[0] <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if key in self._data:
+            self._remove(key)
+        nbytes = self.sizeof(value) if self.sizeof else 0
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value, nbytes)
+        self.bytes += nbytes
+        while len(self._data) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        if key not in self._data:
+            return None
+        return self._remove(key)
+
+    def _remove(self, key: Hashable) -> Any:
+        _, value, nbytes = self._data.pop(key)
+        self.bytes -= nbytes
+        self._on_evict(key, value)
+        return value
+
+    def _on_evict(self, key: Hashable, value: Any):
+        """Hook for subclasses that keep secondary indexes over the entries"""
+
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+        if self.max_bytes is not None:
+            stats.update(bytes=self.bytes, max_bytes=self.max_bytes)
+        return stats
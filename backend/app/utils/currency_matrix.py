@@ -0,0 +1,64 @@
+from array import array
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+
+class UnknownCurrency(ValueError):
+    pass
+
+
+class RateMatrix:
+    """Every cross rate between the configured currencies, precomputed.
+
+    Rates are quoted against one base currency. The N x N matrix of
+    `target / base` quotients is kept in a flat `array('d')` and only
+    rebuilt when `update` is handed rates that differ from the current set,
+    so a conversion is two dict lookups and one multiplication.
+    """
+
+    def __init__(self, rates: Mapping[str, float]):
+        self.rebuilds = 0
+        self.rates: Dict[str, float] = {}
+        self.codes: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._matrix = array("d")
+        self.update(rates)
+
+    def update(self, rates: Mapping[str, float]) -> bool:
+        """Swap in new rates; returns False (and keeps the matrix) if nothing changed"""
+        rates = {code.upper(): float(rate) for code, rate in rates.items()}
+        if rates == self.rates:
+            return False
+
+        codes = sorted(rates)
+        quotes = [rates[c] for c in codes]
+        matrix = array("d", (target / base for base in quotes for target in quotes))
+
+        # Build fully before publishing so readers never see a half-built matrix
+        self.rates, self.codes, self._matrix = rates, codes, matrix
+        self._index = {c: i for i, c in enumerate(codes)}
+        self.rebuilds += 1
+        return True
+
+    def index_of(self, code: str) -> Optional[int]:
+        return self._index.get(code.upper())
+
+    def rate(self, base: str, target: str) -> float:
+        i, j = self.index_of(base), self.index_of(target)
+        if i is None or j is None:
+            raise UnknownCurrency(base if i is None else target)
+        return self._matrix[i * len(self.codes) + j]
+
+    def convert_many(self, items: Iterable[Tuple[str, str, float]]) -> List[Tuple[float, float]]:
+        """`(rate, converted amount)` for each `(base, target, amount)`"""
+        index, matrix, n = self._index, self._matrix, len(self.codes)
+        results = []
+        for base, target, amount in items:
+            i, j = index.get(base.upper()), index.get(target.upper())
+            if i is None or j is None:
+                raise UnknownCurrency(base if i is None else target)
+            rate = matrix[i * n + j]
+            results.append((rate, amount * rate))
+        return results
+
+    def stats(self) -> dict:
+        return {"currencies": len(self.codes), "rebuilds": self.rebuilds}
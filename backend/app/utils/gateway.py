@@ -0,0 +1,161 @@
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from app.utils.key_cache import KeyContext, get_key_context
+from app.utils.metering import usage_recorder
+from app.utils.quota import quota_leaser
+from app.utils.rate_limit import rate_limiter, rate_limit_key
+from app.utils.security import hash_api_key
+from app.utils.service_registry import ServiceSpec, service_registry
+
+
+def usage_event(api_key: dict, endpoint: str, status_code: int, items: int = 1) -> dict:
+    event = {
+        "user_id": api_key["user_id"],
+        "api_key_id": str(api_key["_id"]),
+        "endpoint": endpoint,
+        "timestamp": datetime.utcnow(),
+        "status_code": status_code
+    }
+    if items != 1:
+        event["items"] = items
+    return event
+
+
+class Admission(NamedTuple):
+    api_key: dict
+    key_context: KeyContext
+    service: Optional[ServiceSpec]
+    headers: Dict[str, str]
+
+
+class Rejection(Exception):
+    def __init__(self, status_code: int, detail: str, headers: Optional[Dict[str, str]] = None,
+                 metered: Optional[tuple] = None):
+        self.status_code = status_code
+        self.detail = detail
+        self.headers = headers
+        # (api_key, endpoint) when the refusal counts as a call
+        self.metered = metered
+
+
+async def admit(raw_key: Optional[str], service: Optional[str]) -> Admission:
+    """Authenticate a call to `service` (None for multiplexed calls) and charge it.
+
+    Checks run cheapest first and the rate limit and quota are only spent
+    once everything else has passed. Raises `Rejection` otherwise.
+    """
+    if not raw_key:
+        raise Rejection(401, "Missing API key")
+
+    ctx = await get_key_context(hash_api_key(raw_key))
+    if not ctx:
+        raise Rejection(401, "Invalid API key")
+
+    api_key = ctx.api_key
+    if not api_key["is_active"]:
+        raise Rejection(401, "API key is revoked")
+    if api_key.get("expires_at") and api_key["expires_at"] < datetime.utcnow():
+        raise Rejection(401, "API key has expired")
+
+    spec = None
+    if service is not None:
+        spec = service_registry.get(service)
+        if spec is None:
+            raise Rejection(404, "Service not found")
+        if service not in api_key["allowed_services"] and api_key["allowed_services"]:
+            raise Rejection(403, "Service not allowed for this API key", metered=(api_key, spec.endpoint))
+
+    sub, plan = ctx.subscription, ctx.plan
+    headers = {}
+
+    # Per-minute rate limit, decided in memory
+    if plan and plan.get("rate_limit_per_minute"):
+        limit = await rate_limiter.acquire(rate_limit_key(api_key), plan["rate_limit_per_minute"])
+        headers = limit.headers()
+        if not limit.allowed:
+            raise Rejection(429, "Rate limit exceeded", headers=headers)
+
+    # Reserve this call against the monthly quota
+    if sub and plan and not await quota_leaser.reserve(api_key["user_id"], plan["monthly_limit"]):
+        raise Rejection(429, "Monthly quota exceeded", headers=headers)
+
+    return Admission(api_key, ctx, spec, headers)
+
+
+class GatewayMiddleware:
+    """Pure ASGI stage in front of every metered service route.
+
+    For paths under `prefix` it authenticates the API key, checks the
+    service is allowed, applies the rate limit and reserves quota in one
+    pass, then hands the admission to the route through `request.state`
+    (`api_key`, `key_context`, `service`). Rate-limit headers are taken from
+    `rate_limit_headers` when the response starts, so routes that charge
+    more tokens can update them. The response status is read off
+    `http.response.start`, so every outcome (including unhandled errors)
+    is metered once against `request.state.usage_endpoint`, with
+    `usage_items` items. Routes that meter themselves set the endpoint to
+    None.
+
+    `public` paths (exact, below `prefix`) skip the gateway entirely.
+    `multiplexed` ones, only as an exact POST, are authenticated without a
+    service and check services per item. Anything else is a service call
+    named by its first path segment.
+    """
+
+    def __init__(self, app, prefix: str = "/api/services/", public=("available",), multiplexed=("batch",)):
+        self.app = app
+        self.prefix = prefix
+        self.public = set(public)
+        self.multiplexed = set(multiplexed)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+        rest = scope["path"][len(self.prefix):]
+        if rest in self.public:
+            await self.app(scope, receive, send)
+            return
+        multiplexed = rest in self.multiplexed and scope["method"] == "POST"
+
+        try:
+            admission = await admit(
+                Headers(scope=scope).get("x-api-key"),
+                None if multiplexed else rest.split("/", 1)[0]
+            )
+        except Rejection as r:
+            if r.metered:
+                await usage_recorder.record(usage_event(*r.metered, r.status_code))
+            response = JSONResponse({"detail": r.detail}, status_code=r.status_code, headers=r.headers)
+            await response(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        state["api_key"] = admission.api_key
+        state["key_context"] = admission.key_context
+        state["service"] = admission.service
+        state["usage_endpoint"] = admission.service.endpoint if admission.service else None
+        state["usage_items"] = 1
+        state["rate_limit_headers"] = admission.headers
+        status_code = 500
+
+        async def send_and_capture(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                extra_headers = [
+                    (k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in state["rate_limit_headers"].items()
+                ]
+                if extra_headers:
+                    message = {**message, "headers": [*message.get("headers", ()), *extra_headers]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_capture)
+        finally:
+            if state["usage_endpoint"]:
+                await usage_recorder.record(usage_event(
+                    admission.api_key, state["usage_endpoint"], status_code, state["usage_items"]
+                ))
@@ -0,0 +1,105 @@
+from typing import Dict, Iterable, List, Optional
+import ipaddress
+import struct
+from app.utils.cache import TTLCache
+from app.utils.mmap_index import MappedRecords, write_records
+
+GEOIP_MAGIC = b"GEOIPV1\0"
+# range start (key), range end, country, city, isp, timezone
+GEOIP_RECORD = struct.Struct("<16s16s32s48s48s32s")
+FIELDS = ("country", "city", "isp", "timezone")
+V4_MAPPED_PREFIX = b"\0" * 10 + b"\xff\xff"
+
+# What the service answered before a database could be configured
+MOCK_RECORD = {
+    "country": "United States",
+    "city": "Mountain View",
+    "isp": "Google LLC",
+    "timezone": "America/Los_Angeles"
+}
+
+
+def ip_key(address: str) -> bytes:
+    """16-byte big-endian key; IPv4 addresses sort as IPv4-mapped IPv6 (::ffff:a.b.c.d)"""
+    packed = ipaddress.ip_address(address.strip()).packed
+    return V4_MAPPED_PREFIX + packed if len(packed) == 4 else packed
+
+
+def _fixed(text: str, size: int) -> bytes:
+    data = (text or "").encode("utf-8")
+    if len(data) > size:
+        raise ValueError(f"{text!r} is longer than {size} bytes")
+    return data
+
+
+def write_geoip_file(path: str, ranges: Iterable[dict]) -> int:
+    """Write `{start, end, country, city, isp, timezone}` ranges; they must not overlap"""
+    rows = sorted(
+        (ip_key(r["start"]), ip_key(r["end"]), *(_fixed(r.get(f), s) for f, s in zip(FIELDS, (32, 48, 48, 32))))
+        for r in ranges
+    )
+    for prev, cur in zip(rows, rows[1:]):
+        if cur[0] <= prev[1]:
+            raise ValueError(f"Range starting at {ipaddress.ip_address(cur[0])} overlaps the one before it")
+    for row in rows:
+        if row[1] < row[0]:
+            raise ValueError(f"Range starting at {ipaddress.ip_address(row[0])} ends before it starts")
+    return write_records(path, GEOIP_MAGIC, GEOIP_RECORD, 16, rows)
+
+
+class GeoIPDatabase:
+    """IP address -> location, from a memory-mapped file of sorted ranges.
+
+    Lookups binary-search the range starts for the last one at or below the
+    address and check it against that range's end. IPv4 and IPv6 share one
+    file. Answers for hot addresses are kept in an LRU that is cleared on
+    `reload`. Without a file every address gets the old mock record.
+    """
+
+    def __init__(self, path: Optional[str] = None, cache_size: int = 100000, cache_ttl: float = 3600.0):
+        self.path = path
+        self.reloads = 0
+        self._file: Optional[MappedRecords] = None
+        self._cache = TTLCache(cache_size, cache_ttl)
+        self.reload()
+
+    def reload(self):
+        if self.path:
+            new_file = MappedRecords(self.path, GEOIP_MAGIC, GEOIP_RECORD, 16)
+            old_file, self._file = self._file, new_file
+            if old_file is not None:
+                old_file.close()
+        self._cache.clear()
+        self.reloads += 1
+
+    def lookup(self, address: str) -> dict:
+        """Location fields for `address` (all None when no range covers it); ValueError if it isn't an IP"""
+        if self._file is None:
+            ipaddress.ip_address(address.strip())
+            return {"ip": address, **MOCK_RECORD}
+
+        # Keyed on the address as given, so hot addresses skip parsing too
+        found = self._cache.get(address)
+        if found is None:
+            found = self._find(ip_key(address))
+            self._cache.set(address, found)
+        return {"ip": address, **found}
+
+    def _find(self, key: bytes) -> Dict[str, Optional[str]]:
+        i = self._file.bisect_right(key) - 1
+        if i >= 0:
+            rec = self._file.unpack(i)
+            if key <= rec[1]:
+                return {f: v.rstrip(b"\0").decode("utf-8") or None for f, v in zip(FIELDS, rec[2:])}
+        return dict.fromkeys(FIELDS)
+
+    def lookup_many(self, addresses: Iterable[str]) -> List[dict]:
+        return [self.lookup(address) for address in addresses]
+
+    def stats(self) -> dict:
+        return {
+            "source": self.path or "mock",
+            "ranges": len(self._file) if self._file is not None else 0,
+            "reloads": self.reloads,
+            "cache": self._cache.stats(),
+        }
@@ -0,0 +1,262 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Set, Tuple
+from bson import ObjectId
+import asyncio
+import logging
+from app.config import settings
+from app.database import get_db
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATIONS = "key_cache_invalidations"
+
+
+class KeyContext(NamedTuple):
+    api_key: dict
+    subscription: Optional[dict]
+    plan: Optional[dict]
+
+
+class KeyContextCache(TTLCache):
+    """Resolved (key, subscription, plan) contexts keyed by API key hash.
+
+    Secondary indexes by key id, user id and plan id let admin actions drop
+    every affected entry without knowing the raw key.
+
+    A load still in flight when its key, user or plan is invalidated read
+    the old documents, so it is not cached. Each invalidation bumps
+    `generation` and records it against the owner; a load only caches its
+    result when none of its owners moved past the generation it started at.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize, ttl)
+        self.loads = 0
+        self.invalidations = 0
+        self.stale_loads = 0
+        self.generation = 0
+        self._loading = 0
+        # ("key" | "user" | "plan", id) -> generation it was last invalidated at, while loads run
+        self._invalidated: Dict[Tuple[str, str], int] = {}
+        self._by_key: Dict[str, str] = {}
+        self._by_user: Dict[str, Set[str]] = {}
+        self._by_plan: Dict[str, Set[str]] = {}
+
+    def set(self, key_hash: Hashable, ctx: KeyContext, ttl: Optional[float] = None):
+        self.pop(key_hash)
+        super().set(key_hash, ctx, ttl)
+        self._by_key[str(ctx.api_key["_id"])] = key_hash
+        self._by_user.setdefault(ctx.api_key["user_id"], set()).add(key_hash)
+        if ctx.plan:
+            self._by_plan.setdefault(str(ctx.plan["_id"]), set()).add(key_hash)
+
+    def _on_evict(self, key_hash: Hashable, ctx: Any):
+        self._by_key.pop(str(ctx.api_key["_id"]), None)
+        _discard(self._by_user, ctx.api_key["user_id"], key_hash)
+        if ctx.plan:
+            _discard(self._by_plan, str(ctx.plan["_id"]), key_hash)
+
+    def clear(self):
+        super().clear()
+        self._by_key.clear()
+        self._by_user.clear()
+        self._by_plan.clear()
+
+    def start_load(self) -> int:
+        self.loads += 1
+        self._loading += 1
+        return self.generation
+
+    def finish_load(self, key_hash: Hashable, ctx: Optional[KeyContext], started: int):
+        """Cache a loaded context unless it was invalidated after the load started"""
+        self._loading -= 1
+        if ctx is not None:
+            if any(self._invalidated.get(owner, 0) > started for owner in _owners(ctx)):
+                self.stale_loads += 1
+            else:
+                self.set(key_hash, ctx)
+        if not self._loading:
+            self._invalidated.clear()
+
+    def _bump(self, owner: Tuple[str, str]):
+        self.generation += 1
+        if self._loading:
+            self._invalidated[owner] = self.generation
+
+    def invalidate_key(self, key_id: str):
+        self._bump(("key", key_id))
+        key_hash = self._by_key.get(key_id)
+        if key_hash is not None:
+            self.pop(key_hash)
+            self.invalidations += 1
+
+    def invalidate_user(self, user_id: str):
+        self._bump(("user", user_id))
+        for key_hash in list(self._by_user.get(user_id, ())):
+            self.pop(key_hash)
+            self.invalidations += 1
+
+    def invalidate_plan(self, plan_id: str):
+        self._bump(("plan", plan_id))
+        for key_hash in list(self._by_plan.get(plan_id, ())):
+            self.pop(key_hash)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {**super().stats(), "loads": self.loads, "invalidations": self.invalidations,
+                "stale_loads": self.stale_loads}
+
+
+def _owners(ctx: KeyContext) -> List[Tuple[str, str]]:
+    owners = [("key", str(ctx.api_key["_id"])), ("user", ctx.api_key["user_id"])]
+    if ctx.plan:
+        owners.append(("plan", str(ctx.plan["_id"])))
+    return owners
+
+
+def _discard(index: Dict[str, Set[str]], owner: str, key_hash: Hashable):
+    hashes = index.get(owner)
+    if hashes is not None:
+        hashes.discard(key_hash)
+        if not hashes:
+            del index[owner]
+
+
+key_cache = KeyContextCache(settings.key_cache_size, settings.key_cache_ttl_seconds)
+
+
+class KeyCacheInvalidations:
+    """Key cache invalidations, applied on every worker.
+
+    Each one takes effect here at once and is written to the
+    `key_cache_invalidations` collection. Every worker polls it every
+    `poll_interval` seconds and applies what the others wrote, so a revoked
+    key, a deactivated user or a changed plan is dropped everywhere within
+    about one interval instead of the cache TTL. Each poll re-reads the last
+    `overlap` seconds, which covers clock skew between workers and writes
+    that commit late; entries already applied are skipped.
+    """
+
+    def __init__(self, cache: KeyContextCache, poll_interval: float = 1.0, overlap: float = 5.0):
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self.overlap = timedelta(seconds=overlap)
+        self.published = 0
+        self.applied = 0
+        self._since = datetime.utcnow()
+        # _id -> at, for entries inside the overlap
+        self._seen: Dict[ObjectId, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def invalidate_key(self, key_id: str):
+        await self._publish("key", key_id)
+
+    async def invalidate_user(self, user_id: str):
+        await self._publish("user", user_id)
+
+    async def invalidate_plan(self, plan_id: str):
+        await self._publish("plan", plan_id)
+
+    async def _publish(self, kind: str, owner_id: str):
+        self._apply(kind, owner_id)
+        at = datetime.utcnow()
+        result = await get_db()[INVALIDATIONS].insert_one({"kind": kind, "owner_id": owner_id, "at": at})
+        self._seen[result.inserted_id] = at
+        self.published += 1
+
+    def _apply(self, kind: str, owner_id: str):
+        if kind == "key":
+            self.cache.invalidate_key(owner_id)
+        elif kind == "user":
+            self.cache.invalidate_user(owner_id)
+        elif kind == "plan":
+            self.cache.invalidate_plan(owner_id)
+
+    async def poll(self):
+        """Apply invalidations published by other workers since the last poll"""
+        since = self._since - self.overlap
+        docs = await get_db()[INVALIDATIONS].find({"at": {"$gt": since}}).sort("at", 1).to_list(None)
+        for doc in docs:
+            if doc["_id"] not in self._seen:
+                self._seen[doc["_id"]] = doc["at"]
+                self._apply(doc["kind"], doc["owner_id"])
+                self.applied += 1
+            self._since = max(self._since, doc["at"])
+        cutoff = self._since - self.overlap
+        self._seen = {_id: at for _id, at in self._seen.items() if at > cutoff}
+
+    async def start(self):
+        self._since = datetime.utcnow()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Polling key cache invalidations failed")
+
+    def stats(self) -> dict:
+        return {"published": self.published, "applied": self.applied, "poll_interval_seconds": self.poll_interval}
+
+
+key_invalidations = KeyCacheInvalidations(key_cache, settings.key_cache_sync_seconds)
+
+
+def key_context_pipeline(key_hash: str) -> list:
+    """Join key -> subscription -> plan in a single round trip"""
+    return [
+        {"$match": {"key_hash": key_hash}},
+        {"$limit": 1},
+        {"$lookup": {
+            "from": "subscriptions",
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "as": "subscription"
+        }},
+        {"$unwind": {"path": "$subscription", "preserveNullAndEmptyArrays": True}},
+        # plan_id is stored as a string; convert it so the join can use _id
+        {"$addFields": {"plan_oid": {"$toObjectId": "$subscription.plan_id"}}},
+        {"$lookup": {
+            "from": "plans",
+            "localField": "plan_oid",
+            "foreignField": "_id",
+            "as": "plan"
+        }},
+        {"$unwind": {"path": "$plan", "preserveNullAndEmptyArrays": True}},
+    ]
+
+
+async def load_key_context(key_hash: str) -> Optional[KeyContext]:
+    db = get_db()
+    docs = await db.api_keys.aggregate(key_context_pipeline(key_hash)).to_list(1)
+    if not docs:
+        return None
+
+    api_key = docs[0]
+    api_key.pop("plan_oid", None)
+    sub = api_key.pop("subscription", None)
+    plan = api_key.pop("plan", None)
+    return KeyContext(api_key, sub, plan)
+
+
+async def get_key_context(key_hash: str) -> Optional[KeyContext]:
+    ctx = key_cache.get(key_hash)
+    if ctx is None:
+        started = key_cache.start_load()
+        try:
+            ctx = await load_key_context(key_hash)
+        finally:
+            key_cache.finish_load(key_hash, ctx, started)
+    return ctx
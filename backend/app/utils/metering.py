@@ -0,0 +1,193 @@
+from typing import Callable, List, Optional
+from pymongo.errors import BulkWriteError
+import asyncio
+import logging
+from app.config import settings
+from app.database import get_db
+from app.utils.rollups import rollup_updates
+from app.utils.usage_storage import is_timeseries
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class UsageRecorder:
+    """Buffers usage events and writes them in batches off the request path.
+
+    A background task drains the queue whenever `batch_size` events are
+    waiting or `flush_interval` seconds have passed, then writes the batch
+    with one `insert_many` and `bulk_write`s of coalesced `$inc` updates for
+    the daily rollups. Subscription usage is reserved up front by the quota
+    leaser, not counted here. When the queue is full, `record` waits for room, which
+    pushes back on request handlers instead of growing memory without bound.
+
+    Listeners added with `add_listener` are called with every batch once it
+    is stored; they run on the flush task and must not block.
+    """
+
+    max_attempts = 3
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 500, flush_interval: float = 1.0):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.uncertain = 0
+        self.backpressure_waits = 0
+        self._timeseries: Optional[bool] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[List[dict]], None]] = []
+
+    def add_listener(self, listener: Callable[[List[dict]], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[List[dict]], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    async def start(self):
+        self._queue = asyncio.Queue(self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        task, self._task = self._task, None
+        await task
+
+        # Events queued behind the stop marker by requests still in flight
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for start in range(0, len(pending), self.batch_size):
+            await self._flush(pending[start:start + self.batch_size])
+
+    async def record(self, event: dict):
+        self.recorded += 1
+        if self._task is None:
+            # Not running inside the app lifespan (scripts, shells): write through
+            await self._flush([event])
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.backpressure_waits += 1
+            await self._queue.put(event)
+
+    async def record_many(self, events: List[dict]):
+        """Record a batch of events together, e.g. every item of a batch call"""
+        if self._task is None:
+            self.recorded += len(events)
+            await self._flush(events)
+            return
+        for event in events:
+            await self.record(event)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            event = await self._queue.get()
+            if event is _STOP:
+                return
+            batch = [event]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if event is _STOP:
+                    stopping = True
+                    break
+                batch.append(event)
+            await self._flush(batch)
+
+    async def _flush(self, events: List[dict]):
+        # [collection, operations] still to apply; retries resume with what is left
+        pending = [["usage_logs", list(events)], *([c, ops] for c, ops in rollup_updates(events).items())]
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self.write(pending)
+                self.flushed += len(events)
+                self.flushes += 1
+                self._notify(events)
+                return
+            except Exception:
+                logger.exception("Usage flush failed (attempt %d/%d, %d events)", attempt, self.max_attempts, len(events))
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(self.flush_interval)
+        self.dropped += len(events)
+
+    def _notify(self, events: List[dict]):
+        for listener in self._listeners:
+            try:
+                listener(events)
+            except Exception:
+                logger.exception("Usage listener failed")
+
+    async def write(self, pending: list):
+        """Apply each step in order, dropping it from `pending` once it is stored.
+
+        After a partial failure only the failed operations stay pending, so a
+        retry never applies a rollup `$inc` twice. Events already inserted
+        are rejected on retry as duplicate `_id`s, except in a time-series
+        usage_logs, which doesn't enforce unique `_id`s: there an insert that
+        failed without saying which events were stored is not retried.
+        """
+        db = get_db()
+        while pending:
+            collection, ops = pending[0]
+            try:
+                if collection == "usage_logs":
+                    await db.usage_logs.insert_many(ops, ordered=False)
+                else:
+                    await db[collection].bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                failed = [ops[err["index"]] for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+                if failed:
+                    pending[0][1] = failed
+                    raise
+            except Exception:
+                if collection == "usage_logs" and await self._usage_logs_timeseries(db):
+                    # Possibly stored already; a retry could store the events twice
+                    self.uncertain += len(ops)
+                    pending.pop(0)
+                raise
+            pending.pop(0)
+
+    async def _usage_logs_timeseries(self, db) -> bool:
+        if self._timeseries is None:
+            try:
+                self._timeseries = await is_timeseries(db)
+            except Exception:
+                return settings.usage_logs_timeseries
+        return self._timeseries
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "dropped": self.dropped,
+            "uncertain": self.uncertain,
+            "backpressure_waits": self.backpressure_waits,
+        }
+
+
+usage_recorder = UsageRecorder(
+    max_queue=settings.usage_queue_size,
+    batch_size=settings.usage_batch_size,
+    flush_interval=settings.usage_flush_interval_seconds,
+)
@@ -0,0 +1,92 @@
+from typing import Iterable, Optional, Tuple
+import mmap
+import os
+import struct
+
+# magic, record size, record count
+HEADER = struct.Struct("<8sII")
+
+
+class MappedRecords:
+    """Sorted fixed-width records in a read-only memory-mapped file.
+
+    Each record starts with a `key_size`-byte key and records are sorted by
+    it, so lookups are a binary search over the mapping. Nothing is parsed
+    at open time and the pages are shared by every process that maps the
+    same file, so memory and startup cost don't grow with the file.
+    """
+
+    def __init__(self, path: str, magic: bytes, record: struct.Struct, key_size: int):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, record_size, count = HEADER.unpack_from(self._mmap, 0)
+        if file_magic != magic or record_size != record.size:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a {magic.decode()} file of {record.size}-byte records")
+        if len(self._mmap) != HEADER.size + record_size * count:
+            self._mmap.close()
+            raise ValueError(f"{path} is truncated")
+        self.path = path
+        self.record = record
+        self.key_size = key_size
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def key(self, i: int) -> bytes:
+        offset = HEADER.size + i * self.record.size
+        return self._mmap[offset:offset + self.key_size]
+
+    def unpack(self, i: int) -> tuple:
+        return self.record.unpack_from(self._mmap, HEADER.size + i * self.record.size)
+
+    def bisect_left(self, key: bytes) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def bisect_right(self, key: bytes) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key < self.key(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def find(self, key: bytes) -> Optional[tuple]:
+        """The record whose key equals `key` (padded to `key_size`), if any"""
+        i = self.bisect_left(key)
+        if i < self.count and self.key(i) == key:
+            return self.unpack(i)
+        return None
+
+    def close(self):
+        self._mmap.close()
+
+
+def write_records(path: str, magic: bytes, record: struct.Struct, key_size: int, rows: Iterable[Tuple]) -> int:
+    """Pack `rows` with `record`, sort them by key and write them out for `MappedRecords`.
+
+    The file is written next to `path` and renamed over it, so workers
+    that still have the old file mapped keep reading a consistent copy.
+    """
+    packed = sorted(record.pack(*row) for row in rows)
+    for prev, cur in zip(packed, packed[1:]):
+        if prev[:key_size] == cur[:key_size]:
+            raise ValueError(f"Duplicate key {cur[:key_size]!r}")
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(magic, record.size, len(packed)))
+        for rec in packed:
+            f.write(rec)
+    os.replace(tmp_path, path)
+    return len(packed)
@@ -0,0 +1,67 @@
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+import json
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+STREAM_BATCH_SIZE = 1000  # documents per cursor round trip
+STREAM_CHUNK_DOCS = 100  # documents per chunk written to the client
+
+
+def parse_cursor(after: Optional[str]) -> dict:
+    """`_id` filter for the page after `after` (the last id of the previous page)"""
+    if after is None:
+        return {}
+    try:
+        return {"_id": {"$gt": ObjectId(after)}}
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def fetch_page(collection, query: dict, projection: dict, after: Optional[str],
+                     limit: int) -> Tuple[List[dict], Optional[str]]:
+    """One keyset page in `_id` order, and the cursor for the next one (None on the last page)"""
+    docs = await collection.find(
+        {**query, **parse_cursor(after)}, projection
+    ).sort("_id", 1).limit(limit + 1).to_list(limit + 1)
+    if len(docs) > limit:
+        return docs[:limit], str(docs[limit - 1]["_id"])
+    return docs, None
+
+
+async def paginate(collection, query: dict, projection: dict, after: Optional[str], limit: int,
+                   response: Response) -> List[dict]:
+    """Like `fetch_page`, with the next cursor set as the X-Next-Cursor header"""
+    docs, next_cursor = await fetch_page(collection, query, projection, after, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return docs
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def stream_ndjson(collection, query: dict, projection: dict, after: Optional[str],
+                  to_item: Callable[[dict], dict]) -> StreamingResponse:
+    """Every matching document after `after`, one JSON object per line, read straight off the cursor"""
+    cursor = collection.find(
+        {**query, **parse_cursor(after)}, projection
+    ).sort("_id", 1).batch_size(STREAM_BATCH_SIZE)
+
+    async def lines():
+        chunk = []
+        async for doc in cursor:
+            chunk.append(json.dumps(to_item(doc), default=_json_default))
+            if len(chunk) == STREAM_CHUNK_DOCS:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,138 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+import asyncio
+import importlib.util
+import httpx
+from app.config import settings
+
+# Headers that describe a single connection and must not be forwarded
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "trailers", "transfer-encoding", "upgrade",
+}
+# Gateway credentials stay at the gateway
+STRIPPED_REQUEST_HEADERS = HOP_BY_HOP | {"host", "x-api-key", "authorization", "cookie"}
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class UpstreamPool:
+    """One long-lived `httpx.AsyncClient` per upstream backend.
+
+    Clients keep connections alive between requests (HTTP/2 when the `h2`
+    package is installed) and bodies are streamed both ways, so the gateway
+    never holds a whole payload in memory.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._configs: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._retiring = set()
+
+    def register(self, name: str, base_url: str, timeout: Optional[float] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        if name in self._clients:
+            raise ValueError(f"Upstream {name} is already registered")
+        self._configs[name] = (base_url, timeout)
+        self._clients[name] = httpx.AsyncClient(
+            base_url=base_url,
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(timeout or settings.upstream_timeout_seconds),
+            limits=httpx.Limits(
+                max_connections=settings.upstream_max_connections,
+                max_keepalive_connections=settings.upstream_max_keepalive_connections,
+                keepalive_expiry=settings.upstream_keepalive_expiry_seconds,
+            ),
+            transport=transport,
+        )
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._clients
+
+    def sync(self, upstreams: Dict[str, Tuple[str, Optional[float]]]):
+        """Match the pool to `{name: (base_url, timeout)}`, keeping unchanged clients"""
+        for name in list(self._clients):
+            if upstreams.get(name) != self._configs[name]:
+                self._retire(self._clients.pop(name))
+                del self._configs[name]
+        for name, (base_url, timeout) in upstreams.items():
+            if name not in self._clients:
+                self.register(name, base_url, timeout)
+
+    def _retire(self, client: httpx.AsyncClient):
+        # Let responses still streaming through the old client finish first
+        async def close_later():
+            await asyncio.sleep(settings.upstream_timeout_seconds)
+            await client.aclose()
+        task = asyncio.create_task(close_later())
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    async def close(self):
+        for task in list(self._retiring):
+            task.cancel()
+        clients, self._clients = self._clients, {}
+        self._configs = {}
+        for client in clients.values():
+            await client.aclose()
+
+    async def _send(self, name: str, method: str, path: str, params, headers,
+                    content=None, stream: bool = False) -> httpx.Response:
+        client = self._clients.get(name)
+        if client is None:
+            raise HTTPException(status_code=404, detail="Service not found")
+
+        upstream_request = client.build_request(
+            method,
+            "/" + path.lstrip("/"),
+            params=params,
+            headers=headers,
+            content=content,
+        )
+
+        try:
+            return await client.send(upstream_request, stream=stream)
+        except httpx.TimeoutException:
+            raise HTTPException(status_code=504, detail="Upstream timed out")
+        except httpx.HTTPError:
+            raise HTTPException(status_code=502, detail="Upstream unavailable")
+
+    async def forward(self, name: str, request: Request, path: str) -> StreamingResponse:
+        has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+        upstream_response = await self._send(
+            name, request.method, path, request.query_params, forwarded_headers(request),
+            content=request.stream() if has_body else None, stream=True
+        )
+        return StreamingResponse(
+            upstream_response.aiter_raw(),
+            status_code=upstream_response.status_code,
+            headers=_response_headers(upstream_response),
+            background=BackgroundTask(upstream_response.aclose),
+        )
+
+    async def fetch(self, name: str, path: str, params,
+                    headers: Sequence[Tuple[str, str]] = ()) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """Buffered GET, for responses that are cached or embedded in a batch reply"""
+        upstream_response = await self._send(name, "GET", path, params, list(headers))
+        # httpx has already decoded the body, so its encoding headers no longer apply
+        headers = [
+            (k, v) for k, v in _response_headers(upstream_response).items()
+            if k.lower() not in ("content-encoding", "content-length")
+        ]
+        return upstream_response.status_code, headers, upstream_response.content
+
+    def stats(self) -> dict:
+        return {"upstreams": sorted(self._clients), "http2": HTTP2_AVAILABLE}
+
+
+def forwarded_headers(request: Request) -> List[Tuple[str, str]]:
+    return [(k, v) for k, v in request.headers.items() if k.lower() not in STRIPPED_REQUEST_HEADERS]
+
+
+def _response_headers(upstream_response: httpx.Response) -> Dict[str, str]:
+    return {k: v for k, v in upstream_response.headers.items() if k.lower() not in HOP_BY_HOP}
+
+
+upstream_pool = UpstreamPool()
@@ -0,0 +1,323 @@
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument
+import asyncio
+import logging
+import time
+from app.config import settings
+from app.database import get_db
+
+logger = logging.getLogger(__name__)
+
+
+def get_next_reset_date(now: Optional[datetime] = None) -> datetime:
+    now = now or datetime.utcnow()
+    if now.month == 12:
+        return datetime(now.year + 1, 1, 1)
+    return datetime(now.year, now.month + 1, 1)
+
+
+def period_update(now: datetime, n: int, period_id: ObjectId) -> list:
+    """Pipeline update adding `n` units, first rolling the period over if `reset_at` has passed.
+
+    A rolled-over period gets `period_id`, as does one that has none yet
+    (subscriptions created before periods had ids).
+    """
+    expired = {"$lte": ["$reset_at", now]}
+    return [{"$set": {
+        "usage_count": {"$cond": [expired, n, {"$add": ["$usage_count", n]}]},
+        "reset_at": {"$cond": [expired, get_next_reset_date(now), "$reset_at"]},
+        "period_id": {"$cond": [expired, period_id, {"$ifNull": ["$period_id", period_id]}]},
+    }}]
+
+
+PERIOD_FIELDS = {"user_id": 1, "plan_id": 1, "usage_count": 1, "reset_at": 1, "period_id": 1}
+
+
+async def archive_period(db, before: dict, ended_at: Optional[datetime] = None):
+    """Keep the closing period's count for billing; `ended_at` closes it before its `reset_at`"""
+    period_end = before["reset_at"]
+    if ended_at is not None and ended_at < period_end:
+        period_end = ended_at
+    await db.usage_periods.insert_one({
+        "user_id": before["user_id"],
+        "plan_id": before.get("plan_id"),
+        "usage_count": before.get("usage_count", 0),
+        "period_id": before.get("period_id"),
+        "period_end": period_end,
+        "archived_at": datetime.utcnow()
+    })
+
+
+# (period_id, reset_at) of a subscription period
+Period = Tuple[ObjectId, datetime]
+
+
+def _period_over(lease: list, now: datetime) -> bool:
+    return lease[3] is not None and lease[3][1] <= now
+
+
+class QuotaLeaser:
+    """Atomic monthly quota reservations, taken from MongoDB in blocks.
+
+    A reservation is a conditional `find_one_and_update` that only applies
+    `$inc` while `usage_count` stays within the plan's monthly limit, so
+    concurrent requests on any number of workers can never overshoot it.
+    To avoid a round trip per request, each worker reserves `lease_size`
+    units at a time and spends them locally; near the limit it falls back
+    to reserving exactly what the request needs.
+
+    Units leased but not yet spent are counted as used. Leases idle for
+    `reconcile_interval` seconds (and all leases at shutdown) are handed
+    back, so a tenant can be refused early by at most
+    `lease_size - 1` units per worker, and only until the next reconcile.
+    Only one reservation per user runs at a time on a worker, so a burst
+    of first calls shares one block rather than leasing one each. With
+    `lease_size=1` enforcement is exact at one round trip per request.
+
+    The monthly reset is lazy: the same update that reserves units also
+    restarts the count when `reset_at` has passed, and the closing count is
+    archived to `usage_periods`. Leases are tied to the period they were
+    taken in and are not spent after it ends; their unspent units come off
+    that period's count, or off its `usage_periods` record once archived.
+    Periods are told apart by `period_id`, which changes whenever a period
+    closes, including early on a plan change.
+    """
+
+    def __init__(self, lease_size: int = 10, reconcile_interval: float = 30.0):
+        self.lease_size = lease_size
+        self.reconcile_interval = reconcile_interval
+        self.reservations = 0
+        self.rejected = 0
+        self.resets = 0
+        # user_id -> [units held, last used, near limit, (period_id, reset_at)]
+        self._leases: Dict[str, list] = {}
+        # user_id -> [lock, requests using it] while a refill is running or awaited
+        self._refills: Dict[str, list] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def reserve(self, user_id: str, limit: int, cost: int = 1) -> bool:
+        lease = self._leases.get(user_id)
+        if lease is not None and lease[0] >= cost and not _period_over(lease, datetime.utcnow()):
+            lease[0] -= cost
+            lease[1] = time.monotonic()
+            return True
+
+        # One refill per user at a time: requests arriving while a block is
+        # being reserved wait for it and spend from it, instead of each
+        # reserving a block of their own
+        entry = self._refills.get(user_id)
+        if entry is None:
+            entry = self._refills[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await self._refill(user_id, limit, cost)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._refills[user_id]
+
+    async def _refill(self, user_id: str, limit: int, cost: int) -> bool:
+        now = datetime.utcnow()
+        lease = self._leases.get(user_id)
+        if lease is not None and _period_over(lease, now):
+            # The period this lease was taken in is over
+            await self._return(user_id, lease[0], lease[3])
+            lease = self._leases[user_id] = [0, time.monotonic(), False, None]
+
+        if lease is not None and lease[0] >= cost:
+            lease[0] -= cost
+            lease[1] = time.monotonic()
+            return True
+
+        if lease is None:
+            lease = self._leases[user_id] = [0, time.monotonic(), False, None]
+        held, lease[0] = lease[0], 0
+        need = cost - held
+
+        # Once a full block no longer fits, reserve exactly what is needed
+        if not lease[2] and self.lease_size > need:
+            period = await self._take(user_id, limit, self.lease_size, now)
+            if period:
+                await self._credit(user_id, self.lease_size - need, period)
+                self._leases[user_id][2] = False
+                return True
+            lease[2] = True
+
+        period = await self._take(user_id, limit, need, now)
+        if period:
+            await self._credit(user_id, 0, period)
+            return True
+
+        # Not enough left: keep what we were holding
+        await self._credit(user_id, held, lease[3])
+        self.rejected += 1
+        return False
+
+    async def _credit(self, user_id: str, units: int, period: Optional[Period]):
+        lease = self._leases.setdefault(user_id, [0, 0.0, False, period])
+        if lease[3] != period:
+            # The period closed underneath: start the new one clean
+            forfeited, old_period = lease[0], lease[3]
+            lease[:] = [0, 0.0, False, period]
+            await self._return(user_id, forfeited, old_period)
+        lease[0] += units
+        lease[1] = time.monotonic()
+
+    async def _return(self, user_id: str, units: int, period: Optional[Period]):
+        """Take unspent units off the period they were leased in"""
+        if not units or period is None:
+            return
+        period_id = period[0]
+        db = get_db()
+        result = await db.subscriptions.update_one(
+            {"user_id": user_id, "period_id": period_id}, {"$inc": {"usage_count": -units}}
+        )
+        if result.matched_count == 0:
+            # The period has closed: correct its billing record instead
+            await db.usage_periods.update_one(
+                {"user_id": user_id, "period_id": period_id}, {"$inc": {"usage_count": -units}}
+            )
+
+    async def _take(self, user_id: str, limit: int, n: int, now: datetime) -> Optional[Period]:
+        """Reserve `n` units; returns the period (period_id, reset_at) they belong to, or None"""
+        if n > limit:
+            return None
+        self.reservations += 1
+        db = get_db()
+        new_period = ObjectId()
+        before = await db.subscriptions.find_one_and_update(
+            {"user_id": user_id, "$or": [{"reset_at": {"$lte": now}}, {"usage_count": {"$lte": limit - n}}]},
+            period_update(now, n, new_period),
+            projection=PERIOD_FIELDS,
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            return None
+        if before["reset_at"] <= now:
+            self.resets += 1
+            await archive_period(db, before)
+            return new_period, get_next_reset_date(now)
+        return before.get("period_id") or new_period, before["reset_at"]
+
+    async def return_lease(self, user_id: str):
+        """Hand a user's unspent units back now, e.g. before their period is closed early"""
+        lease = self._leases.pop(user_id, None)
+        if lease is not None:
+            await self._return(user_id, lease[0], lease[3])
+
+    async def release(self, idle_for: float = 0.0, concurrency: int = 100):
+        # One conditional update per lease: a lease's period may have closed
+        # on another worker, and only a miss on the subscription tells us to
+        # correct the archived record instead
+        now = time.monotonic()
+        returned = []
+        for user_id, lease in list(self._leases.items()):
+            if now - lease[1] >= idle_for:
+                del self._leases[user_id]
+                if lease[0] and lease[3] is not None:
+                    returned.append((user_id, lease[0], lease[3]))
+        for start in range(0, len(returned), concurrency):
+            await asyncio.gather(*(self._return(*r) for r in returned[start:start + concurrency]))
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.release()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.release(idle_for=self.reconcile_interval)
+            except Exception:
+                logger.exception("Returning idle quota leases failed")
+
+    def stats(self) -> dict:
+        return {
+            "lease_size": self.lease_size,
+            "leases": len(self._leases),
+            "units_held": sum(lease[0] for lease in self._leases.values()),
+            "reservations": self.reservations,
+            "rejected": self.rejected,
+            "resets": self.resets,
+        }
+
+
+class QuotaResetSweeper:
+    """Rolls over subscriptions nobody has touched since their `reset_at`.
+
+    Works through due subscriptions in batches of `batch_size`, pausing
+    `pause` seconds between batches so the month boundary never turns into
+    one large write burst. Each reset is the same conditional update the
+    leaser uses, so sweepers on several workers can run side by side.
+    """
+
+    def __init__(self, interval: float = 300.0, batch_size: int = 100, pause: float = 1.0):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.resets = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def sweep(self):
+        db = get_db()
+        while True:
+            now = datetime.utcnow()
+            due = await db.subscriptions.find(
+                {"reset_at": {"$lte": now}}, {"_id": 1}
+            ).limit(self.batch_size).to_list(self.batch_size)
+            for doc in due:
+                before = await db.subscriptions.find_one_and_update(
+                    {"_id": doc["_id"], "reset_at": {"$lte": now}},
+                    period_update(now, 0, ObjectId()),
+                    projection=PERIOD_FIELDS,
+                    return_document=ReturnDocument.BEFORE
+                )
+                if before is not None:
+                    await archive_period(db, before)
+                    self.resets += 1
+            if len(due) < self.batch_size:
+                return
+            await asyncio.sleep(self.pause)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Quota reset sweep failed")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {"resets": self.resets, "interval_seconds": self.interval, "batch_size": self.batch_size}
+
+
+quota_leaser = QuotaLeaser(settings.quota_lease_size, settings.quota_reconcile_interval_seconds)
+quota_sweeper = QuotaResetSweeper(
+    settings.quota_sweep_interval_seconds,
+    settings.quota_sweep_batch_size,
+    settings.quota_sweep_pause_seconds
+)
@@ -0,0 +1,218 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+from pymongo import ReturnDocument
+import asyncio
+import math
+import time
+from app.config import settings
+from app.database import get_db
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+    def headers(self) -> dict:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class TokenBucketLimiter:
+    """Per-minute token buckets held in one LRU-ordered dict.
+
+    Each bucket is a two-item list of [tokens, last_refill]. A bucket left
+    idle for a full window has refilled completely, so it can be dropped
+    without changing any decision; that keeps memory proportional to the
+    tenants active in the last minute.
+    """
+
+    window = 60.0
+
+    def __init__(self, max_buckets: int = 100000):
+        self.max_buckets = max_buckets
+        self.rejected = 0
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def hit(self, key: str, limit: int, cost: int = 1, now: Optional[float] = None) -> RateLimitResult:
+        now = time.monotonic() if now is None else now
+        rate = limit / self.window
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(limit), now]
+            self._evict_idle(now)
+        else:
+            bucket[0] = min(float(limit), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+
+        allowed = bucket[0] >= cost
+        if allowed:
+            bucket[0] -= cost
+        else:
+            self.rejected += 1
+
+        tokens = bucket[0]
+        return RateLimitResult(
+            allowed=allowed,
+            limit=limit,
+            remaining=int(tokens),
+            reset_after=(limit - tokens) / rate,
+            retry_after=0.0 if allowed else (cost - tokens) / rate,
+        )
+
+    async def acquire(self, key: str, limit: int, cost: int = 1) -> RateLimitResult:
+        return self.hit(key, limit, cost)
+
+    def _evict_idle(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if len(buckets) <= self.max_buckets and now - oldest[1] < self.window:
+                break
+            buckets.popitem(last=False)
+
+    def reset(self, key: str):
+        self._buckets.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "buckets": len(self._buckets),
+            "max_buckets": self.max_buckets,
+            "rejected": self.rejected,
+        }
+
+
+class MongoRateLimiter:
+    """Fixed one-minute windows counted in a shared MongoDB collection.
+
+    Every worker that sees a key reserves tokens from the shared counter in
+    blocks of `lease_size` with one atomic `$inc`, then spends them locally,
+    so the store is touched about once per `lease_size` requests. Only one
+    reservation per key runs at a time on a worker, so a burst shares the
+    blocks instead of each request reserving its own. Once a window is
+    known to be exhausted, rejections are decided without I/O.
+    Tokens still leased when a window closes are forfeited, so a tenant can
+    be under-admitted by at most `lease_size` per worker, never over-admitted.
+    """
+
+    window = 60.0
+
+    def __init__(self, collection: str = "rate_limits", lease_size: int = 10, max_leases: int = 100000):
+        self.collection = collection
+        self.lease_size = lease_size
+        self.max_leases = max_leases
+        self.rejected = 0
+        self.reservations = 0
+        # key -> [window, leased tokens left, last seen shared count]
+        self._leases: "OrderedDict[str, list]" = OrderedDict()
+        # key -> [lock, requests using it] while a refill is running or awaited
+        self._refills: Dict[str, list] = {}
+
+    async def acquire(self, key: str, limit: int, cost: int = 1, now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        window = int(now // self.window)
+        reset_after = (window + 1) * self.window - now
+
+        lease = self._lease(key, window)
+        if lease[1] < cost and lease[2] < limit:
+            # One refill per key at a time; requests arriving meanwhile wait
+            # and spend from the block it brings back
+            entry = self._refills.get(key)
+            if entry is None:
+                entry = self._refills[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    lease = self._lease(key, window)
+                    if lease[1] < cost and lease[2] < limit:
+                        await self._reserve(key, lease, limit, cost)
+            finally:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._refills[key]
+
+        allowed = lease[1] >= cost
+        if allowed:
+            lease[1] -= cost
+        else:
+            self.rejected += 1
+
+        return RateLimitResult(
+            allowed=allowed,
+            limit=limit,
+            remaining=lease[1] + max(0, limit - lease[2]),
+            reset_after=reset_after,
+            retry_after=0.0 if allowed else reset_after,
+        )
+
+    def _lease(self, key: str, window: int) -> list:
+        lease = self._leases.get(key)
+        if lease is None or lease[0] != window:
+            lease = self._leases[key] = [window, 0, 0]
+            self._evict_stale(window)
+        self._leases.move_to_end(key)
+        return lease
+
+    async def _reserve(self, key: str, lease: list, limit: int, cost: int):
+        n = min(max(self.lease_size, cost), limit)
+        window = lease[0]
+        doc = await get_db()[self.collection].find_one_and_update(
+            {"_id": f"{key}:{window}"},
+            {
+                "$inc": {"count": n},
+                "$setOnInsert": {"expires_at": datetime.utcfromtimestamp((window + 2) * self.window)},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self.reservations += 1
+        # Only the part of the block that fits under the limit is ours
+        lease[1] += max(0, min(n, limit - (doc["count"] - n)))
+        lease[2] = max(lease[2], doc["count"])
+
+    def _evict_stale(self, window: int):
+        leases = self._leases
+        while leases:
+            oldest = next(iter(leases.values()))
+            if len(leases) <= self.max_leases and oldest[0] >= window:
+                break
+            leases.popitem(last=False)
+
+    def reset(self, key: str):
+        self._leases.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "mongo",
+            "leases": len(self._leases),
+            "lease_size": self.lease_size,
+            "reservations": self.reservations,
+            "rejected": self.rejected,
+        }
+
+
+def create_rate_limiter():
+    if settings.rate_limit_backend == "mongo":
+        return MongoRateLimiter(lease_size=settings.rate_limit_lease_size, max_leases=settings.rate_limit_max_buckets)
+    return TokenBucketLimiter(settings.rate_limit_max_buckets)
+
+
+rate_limiter = create_rate_limiter()
+
+
+def rate_limit_key(api_key: dict) -> str:
+    if settings.rate_limit_scope == "key":
+        return str(api_key["_id"])
+    return api_key["user_id"]
@@ -0,0 +1,120 @@
+from typing import Awaitable, Callable, Dict, Hashable, List, NamedTuple, Tuple
+import asyncio
+import logging
+import time
+from fastapi import Response
+from app.config import settings
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse(NamedTuple):
+    status_code: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+    fresh_until: float
+
+    def to_response(self, state: str) -> Response:
+        response = Response(content=self.body, status_code=self.status_code)
+        for name, value in self.headers:
+            response.headers[name] = value
+        response.headers["X-Cache"] = state
+        return response
+
+
+def cache_key(service: str, path: str, params) -> tuple:
+    """Service, path and query string with parameter order normalized away"""
+    return (service, path, tuple(sorted(params.multi_items())))
+
+
+def _cacheable(status_code: int, headers: List[Tuple[str, str]]) -> bool:
+    if status_code != 200:
+        return False
+    cache_control = ",".join(v for k, v in headers if k.lower() == "cache-control").lower()
+    return "no-store" not in cache_control and "private" not in cache_control
+
+
+def _sizeof(entry: CachedResponse) -> int:
+    return len(entry.body) + sum(len(k) + len(v) for k, v in entry.headers)
+
+
+Loader = Callable[[], Awaitable[Tuple[int, List[Tuple[str, str]], bytes]]]
+
+
+class ResponseCache:
+    """Shared cache of service responses, bounded by entry count and bytes.
+
+    Each service sets its own TTL. After an entry goes stale it is still
+    served for `stale_seconds` while one background refresh replaces it
+    (stale-while-revalidate). Concurrent misses for the same key share a
+    single load, so a burst of identical calls reaches the backend once.
+    """
+
+    def __init__(self, maxsize: int, max_bytes: int, stale_seconds: float = 30.0):
+        self.stale_seconds = stale_seconds
+        self.coalesced = 0
+        self.stale_served = 0
+        self.refresh_failures = 0
+        self._entries = TTLCache(maxsize, stale_seconds, max_bytes=max_bytes, sizeof=_sizeof)
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, ttl: float, loader: Loader) -> Tuple[CachedResponse, str]:
+        """Return `(response, state)` where state is HIT, STALE or MISS"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.fresh_until > time.monotonic():
+                return entry, "HIT"
+            self.stale_served += 1
+            if key not in self._inflight:
+                self._load(key, ttl, loader).add_done_callback(self._log_refresh_failure)
+            return entry, "STALE"
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._load(key, ttl, loader)
+        else:
+            self.coalesced += 1
+        # Shielded so one caller disconnecting doesn't cancel the load for the rest
+        return await asyncio.shield(task), "MISS"
+
+    def _load(self, key: Hashable, ttl: float, loader: Loader) -> asyncio.Task:
+        async def load() -> CachedResponse:
+            try:
+                status_code, headers, body = await loader()
+                entry = CachedResponse(status_code, headers, body, time.monotonic() + ttl)
+                if _cacheable(status_code, headers):
+                    self._entries.set(key, entry, ttl + self.stale_seconds)
+                return entry
+            finally:
+                del self._inflight[key]
+
+        task = self._inflight[key] = asyncio.create_task(load())
+        return task
+
+    def _log_refresh_failure(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.refresh_failures += 1
+            logger.warning("Refreshing a stale response failed: %r", task.exception())
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        stats = self._entries.stats()
+        del stats["ttl_seconds"]
+        return {
+            **stats,
+            "stale_seconds": self.stale_seconds,
+            "stale_served": self.stale_served,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+response_cache = ResponseCache(
+    settings.response_cache_size,
+    settings.response_cache_max_bytes,
+    settings.response_cache_stale_seconds
+)
@@ -0,0 +1,140 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from pymongo import UpdateOne
+from app.config import settings
+from app.models import UsageStats
+
+# Per-day counters maintained alongside the raw usage_logs, counting each
+# event's `items` (1 unless a per-item-metered call carried more):
+#   usage_daily         {user_id, endpoint, day, total, success, failed, status: {"200": n, ...}}
+#   usage_daily_global  {endpoint, day, total, success, failed, status: {...}}
+DAILY = "usage_daily"
+DAILY_GLOBAL = "usage_daily_global"
+
+
+def day_of(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y-%m-%d")
+
+
+def _increments(events: Iterable[dict], fields: tuple) -> dict:
+    counters = defaultdict(lambda: defaultdict(int))
+    for e in events:
+        group = tuple(e[f] for f in fields) + (day_of(e["timestamp"]),)
+        inc = counters[group]
+        n = e.get("items", 1)
+        inc["total"] += n
+        if 200 <= e["status_code"] < 300:
+            inc["success"] += n
+        else:
+            inc["failed"] += n
+        inc[f"status.{e['status_code']}"] += n
+    return counters
+
+
+def rollup_updates(events: List[dict]) -> dict:
+    """Coalesced upserts for a batch of usage events, keyed by collection"""
+    per_user = _increments(events, ("user_id", "endpoint"))
+    per_endpoint = _increments(events, ("endpoint",))
+    return {
+        DAILY: [
+            UpdateOne({"user_id": u, "endpoint": ep, "day": d}, {"$inc": dict(inc)}, upsert=True)
+            for (u, ep, d), inc in per_user.items()
+        ],
+        DAILY_GLOBAL: [
+            UpdateOne({"endpoint": ep, "day": d}, {"$inc": dict(inc)}, upsert=True)
+            for (ep, d), inc in per_endpoint.items()
+        ],
+    }
+
+
+def stats_from_rollups(docs: Iterable[dict]) -> UsageStats:
+    total = successful = 0
+    by_endpoint = {}
+    by_day = {}
+
+    for doc in docs:
+        total += doc.get("total", 0)
+        successful += doc.get("success", 0)
+        by_endpoint[doc["endpoint"]] = by_endpoint.get(doc["endpoint"], 0) + doc.get("total", 0)
+        by_day[doc["day"]] = by_day.get(doc["day"], 0) + doc.get("total", 0)
+
+    return UsageStats(
+        total_requests=total,
+        successful_requests=successful,
+        failed_requests=total - successful,
+        requests_by_endpoint=by_endpoint,
+        requests_by_day=dict(sorted(by_day.items()))
+    )
+
+
+async def read_usage_stats(db, days: int, user_id: Optional[str] = None) -> UsageStats:
+    start_day = day_of(datetime.utcnow() - timedelta(days=days))
+    query = {"day": {"$gte": start_day}}
+    collection = db[DAILY_GLOBAL]
+    if user_id is not None:
+        query["user_id"] = user_id
+        collection = db[DAILY]
+
+    projection = {"_id": 0, "endpoint": 1, "day": 1, "total": 1, "success": 1}
+    return stats_from_rollups(await collection.find(query, projection).to_list(None))
+
+
+def _rebuild_pipeline(group: dict, since: Optional[datetime], into: str, on: List[str]) -> list:
+    match = {"timestamp": {"$gte": since}} if since else {}
+    day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
+    is_success = {"$and": [{"$gte": ["$_id.status", 200]}, {"$lt": ["$_id.status", 300]}]}
+    return [
+        {"$match": match},
+        {"$group": {"_id": {**group, "day": day, "status": "$status_code"}, "n": {"$sum": {"$ifNull": ["$items", 1]}}}},
+        {"$group": {
+            "_id": {f: f"$_id.{f}" for f in on},
+            "total": {"$sum": "$n"},
+            "success": {"$sum": {"$cond": [is_success, "$n", 0]}},
+            "status": {"$push": {"k": {"$toString": "$_id.status"}, "v": "$n"}},
+        }},
+        {"$project": {
+            "_id": 0,
+            **{f: f"$_id.{f}" for f in on},
+            "total": 1,
+            "success": 1,
+            "failed": {"$subtract": ["$total", "$success"]},
+            "status": {"$arrayToObject": "$status"},
+        }},
+        {"$merge": {"into": into, "on": on, "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+def first_retained_day(ttl_days: Optional[int], now: Optional[datetime] = None) -> Optional[datetime]:
+    """Start of the first day whose raw events are all still in usage_logs (None without a TTL)"""
+    if not ttl_days:
+        return None
+    cutoff = (now or datetime.utcnow()) - timedelta(days=ttl_days)
+    return datetime.strptime(day_of(cutoff), "%Y-%m-%d") + timedelta(days=1)
+
+
+async def rebuild_rollups(db, since: Optional[datetime] = None) -> Optional[datetime]:
+    """Recompute the rollup collections from raw usage_logs on the server.
+
+    Meant to run while metering is quiet (e.g. during a deploy): events
+    flushed during the rebuild may be counted twice. With a usage_logs TTL
+    only days whose events are all retained are rebuilt; older rollups are
+    the only record left and are kept. Returns the first day rebuilt.
+    """
+    retained = first_retained_day(settings.usage_logs_ttl_days)
+    if retained and (since is None or since < retained):
+        since = retained
+
+    day_filter = {"day": {"$gte": day_of(since)}} if since else {}
+    since = datetime.strptime(day_of(since), "%Y-%m-%d") if since else None
+
+    await db[DAILY].delete_many(day_filter)
+    await db[DAILY_GLOBAL].delete_many(day_filter)
+
+    await db.usage_logs.aggregate(_rebuild_pipeline(
+        {"user_id": "$user_id", "endpoint": "$endpoint"}, since, DAILY, ["user_id", "endpoint", "day"]
+    )).to_list(None)
+    await db.usage_logs.aggregate(_rebuild_pipeline(
+        {"endpoint": "$endpoint"}, since, DAILY_GLOBAL, ["endpoint", "day"]
+    )).to_list(None)
+    return since
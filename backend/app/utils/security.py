@@ -1,12 +1,16 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional
+import asyncio
 import secrets
 import hashlib
+import time
 from app.config import settings
+from app.utils.cache import TTLCache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -14,19 +18,126 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool so it never blocks the event loop.
+
+    bcrypt releases the GIL, so `workers` threads hash in parallel while the
+    loop keeps serving requests. At most `max_waiting` calls may queue for a
+    thread; beyond that `PasswordHasherBusy` is raised so a login burst is
+    shed instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_waiting: int):
+        self.workers = workers
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = asyncio.Semaphore(workers)
+
+    async def run(self, fn: Callable, *args):
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.total_seconds += time.perf_counter() - start
+            self.completed += 1
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_ms": round(self.total_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+        }
+
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_waiting)
+
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.run(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.access_token_expire_minutes))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
 
-def decode_token(token: str) -> Optional[dict]:
+def _jose_decode(token: str) -> Optional[dict]:
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        return payload
+        return jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
     except JWTError:
         return None
 
+def _pyjwt_decode(token: str) -> Optional[dict]:
+    try:
+        return pyjwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    except pyjwt.PyJWTError:
+        return None
+
+if settings.jwt_backend == "pyjwt":
+    import jwt as pyjwt
+    _decode = _pyjwt_decode
+else:
+    _decode = _jose_decode
+
+def _payload_size(payload: dict) -> int:
+    # Rough per-entry footprint: digest key, dict overhead and the claim strings
+    return 200 + sum(len(str(k)) + len(str(v)) for k, v in payload.items())
+
+# Verified payloads by token digest, each kept until the token's own exp
+token_cache = TTLCache(
+    maxsize=settings.token_cache_max_bytes // 200,
+    ttl=settings.access_token_expire_minutes * 60,
+    max_bytes=settings.token_cache_max_bytes,
+    sizeof=_payload_size
+)
+
+def decode_token(token: str) -> Optional[dict]:
+    """Verify a bearer token; the returned payload is shared and must not be mutated"""
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return payload
+    
+    payload = _decode(token)
+    if payload is None:
+        return None
+    
+    exp = payload.get("exp")
+    if exp is not None:
+        ttl = exp - time.time()
+        if ttl > 0:
+            token_cache.set(digest, payload, ttl=ttl)
+    return payload
+
 def generate_api_key() -> tuple[str, str, str]:
     """Generate API key, returns (full_key, prefix, hash)"""
     prefix = secrets.token_hex(4)
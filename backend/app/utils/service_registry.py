@@ -0,0 +1,149 @@
+from datetime import datetime
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional
+import asyncio
+import logging
+from app.config import settings
+from app.database import get_db
+from app.utils.builtin_services import BUILTIN_HANDLERS, DEFAULT_SERVICES
+from app.utils.proxy import upstream_pool
+from app.utils.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceSpec(NamedTuple):
+    name: str
+    description: str
+    handler: Optional[Callable[[Mapping[str, str]], dict]]
+    upstream: Optional[str]
+    timeout: Optional[float]
+    cache_ttl: int
+
+    @property
+    def endpoint(self) -> str:
+        return f"/api/services/{self.name}"
+
+
+def spec_from_doc(doc: dict) -> ServiceSpec:
+    return ServiceSpec(
+        name=doc["name"],
+        description=doc.get("description", ""),
+        handler=BUILTIN_HANDLERS.get(doc.get("handler")),
+        upstream=doc.get("upstream"),
+        timeout=doc.get("timeout_seconds"),
+        cache_ttl=doc.get("cache_ttl_seconds", 0),
+    )
+
+
+class ServiceRegistry:
+    """The `services` collection, held in memory as a name -> spec route table.
+
+    Routing is one dict lookup on the first path segment, however many
+    services are registered. Admin changes bump a version counter in
+    `registry_versions`; every worker polls it and rebuilds its table (and
+    the upstream client pool) when it moves, so no restart is needed.
+    """
+
+    def __init__(self, refresh_interval: float = 10.0):
+        self.refresh_interval = refresh_interval
+        self.version = None
+        self.reloads = 0
+        self._routes: Dict[str, ServiceSpec] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, name: str) -> Optional[ServiceSpec]:
+        return self._routes.get(name)
+
+    def all(self) -> List[ServiceSpec]:
+        return list(self._routes.values())
+
+    async def _current_version(self) -> int:
+        meta = await get_db().registry_versions.find_one({"_id": "services"})
+        return meta.get("version", 0) if meta else 0
+
+    async def load(self):
+        version = await self._current_version()
+        docs = await get_db().services.find({"enabled": True}).to_list(None)
+
+        routes = {}
+        for doc in docs:
+            spec = spec_from_doc(doc)
+            if spec.handler is None and not spec.upstream:
+                logger.warning("Service %s has neither a known handler nor an upstream", spec.name)
+                continue
+            routes[spec.name] = spec
+
+        upstream_pool.sync({
+            s.name: (s.upstream, s.timeout) for s in routes.values() if s.handler is None
+        })
+        self._routes = routes
+        # Cached responses may come from a handler or upstream that just changed
+        response_cache.clear()
+        self.version = version
+        self.reloads += 1
+
+    async def seed(self):
+        """Add the built-in services the first time a database is used.
+
+        A `seeded` flag in `registry_versions` marks it done, so built-ins an
+        admin deletes stay deleted across restarts. The upserts are
+        idempotent, so workers starting together may both run them.
+        """
+        db = get_db()
+        if await db.registry_versions.find_one({"_id": "services", "seeded": True}):
+            return
+        # Databases from before the flag already have their services
+        if await db.services.find_one({}, {"_id": 1}) is None:
+            await self._seed_defaults(db)
+        await db.registry_versions.update_one({"_id": "services"}, {"$set": {"seeded": True}}, upsert=True)
+
+    async def _seed_defaults(self, db):
+        for service in DEFAULT_SERVICES:
+            await db.services.update_one(
+                {"name": service["name"]},
+                {"$setOnInsert": {
+                    "upstream": None,
+                    "timeout_seconds": None,
+                    "cache_ttl_seconds": 0,
+                    "enabled": True,
+                    **service,
+                    "updated_at": datetime.utcnow()
+                }},
+                upsert=True
+            )
+
+    async def changed(self):
+        """Publish an admin change to every worker and reload this one now"""
+        await get_db().registry_versions.update_one(
+            {"_id": "services"}, {"$inc": {"version": 1}}, upsert=True
+        )
+        await self.load()
+
+    async def start(self):
+        await self.seed()
+        await self.load()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                if await self._current_version() != self.version:
+                    await self.load()
+            except Exception:
+                logger.exception("Service registry refresh failed")
+
+    def stats(self) -> dict:
+        return {"services": len(self._routes), "version": self.version, "reloads": self.reloads}
+
+
+service_registry = ServiceRegistry(settings.service_registry_refresh_seconds)
@@ -0,0 +1,74 @@
+from datetime import datetime
+from typing import List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from app.models import UsageBreakdown
+
+
+def _dimensions(tz: str) -> dict:
+    return {
+        "endpoint": "$endpoint",
+        "api_key_id": "$api_key_id",
+        "status_code": "$status_code",
+        "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp", "timezone": tz}},
+        "hour": {"$dateToString": {"format": "%Y-%m-%dT%H:00", "date": "$timestamp", "timezone": tz}},
+    }
+
+
+DIMENSIONS = tuple(_dimensions("UTC"))
+
+
+def validate_query(group_by: List[str], tz: str) -> Optional[str]:
+    """Return an error message for unsupported dimensions or timezones"""
+    unknown = [d for d in group_by if d not in DIMENSIONS]
+    if unknown:
+        return f"Unknown dimension(s): {', '.join(unknown)}. Use: {', '.join(DIMENSIONS)}"
+    try:
+        ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        return f"Unknown timezone: {tz}"
+    return None
+
+
+def breakdown_pipeline(match: dict, group_by: List[str], tz: str = "UTC") -> list:
+    """One $facet pass computing totals plus a count per requested dimension"""
+    dimensions = _dimensions(tz)
+    is_success = {"$and": [{"$gte": ["$status_code", 200]}, {"$lt": ["$status_code", 300]}]}
+    # Per-item-metered calls count as their number of items, as in the rollups
+    n = {"$ifNull": ["$items", 1]}
+
+    facets = {
+        "totals": [{"$group": {
+            "_id": None,
+            "total": {"$sum": n},
+            "successful": {"$sum": {"$cond": [is_success, n, 0]}},
+        }}]
+    }
+    for dim in group_by:
+        facets[dim] = [
+            {"$group": {"_id": dimensions[dim], "count": {"$sum": n}}},
+            {"$sort": {"_id": 1}},
+        ]
+
+    # Only the fields the facets read, so the (user_id, timestamp) index can feed the scan
+    fields = {"_id": 0, "status_code": 1, "timestamp": 1, "items": 1, **{d: 1 for d in group_by if d in ("endpoint", "api_key_id")}}
+    return [{"$match": match}, {"$project": fields}, {"$facet": facets}]
+
+
+async def usage_breakdown(db, start: datetime, group_by: List[str], tz: str = "UTC",
+                          user_id: Optional[str] = None) -> UsageBreakdown:
+    match = {"timestamp": {"$gte": start}}
+    if user_id is not None:
+        match["user_id"] = user_id
+
+    result = (await db.usage_logs.aggregate(breakdown_pipeline(match, group_by, tz)).to_list(1))[0]
+    totals = result["totals"][0] if result["totals"] else {"total": 0, "successful": 0}
+
+    return UsageBreakdown(
+        total_requests=totals["total"],
+        successful_requests=totals["successful"],
+        failed_requests=totals["total"] - totals["successful"],
+        breakdown={
+            dim: {str(row["_id"]): row["count"] for row in result[dim]}
+            for dim in group_by
+        }
+    )
@@ -0,0 +1,197 @@
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from pymongo import ReadPreference
+from app.config import settings
+from app.models import UsageArchive, UsageStats
+import json
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only the export job and offline queries need it
+    pa = None
+
+MANIFEST = "manifest.json"
+EXPORT_FIELDS = {"_id": 0, "user_id": 1, "api_key_id": 1, "endpoint": 1, "timestamp": 1, "status_code": 1, "items": 1}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Usage archives need pyarrow: pip install pyarrow")
+
+
+def archive_schema():
+    _require_pyarrow()
+    return pa.schema([
+        ("timestamp", pa.timestamp("ms", tz="UTC")),
+        ("user_id", pa.string()),
+        ("api_key_id", pa.string()),
+        ("endpoint", pa.string()),
+        ("status_code", pa.int16()),
+        ("items", pa.int32()),
+    ])
+
+
+def archive_name(start: datetime, end: datetime) -> str:
+    return f"usage-{start:%Y%m%dT%H%M%S}-{end:%Y%m%dT%H%M%S}.parquet"
+
+
+class UsageArchiveStore:
+    """Parquet archives of usage_logs in one directory, listed by manifest.json.
+
+    Each archive holds the events of one time window [start, end). The
+    manifest's `exported_until` is the checkpoint: everything before it is
+    archived, so an interrupted export picks up at the first missing
+    window. Archives are written to a .part file and only listed once
+    complete.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def manifest(self) -> dict:
+        try:
+            with open(self.path(MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"exported_until": None, "archives": []}
+
+    def _save_manifest(self, manifest: dict):
+        tmp = self.path(MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp, self.path(MANIFEST))
+
+    def archives(self) -> List[UsageArchive]:
+        return [UsageArchive(**a) for a in self.manifest()["archives"]]
+
+    def find(self, name: str) -> Optional[UsageArchive]:
+        """A listed archive by file name; anything else (including paths) is not found"""
+        for archive in self.archives():
+            if archive.file == name:
+                return archive
+        return None
+
+    def checkpoint(self) -> Optional[datetime]:
+        until = self.manifest()["exported_until"]
+        return datetime.fromisoformat(until) if until else None
+
+    async def export(self, db, until: datetime, since: Optional[datetime] = None,
+                     window: timedelta = timedelta(days=1), chunk_rows: int = 100000) -> List[UsageArchive]:
+        """Archive every event before `until` that is not archived yet, one file per `window`.
+
+        Reads go to a secondary when there is one. Memory stays at about
+        `chunk_rows` events, which is also the Parquet row group size.
+        """
+        _require_pyarrow()
+        os.makedirs(self.directory, exist_ok=True)
+        logs = db.usage_logs.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
+
+        start = self.checkpoint() or since
+        if start is None:
+            first = await logs.find_one({"timestamp": {"$lt": until}}, {"timestamp": 1}, sort=[("timestamp", 1)])
+            if first is None:
+                return []
+            start = first["timestamp"].replace(hour=0, minute=0, second=0, microsecond=0)
+
+        written = []
+        while start < until:
+            end = min(start + window, until)
+            archive = await self._write(logs, start, end, chunk_rows)
+            manifest = self.manifest()
+            if archive is not None:
+                manifest["archives"].append(archive.model_dump(mode="json"))
+                written.append(archive)
+            manifest["exported_until"] = end.isoformat()
+            self._save_manifest(manifest)
+            start = end
+        return written
+
+    async def _write(self, logs, start: datetime, end: datetime, chunk_rows: int) -> Optional[UsageArchive]:
+        name = archive_name(start, end)
+        part = self.path(name + ".part")
+        schema = archive_schema()
+        rows = 0
+
+        cursor = logs.find({"timestamp": {"$gte": start, "$lt": end}}, EXPORT_FIELDS).batch_size(min(chunk_rows, 10000))
+        with pq.ParquetWriter(part, schema, compression="zstd") as writer:
+            chunk = []
+            async for doc in cursor:
+                chunk.append(doc)
+                if len(chunk) == chunk_rows:
+                    writer.write_table(_to_table(chunk, schema))
+                    rows += len(chunk)
+                    chunk = []
+            if chunk:
+                writer.write_table(_to_table(chunk, schema))
+                rows += len(chunk)
+
+        if rows == 0:
+            os.remove(part)
+            return None
+        os.replace(part, self.path(name))
+        return UsageArchive(
+            file=name, start=start, end=end, rows=rows,
+            bytes=os.path.getsize(self.path(name)), created_at=datetime.utcnow()
+        )
+
+    def usage_stats(self, start: datetime, end: Optional[datetime] = None,
+                    user_id: Optional[str] = None) -> UsageStats:
+        """UsageStats over the archived events in [start, end), read from the Parquet files only"""
+        _require_pyarrow()
+        files = [
+            self.path(a.file) for a in self.archives()
+            if a.end > start and (end is None or a.start < end)
+        ]
+        if not files:
+            return UsageStats(total_requests=0, successful_requests=0, failed_requests=0,
+                              requests_by_endpoint={}, requests_by_day={})
+
+        ts = ds.field("timestamp")
+        condition = ts >= pa.scalar(start, pa.timestamp("ms", tz="UTC"))
+        if end is not None:
+            condition &= ts < pa.scalar(end, pa.timestamp("ms", tz="UTC"))
+        if user_id is not None:
+            condition &= ds.field("user_id") == user_id
+
+        table = ds.dataset(files, schema=archive_schema(), format="parquet").to_table(
+            columns=["timestamp", "endpoint", "status_code", "items"], filter=condition
+        )
+        # Events count as their number of items, as in the rollups
+        items = table["items"]
+        status = table["status_code"]
+        success = pc.and_(pc.greater_equal(status, 200), pc.less(status, 300))
+        by_endpoint = table.group_by("endpoint").aggregate([("items", "sum")])
+        days = pa.table({"day": pc.strftime(table["timestamp"], format="%Y-%m-%d"), "items": items})
+        by_day = days.group_by("day").aggregate([("items", "sum")])
+
+        total = pc.sum(items).as_py() or 0
+        successful = pc.sum(pc.if_else(success, items, 0)).as_py() or 0
+        return UsageStats(
+            total_requests=total,
+            successful_requests=successful,
+            failed_requests=total - successful,
+            requests_by_endpoint=dict(zip(by_endpoint["endpoint"].to_pylist(), by_endpoint["items_sum"].to_pylist())),
+            requests_by_day=dict(sorted(zip(by_day["day"].to_pylist(), by_day["items_sum"].to_pylist())))
+        )
+
+
+def _to_table(docs: Iterable[dict], schema):
+    docs = list(docs)
+    return pa.table({
+        "timestamp": [d["timestamp"] for d in docs],
+        "user_id": [d["user_id"] for d in docs],
+        "api_key_id": [d["api_key_id"] for d in docs],
+        "endpoint": [d["endpoint"] for d in docs],
+        "status_code": [d["status_code"] for d in docs],
+        "items": [d.get("items", 1) for d in docs],
+    }, schema=schema)
+
+
+usage_archive = UsageArchiveStore(settings.usage_archive_dir)
@@ -0,0 +1,68 @@
+from typing import Optional
+from pymongo.errors import OperationFailure
+import logging
+
+logger = logging.getLogger(__name__)
+
+USAGE_LOGS = "usage_logs"
+TTL_INDEX = "usage_logs_ttl"
+TIMESTAMP_INDEX = "usage_logs_timestamp"
+
+
+def timeseries_options(ttl_seconds: Optional[int]) -> dict:
+    # No metaField: events keep their flat shape, so every query and
+    # aggregation over usage_logs works unchanged on either layout
+    options = {"timeseries": {"timeField": "timestamp", "granularity": "seconds"}}
+    if ttl_seconds:
+        options["expireAfterSeconds"] = ttl_seconds
+    return options
+
+
+async def is_timeseries(db) -> bool:
+    infos = await db.list_collections(filter={"name": USAGE_LOGS}).to_list(1)
+    return bool(infos) and infos[0].get("type") == "timeseries"
+
+
+async def ensure_usage_logs(db, timeseries: bool = False, ttl_days: Optional[int] = None):
+    """Create usage_logs in the configured layout and keep its expiry in line with `ttl_days`.
+
+    A time-series collection stores events in compressed per-time buckets,
+    which cuts the bytes per event by several times and keeps
+    inserts cheap as the collection grows. The layout is only chosen when
+    the collection is first created; an existing regular collection is
+    left as it is (see scripts/migrate_usage_logs.py).
+
+    Raw events are only needed for breakdowns and rollup rebuilds; the
+    daily rollups keep the totals after events expire.
+    """
+    ttl_seconds = ttl_days * 86400 if ttl_days else None
+    exists = bool(await db.list_collection_names(filter={"name": USAGE_LOGS}))
+
+    if timeseries and not exists:
+        await db.create_collection(USAGE_LOGS, **timeseries_options(ttl_seconds))
+    elif timeseries and not await is_timeseries(db):
+        logger.warning("usage_logs already exists as a regular collection; USAGE_LOGS_TIMESERIES only applies to new databases")
+
+    await db[USAGE_LOGS].create_index([("user_id", 1), ("timestamp", -1)])
+    await db[USAGE_LOGS].create_index([("api_key_id", 1), ("timestamp", -1)])
+
+    if await is_timeseries(db):
+        await db.command("collMod", USAGE_LOGS, expireAfterSeconds=ttl_seconds or "off")
+        return
+
+    # Time-range scans (global breakdowns, archive exports) need a timestamp
+    # index: the TTL index when there is one, a plain one otherwise. MongoDB
+    # refuses two indexes on the same key, so only one of them exists at a time.
+    indexes = await db[USAGE_LOGS].index_information()
+    if ttl_seconds:
+        if TIMESTAMP_INDEX in indexes:
+            await db[USAGE_LOGS].drop_index(TIMESTAMP_INDEX)
+        try:
+            await db[USAGE_LOGS].create_index("timestamp", name=TTL_INDEX, expireAfterSeconds=ttl_seconds)
+        except OperationFailure:
+            # The TTL changed since the index was created
+            await db.command("collMod", USAGE_LOGS, index={"name": TTL_INDEX, "expireAfterSeconds": ttl_seconds})
+    else:
+        if TTL_INDEX in indexes:
+            await db[USAGE_LOGS].drop_index(TTL_INDEX)
+        await db[USAGE_LOGS].create_index("timestamp", name=TIMESTAMP_INDEX)
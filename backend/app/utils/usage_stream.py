@@ -0,0 +1,200 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from bson import ObjectId
+import asyncio
+import logging
+from app.config import settings
+from app.database import get_db
+from app.utils.metering import usage_recorder
+from app.utils.rollups import DAILY, day_of
+
+logger = logging.getLogger(__name__)
+
+
+class _UserFeed:
+    """Today's counters and quota for one user, shared by all of their connections"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.day = day_of(datetime.utcnow())
+        self.total = 0
+        self.successful = 0
+        self.by_endpoint: Dict[str, int] = {}
+        self.quota: Optional[dict] = None
+        self.refreshed_at = float("-inf")
+        self.dirty = False
+
+    def reset(self, day: str):
+        self.day = day
+        self.total = self.successful = 0
+        self.by_endpoint = {}
+
+    def add(self, event: dict):
+        day = day_of(event["timestamp"])
+        if day < self.day:
+            return
+        if day > self.day:
+            self.reset(day)
+        n = event.get("items", 1)
+        self.total += n
+        if 200 <= event["status_code"] < 300:
+            self.successful += n
+        self.by_endpoint[event["endpoint"]] = self.by_endpoint.get(event["endpoint"], 0) + n
+        if self.quota is not None:
+            # Kept in step with the counters until the next refresh re-reads the subscription
+            used = self.quota["used"] + n
+            self.quota = {**self.quota, "used": used, "remaining": max(self.quota["limit"] - used, 0)}
+        self.dirty = True
+
+    def snapshot(self) -> dict:
+        return {
+            "day": self.day,
+            "total_requests": self.total,
+            "successful_requests": self.successful,
+            "failed_requests": self.total - self.successful,
+            "requests_by_endpoint": dict(self.by_endpoint),
+            "quota": self.quota,
+        }
+
+
+class UsageStream:
+    """Live per-user usage, pushed to subscribers at most once per `interval`.
+
+    Fed in-process by the usage recorder: each stored batch bumps the
+    counters of users that have a subscriber, and a single ticker task
+    sends every changed user's snapshot to each of their connections. A
+    connection's queue holds `queue_size` snapshots; a slow reader loses
+    the oldest ones, which is harmless since each snapshot is complete.
+
+    Every `refresh_seconds` a user's counters are re-read from the daily
+    rollups and their subscription, which brings in events recorded by
+    other workers and the quota used so far (including units leased but not
+    yet spent). Between refreshes the counters and the quota only move with
+    this worker's events.
+    """
+
+    def __init__(self, interval: float = 1.0, queue_size: int = 4, refresh_seconds: float = 30.0):
+        self.interval = interval
+        self.queue_size = queue_size
+        self.refresh_seconds = refresh_seconds
+        self.updates_sent = 0
+        self.dropped = 0
+        self.refreshes = 0
+        self._feeds: Dict[str, _UserFeed] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        usage_recorder.add_listener(self.publish)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        usage_recorder.remove_listener(self.publish)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def publish(self, events: List[dict]):
+        if not self._feeds:
+            return
+        for event in events:
+            feed = self._feeds.get(event["user_id"])
+            if feed is not None:
+                feed.add(event)
+
+    async def subscribe(self, user_id: str) -> asyncio.Queue:
+        """A queue of usage snapshots for `user_id`, starting with the current one"""
+        queue = asyncio.Queue(self.queue_size)
+        feed = self._feeds.get(user_id)
+        if feed is None:
+            feed = _UserFeed(user_id)
+            await self._refresh(feed)
+            feed.dirty = False  # the snapshot below already carries it
+            # Another connection may have got there first while this one waited
+            feed = self._feeds.setdefault(user_id, feed)
+        feed.subscribers.add(queue)
+        queue.put_nowait(feed.snapshot())
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        feed = self._feeds.get(user_id)
+        if feed is None:
+            return
+        feed.subscribers.discard(queue)
+        if not feed.subscribers:
+            del self._feeds[user_id]
+
+    async def _refresh(self, feed: _UserFeed):
+        # Set up front, so a failing refresh waits for the next round instead of every tick
+        feed.refreshed_at = asyncio.get_running_loop().time()
+        db = get_db()
+        day = day_of(datetime.utcnow())
+        docs = await db[DAILY].find(
+            {"user_id": feed.user_id, "day": day}, {"_id": 0, "endpoint": 1, "total": 1, "success": 1}
+        ).to_list(None)
+        quota = None
+        sub = await db.subscriptions.find_one({"user_id": feed.user_id})
+        if sub:
+            plan = await db.plans.find_one({"_id": ObjectId(sub["plan_id"])}, {"monthly_limit": 1})
+            if plan:
+                used = sub.get("usage_count", 0)
+                quota = {
+                    "limit": plan["monthly_limit"],
+                    "used": used,
+                    "remaining": max(plan["monthly_limit"] - used, 0),
+                    "reset_at": sub["reset_at"].isoformat(),
+                }
+
+        feed.reset(day)
+        for doc in docs:
+            feed.total += doc.get("total", 0)
+            feed.successful += doc.get("success", 0)
+            feed.by_endpoint[doc["endpoint"]] = doc.get("total", 0)
+        feed.quota = quota
+        feed.dirty = True
+        self.refreshes += 1
+
+    def _offer(self, queue: asyncio.Queue, snapshot: dict):
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(snapshot)
+        self.updates_sent += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            due = [f for f in self._feeds.values() if loop.time() - f.refreshed_at >= self.refresh_seconds]
+            if due:
+                results = await asyncio.gather(*(self._refresh(f) for f in due), return_exceptions=True)
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.error("Live usage refresh failed: %s", result)
+            for feed in list(self._feeds.values()):
+                if not feed.dirty:
+                    continue
+                feed.dirty = False
+                snapshot = feed.snapshot()
+                for queue in feed.subscribers:
+                    self._offer(queue, snapshot)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._feeds),
+            "subscribers": sum(len(f.subscribers) for f in self._feeds.values()),
+            "updates_sent": self.updates_sent,
+            "dropped": self.dropped,
+            "refreshes": self.refreshes,
+        }
+
+
+usage_stream = UsageStream(
+    interval=settings.usage_stream_interval_seconds,
+    queue_size=settings.usage_stream_queue_size,
+    refresh_seconds=settings.usage_stream_refresh_seconds,
+)
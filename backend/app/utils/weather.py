@@ -0,0 +1,96 @@
+from typing import Dict, Iterable, List, Optional
+import random
+import struct
+from app.utils.mmap_index import MappedRecords, write_records
+
+WEATHER_MAGIC = b"WTHRIDX1"
+NAME_SIZE = 48
+# case-folded name (key), display name, temperature, condition
+WEATHER_RECORD = struct.Struct(f"<{NAME_SIZE}s{NAME_SIZE}sh16s")
+
+
+def _fixed(text: str, size: int) -> bytes:
+    data = text.encode("utf-8")
+    if len(data) > size:
+        raise ValueError(f"{text!r} is longer than {size} bytes")
+    return data
+
+
+def _text(data: bytes) -> str:
+    return data.rstrip(b"\0").decode("utf-8")
+
+
+def city_key(city: str) -> bytes:
+    """Lookup key for a city: case-folded, NUL-padded like the stored keys"""
+    # Names too long to have been stored keep one extra byte so they never match
+    return city.strip().casefold().encode("utf-8")[:NAME_SIZE + 1].ljust(NAME_SIZE, b"\0")
+
+
+def write_weather_file(path: str, records: Iterable[dict]) -> int:
+    return write_records(path, WEATHER_MAGIC, WEATHER_RECORD, NAME_SIZE, (
+        (
+            _fixed(r["city"].strip().casefold(), NAME_SIZE),
+            _fixed(r["city"].strip(), NAME_SIZE),
+            int(r["temp"]),
+            _fixed(r["condition"], 16),
+        ) for r in records
+    ))
+
+
+def _record(rec: tuple) -> dict:
+    _, name, temp, condition = rec
+    return {"city": _text(name), "temp": temp, "condition": _text(condition)}
+
+
+class WeatherIndex:
+    """City -> weather record, matched case-insensitively.
+
+    Without a data file the built-in records are indexed in a dict keyed by
+    the case-folded city name. With `path` set, records come from a file
+    written by `scripts/build_weather_index.py` and are found by binary
+    search over the memory-mapped file, so a global city list costs no
+    startup time or per-worker memory. `reload` picks up a rebuilt file.
+    """
+
+    def __init__(self, records: List[dict], path: Optional[str] = None):
+        self.records = records
+        self.path = path
+        self.reloads = 0
+        self._by_name: Dict[str, dict] = {}
+        self._file: Optional[MappedRecords] = None
+        self.reload()
+
+    def reload(self):
+        if self.path:
+            new_file = MappedRecords(self.path, WEATHER_MAGIC, WEATHER_RECORD, NAME_SIZE)
+            old_file, self._file = self._file, new_file
+            if old_file is not None:
+                old_file.close()
+        else:
+            self._by_name = {r["city"].casefold(): r for r in self.records}
+        self.reloads += 1
+
+    def get(self, city: str) -> Optional[dict]:
+        if self._file is None:
+            return self._by_name.get(city.strip().casefold())
+        rec = self._file.find(city_key(city))
+        return _record(rec) if rec is not None else None
+
+    def sample(self) -> dict:
+        if self._file is None:
+            return random.choice(self.records)
+        return _record(self._file.unpack(random.randrange(len(self._file))))
+
+    def get_many(self, cities: Iterable[str]) -> Dict[str, Optional[dict]]:
+        return {city: self.get(city) for city in cities}
+
+    def __len__(self) -> int:
+        return len(self._file) if self._file is not None else len(self._by_name)
+
+    def stats(self) -> dict:
+        return {
+            "source": self.path or "builtin",
+            "cities": len(self),
+            "mapped": self._file is not None,
+            "reloads": self.reloads,
+        }
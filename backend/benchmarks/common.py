@@ -0,0 +1,28 @@
+import statistics
+
+
+def percentile(sorted_samples: list, pct: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def summarize(samples: list) -> dict:
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def print_summary(label: str, summary: dict):
+    print(
+        f"{label:<40} n={summary['count']:<7} mean={summary['mean_ms']:.3f}ms "
+        f"p50={summary['p50_ms']:.3f}ms p95={summary['p95_ms']:.3f}ms p99={summary['p99_ms']:.3f}ms"
+    )
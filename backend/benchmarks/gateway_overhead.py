@@ -0,0 +1,122 @@
+"""Per-request cost of the gateway checks as a route dependency vs the ASGI middleware.
+
+Both apps run the same admission logic (key lookup, allowed services, rate
+limit) and meter every call; only the way it is wired in differs. Calls go
+through httpx's in-process ASGI transport with the key context already
+cached and usage events left in the recorder's queue, so no database is
+needed:
+
+    python -m benchmarks.gateway_overhead --requests 20000
+"""
+import argparse
+import asyncio
+import time
+import httpx
+from bson import ObjectId
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response
+from app.utils.gateway import GatewayMiddleware, Rejection, admit, usage_event
+from app.utils.key_cache import KeyContext, key_cache
+from app.utils.metering import usage_recorder
+from app.utils.security import generate_api_key
+from app.utils.service_registry import service_registry, spec_from_doc
+from benchmarks.common import summarize, print_summary
+
+
+def bare_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/services/{service}")
+    async def call(service: str, request: Request):
+        return service_registry.get(service).handler(request.query_params)
+
+    return app
+
+
+def dependency_app() -> FastAPI:
+    """The shape services.py had before: Depends(validate_api_key) plus log_usage in the route"""
+    app = FastAPI()
+
+    async def validate_api_key(request: Request, response: Response, x_api_key: str = Header(..., alias="X-API-Key")):
+        try:
+            admission = await admit(x_api_key, request.path_params["service"])
+        except Rejection as r:
+            raise HTTPException(status_code=r.status_code, detail=r.detail, headers=r.headers)
+        response.headers.update(admission.headers)
+        return admission
+
+    @app.get("/api/services/{service}")
+    async def call(service: str, request: Request, admission=Depends(validate_api_key)):
+        data = admission.service.handler(request.query_params)
+        await usage_recorder.record(usage_event(admission.api_key, admission.service.endpoint, 200))
+        return data
+
+    return app
+
+
+def middleware_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(GatewayMiddleware)
+
+    @app.get("/api/services/{service}")
+    async def call(service: str, request: Request):
+        return request.state.service.handler(request.query_params)
+
+    return app
+
+
+async def measure(app: FastAPI, raw_key: str, n: int) -> list:
+    samples = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(n // 10):
+            await client.get("/api/services/currency", headers={"X-API-Key": raw_key})
+        for _ in range(n):
+            start = time.perf_counter()
+            r = await client.get("/api/services/currency?base=USD&target=EUR", headers={"X-API-Key": raw_key})
+            samples.append(time.perf_counter() - start)
+        assert r.status_code == 200, r.text
+    return samples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    raw_key, _, key_hash = generate_api_key()
+    api_key = {"_id": ObjectId(), "user_id": str(ObjectId()), "key_hash": key_hash,
+               "allowed_services": [], "is_active": True}
+    plan = {"_id": ObjectId(), "monthly_limit": 10**9, "rate_limit_per_minute": 10**9}
+    # No subscription, so quota reservation (a database write per lease) stays out of the comparison
+    key_cache.set(key_hash, KeyContext(api_key, None, plan), ttl=3600)
+    service_registry._routes = {"currency": spec_from_doc({"name": "currency", "handler": "currency"})}
+
+    # Queue events without flushing them anywhere for the length of the run
+    usage_recorder.max_queue = args.requests * 3
+    usage_recorder.batch_size = args.requests * 3
+    usage_recorder.flush_interval = 3600
+    await usage_recorder.start()
+
+    apps = {"no gateway": bare_app(), "Depends(validate_api_key)": dependency_app(),
+            "GatewayMiddleware": middleware_app()}
+    samples = {label: [] for label in apps}
+    # Interleaved rounds, so warm-up and drift don't favour whichever app runs last
+    for _ in range(args.rounds):
+        for label, app in apps.items():
+            samples[label] += await measure(app, raw_key, args.requests // args.rounds)
+
+    results = {}
+    for label in apps:
+        results[label] = summarize(samples[label])
+        print_summary(label, results[label])
+
+    base = results["no gateway"]["p50_ms"]
+    for label in ("Depends(validate_api_key)", "GatewayMiddleware"):
+        print(f"{label:<40} p50 overhead {(results[label]['p50_ms'] - base) * 1000:8.1f} us/request")
+
+    usage_recorder._task.cancel()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
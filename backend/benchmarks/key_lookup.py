@@ -0,0 +1,82 @@
+"""Compare the three-query key resolution path with the single $lookup pipeline.
+
+Seeds a scratch database with N users/keys/subscriptions and times random
+lookups through both paths. Needs a running MongoDB (MONGODB_URL).
+
+    python -m benchmarks.key_lookup --keys 100000 --lookups 2000
+"""
+import argparse
+import asyncio
+import random
+import time
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.config import settings
+from app.utils.key_cache import key_context_pipeline
+from app.utils.security import generate_api_key
+from benchmarks.common import summarize, print_summary
+
+
+async def three_queries(db, key_hash):
+    api_key = await db.api_keys.find_one({"key_hash": key_hash})
+    sub = await db.subscriptions.find_one({"user_id": api_key["user_id"]})
+    plan = await db.plans.find_one({"_id": ObjectId(sub["plan_id"])})
+    return api_key, sub, plan
+
+
+async def single_pipeline(db, key_hash):
+    return await db.api_keys.aggregate(key_context_pipeline(key_hash)).to_list(1)
+
+
+async def seed(db, n_keys, batch=10000):
+    await db.client.drop_database(db.name)
+    plan = await db.plans.insert_one({
+        "name": "bench", "monthly_limit": 10**9, "rate_limit_per_minute": 10**6, "allowed_services": []
+    })
+    hashes = []
+    for start in range(0, n_keys, batch):
+        keys, subs = [], []
+        for i in range(start, min(start + batch, n_keys)):
+            _, prefix, key_hash = generate_api_key()
+            user_id = str(ObjectId())
+            keys.append({"user_id": user_id, "name": f"k{i}", "key_hash": key_hash, "prefix": prefix,
+                         "allowed_services": [], "is_active": True})
+            subs.append({"user_id": user_id, "plan_id": str(plan.inserted_id), "usage_count": 0})
+            hashes.append(key_hash)
+        await db.api_keys.insert_many(keys)
+        await db.subscriptions.insert_many(subs)
+    await db.subscriptions.create_index("user_id", unique=True)
+    return hashes
+
+
+async def measure(fn, db, hashes, lookups):
+    samples = []
+    for key_hash in random.sample(hashes, min(lookups, len(hashes))):
+        start = time.perf_counter()
+        await fn(db, key_hash)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--database", default=f"{settings.database_name}_bench")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(settings.mongodb_url)
+    db = client[args.database]
+    hashes = await seed(db, args.keys)
+
+    print_summary("three queries, no key_hash index", await measure(three_queries, db, hashes, args.lookups))
+    await db.api_keys.create_index("key_hash", unique=True)
+    print_summary("three queries, key_hash index", await measure(three_queries, db, hashes, args.lookups))
+    print_summary("single $lookup pipeline", await measure(single_pipeline, db, hashes, args.lookups))
+
+    await client.drop_database(args.database)
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
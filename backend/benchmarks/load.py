@@ -0,0 +1,231 @@
+"""Load test the running gateway end to end and save the results as JSON.
+
+Seeds a scratch database with N users (one API key and a subscription
+each), a plan and M usage events, starts `uvicorn app.main:app` on it and
+drives each scenario with concurrent clients for --duration seconds,
+reporting throughput and p50/p95/p99. Results go to benchmarks/results/
+(or --output); pass an earlier file as --compare to see the change.
+Needs a running MongoDB (MONGODB_URL):
+
+    python -m benchmarks.load --users 1000 --usage-logs 1000000
+    python -m benchmarks.load --scenarios services usage --compare benchmarks/results/load-20240101T000000.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.config import settings
+from app.utils.quota import get_next_reset_date
+from app.utils.rollups import rebuild_rollups
+from app.utils.security import generate_api_key, hash_password
+from benchmarks.common import summarize, print_summary
+
+PASSWORD = "bench-password"
+ENDPOINTS = ["/api/services/weather", "/api/services/currency", "/api/services/ip-lookup", "/api/services/random-fact"]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+SCENARIOS = ("services", "services-cached", "login", "usage", "usage-breakdown")
+
+
+async def seed(db, n_users: int, n_usage_logs: int, days: int = 30, batch: int = 10000) -> dict:
+    """Fresh users/keys/subscriptions and usage history; returns what the clients need"""
+    await db.client.drop_database(db.name)
+    now = datetime.utcnow()
+    plan = await db.plans.insert_one({
+        "name": "bench", "monthly_limit": 10**9, "rate_limit_per_minute": 10**6,
+        "allowed_services": [], "batch_metering": "call", "created_at": now
+    })
+    # One bcrypt hash for everyone; hashing per user would dominate the seed time
+    password_hash = hash_password(PASSWORD)
+
+    emails, keys, owners = [], [], []
+    for start in range(0, n_users, batch):
+        users = [
+            {"email": f"user{i}@bench.example.com", "password_hash": password_hash, "role": "client",
+             "is_active": True, "created_at": now}
+            for i in range(start, min(start + batch, n_users))
+        ]
+        result = await db.users.insert_many(users)
+        api_keys, subs = [], []
+        for user, user_id in zip(users, result.inserted_ids):
+            raw_key, prefix, key_hash = generate_api_key()
+            api_keys.append({"user_id": str(user_id), "name": "bench", "key_hash": key_hash, "prefix": prefix,
+                             "allowed_services": [], "is_active": True, "created_at": now, "expires_at": None})
+            subs.append({"user_id": str(user_id), "plan_id": str(plan.inserted_id), "usage_count": 0,
+                         "reset_at": get_next_reset_date(now), "created_at": now})
+            emails.append(user["email"])
+            keys.append(raw_key)
+        key_result = await db.api_keys.insert_many(api_keys)
+        await db.subscriptions.insert_many(subs)
+        owners += [(k["user_id"], str(key_id)) for k, key_id in zip(api_keys, key_result.inserted_ids)]
+
+    span = timedelta(days=days).total_seconds()
+    for start in range(0, n_usage_logs, batch):
+        events = []
+        for _ in range(min(batch, n_usage_logs - start)):
+            user_id, api_key_id = random.choice(owners)
+            events.append({
+                "user_id": user_id, "api_key_id": api_key_id, "endpoint": random.choice(ENDPOINTS),
+                "timestamp": now - timedelta(seconds=random.random() * span),
+                "status_code": 200 if random.random() < 0.95 else 429
+            })
+        await db.usage_logs.insert_many(events)
+    if n_usage_logs:
+        await rebuild_rollups(db)
+
+    return {"emails": emails, "keys": keys}
+
+
+def start_server(database: str, port: int, workers: int) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_NAME": database}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get("/api/services/available")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not come up")
+
+
+async def login(client, email: str) -> str:
+    r = await client.post("/api/auth/login", data={"username": email, "password": PASSWORD})
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+def scenarios(data: dict, tokens: list) -> dict:
+    """Each scenario sends one request with a randomly picked tenant"""
+    def bearer():
+        return {"Authorization": f"Bearer {random.choice(tokens)}"}
+
+    return {
+        # random-fact is never cached, so every call runs the full gateway and handler path
+        "services": lambda c: c.get("/api/services/random-fact", headers={"X-API-Key": random.choice(data["keys"])}),
+        "services-cached": lambda c: c.get("/api/services/weather", params={"city": "London"},
+                                           headers={"X-API-Key": random.choice(data["keys"])}),
+        "login": lambda c: c.post("/api/auth/login",
+                                  data={"username": random.choice(data["emails"]), "password": PASSWORD}),
+        "usage": lambda c: c.get("/api/usage/my", params={"days": 30}, headers=bearer()),
+        "usage-breakdown": lambda c: c.get("/api/usage/my/breakdown", params={"days": 30}, headers=bearer()),
+    }
+
+
+async def run(client, send, duration: float, concurrency: int) -> dict:
+    samples, statuses = [], {}
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            r = await send(client)
+            samples.append(time.perf_counter() - start)
+            statuses[str(r.status_code)] = statuses.get(str(r.status_code), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {**summarize(samples), "throughput_rps": round(len(samples) / elapsed, 1), "statuses": statuses}
+
+
+def compare(previous: dict, current: dict):
+    print(f"\nvs {previous.get('started_at')} ({previous.get('git_commit') or 'unknown commit'})")
+    for name, now in current["results"].items():
+        before = previous.get("results", {}).get(name)
+        if not before:
+            continue
+        changes = []
+        for field in ("throughput_rps", "p50_ms", "p99_ms"):
+            if before[field]:
+                changes.append(f"{field} {(now[field] - before[field]) / before[field] * 100:+6.1f}%")
+        print(f"{name:<40} " + "  ".join(changes))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--usage-logs", type=int, default=100000)
+    parser.add_argument("--scenarios", nargs="+", default=None, choices=SCENARIOS, help="default: all")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unrecorded seconds before each scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--token-users", type=int, default=20, help="users logged in for the usage scenarios")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--database", default=f"{settings.database_name}_bench")
+    parser.add_argument("--output", default=None, help="default: benchmarks/results/load-<time>.json")
+    parser.add_argument("--compare", default=None, help="an earlier results file")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded database")
+    args = parser.parse_args()
+
+    mongo = AsyncIOMotorClient(settings.mongodb_url)
+    db = mongo[args.database]
+    started_at = datetime.utcnow()
+    print(f"Seeding {args.users} users and {args.usage_logs} usage events into {args.database}")
+    data = await seed(db, args.users, args.usage_logs)
+
+    server = start_server(args.database, args.port, args.workers)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60) as client:
+            await wait_ready(client)
+            tokens = [await login(client, email) for email in data["emails"][:args.token_users]]
+            available = scenarios(data, tokens)
+            for name in args.scenarios or SCENARIOS:
+                if args.warmup:
+                    await run(client, available[name], args.warmup, args.concurrency)
+                results[name] = await run(client, available[name], args.duration, args.concurrency)
+                print_summary(name, results[name])
+                print(f"{'':<40} {results[name]['throughput_rps']:.1f} req/s  statuses {results[name]['statuses']}")
+    finally:
+        server.terminate()
+        server.wait()
+        if not args.keep:
+            await mongo.drop_database(args.database)
+        mongo.close()
+
+    report = {
+        "started_at": started_at.isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {k: getattr(args, k) for k in ("users", "usage_logs", "duration", "concurrency", "workers")},
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{started_at:%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
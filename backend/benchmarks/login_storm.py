@@ -0,0 +1,68 @@
+"""Measure gateway latency before and during a burst of logins.
+
+Runs against a live server. Gateway p99 should stay close to the baseline
+while logins are hashed on the password pool instead of the event loop.
+
+    uvicorn app.main:app --port 8000
+    python -m benchmarks.login_storm --api-key <key> --email a@example.com --password secret
+"""
+import argparse
+import asyncio
+import time
+import httpx
+from benchmarks.common import summarize, print_summary
+
+
+async def gateway_load(client, api_key, duration, concurrency):
+    samples = []
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await client.get("/api/services/random-fact", headers={"X-API-Key": api_key})
+            samples.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+async def login_storm(client, email, password, duration, concurrency):
+    statuses = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            r = await client.post("/api/auth/login", data={"username": email, "password": password})
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return statuses
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--api-key", required=True)
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--gateway-concurrency", type=int, default=10)
+    parser.add_argument("--login-concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.gateway_concurrency + args.login_concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        baseline = await gateway_load(client, args.api_key, args.duration, args.gateway_concurrency)
+        print_summary("gateway, idle", summarize(baseline))
+
+        during, statuses = await asyncio.gather(
+            gateway_load(client, args.api_key, args.duration, args.gateway_concurrency),
+            login_storm(client, args.email, args.password, args.duration, args.login_concurrency),
+        )
+        print_summary("gateway, during login storm", summarize(during))
+        print(f"login responses: {statuses}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
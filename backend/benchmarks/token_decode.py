@@ -0,0 +1,46 @@
+"""Decode throughput for repeated bearer tokens, with and without the token cache.
+
+Pure CPU, no database needed:
+
+    python -m benchmarks.token_decode --iterations 50000
+"""
+import argparse
+import time
+from app.utils import security
+from app.utils.security import create_access_token, decode_token, token_cache
+
+
+def rate(fn, token, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(token)
+    elapsed = time.perf_counter() - start
+    return iterations / elapsed, elapsed / iterations * 1e6
+
+
+def report(label, result):
+    ops, micros = result
+    print(f"{label:<28} {ops:>12,.0f} decodes/s  {micros:8.2f} us/decode")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50000)
+    args = parser.parse_args()
+
+    token = create_access_token({"sub": "6500000000000000000000aa", "role": "client"})
+
+    report("python-jose, uncached", rate(security._jose_decode, token, args.iterations))
+    try:
+        import jwt as pyjwt
+        security.pyjwt = pyjwt
+        report("PyJWT, uncached", rate(security._pyjwt_decode, token, args.iterations))
+    except ImportError:
+        print("PyJWT not installed, skipping")
+
+    token_cache.clear()
+    report("decode_token, cached", rate(decode_token, token, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
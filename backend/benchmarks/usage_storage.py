@@ -0,0 +1,92 @@
+"""Write throughput and disk footprint of usage_logs as a regular vs a time-series collection.
+
+Inserts N synthetic usage events (time-ordered, as the usage recorder
+writes them) into each layout with the same indexes the app creates, then
+reads the storage and index sizes back from collStats. Needs a running
+MongoDB 6.0+ (MONGODB_URL). Figures for a 100M-event month come from
+running it at that size on the target hardware:
+
+    python -m benchmarks.usage_storage --events 1000000
+    python -m benchmarks.usage_storage --events 100000000 --batch 50000
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.config import settings
+from app.utils.usage_storage import USAGE_LOGS, ensure_usage_logs
+
+ENDPOINTS = ["/api/services/weather", "/api/services/currency", "/api/services/ip-lookup",
+             "/api/services/random-fact", "/api/services/currency/convert"]
+
+
+def events(n: int, n_keys: int, days: int):
+    keys = [(str(ObjectId()), str(ObjectId())) for _ in range(n_keys)]
+    start = datetime.utcnow() - timedelta(days=days)
+    step = timedelta(days=days) / n
+    for i in range(n):
+        user_id, api_key_id = random.choice(keys)
+        yield {
+            "user_id": user_id,
+            "api_key_id": api_key_id,
+            "endpoint": random.choice(ENDPOINTS),
+            "timestamp": start + step * i,
+            "status_code": 200 if random.random() < 0.97 else 429
+        }
+
+
+async def load(db, timeseries: bool, args) -> dict:
+    await db[USAGE_LOGS].drop()
+    await ensure_usage_logs(db, timeseries=timeseries)
+
+    elapsed, batch = 0.0, []
+    for event in events(args.events, args.keys, args.days):
+        batch.append(event)
+        if len(batch) == args.batch:
+            start = time.perf_counter()
+            await db[USAGE_LOGS].insert_many(batch, ordered=False)
+            elapsed += time.perf_counter() - start
+            batch = []
+    if batch:
+        start = time.perf_counter()
+        await db[USAGE_LOGS].insert_many(batch, ordered=False)
+        elapsed += time.perf_counter() - start
+
+    stats = await db.command("collStats", USAGE_LOGS)
+    return {
+        "events_per_s": args.events / elapsed,
+        "storage_bytes": stats["storageSize"],
+        "index_bytes": stats["totalIndexSize"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--keys", type=int, default=10000, help="distinct API keys sending events")
+    parser.add_argument("--days", type=int, default=30, help="time span the events cover")
+    parser.add_argument("--batch", type=int, default=5000, help="events per insert_many, like the recorder's batch size")
+    parser.add_argument("--database", default=f"{settings.database_name}_bench")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(settings.mongodb_url)
+    db = client[args.database]
+
+    for label, timeseries in (("regular collection", False), ("time-series collection", True)):
+        r = await load(db, timeseries, args)
+        total = r["storage_bytes"] + r["index_bytes"]
+        print(
+            f"{label:<24} {r['events_per_s']:>10,.0f} events/s  "
+            f"data {r['storage_bytes'] / 2**20:>9.1f} MiB  indexes {r['index_bytes'] / 2**20:>9.1f} MiB  "
+            f"{total / args.events:>6.1f} bytes/event"
+        )
+
+    await client.drop_database(args.database)
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
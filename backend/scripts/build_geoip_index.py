@@ -0,0 +1,25 @@
+"""Build the memory-mapped IP geolocation file from a CSV of address ranges.
+
+    python -m scripts.build_geoip_index ranges.csv data/geoip.idx
+
+Point GEOIP_DATA_PATH at the output, then restart the workers or call
+POST /api/admin/datasets/reload on each one.
+"""
+import argparse
+import csv
+from app.utils.geoip import write_geoip_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("csv_path", help="CSV with a header row: start,end,country,city,isp,timezone")
+    parser.add_argument("output", help="where to write the index file")
+    args = parser.parse_args()
+
+    with open(args.csv_path, newline="", encoding="utf-8") as f:
+        count = write_geoip_file(args.output, csv.DictReader(f))
+    print(f"Wrote {count} ranges to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
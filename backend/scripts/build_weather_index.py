@@ -0,0 +1,25 @@
+"""Build the memory-mapped weather file from a CSV of city,temp,condition rows.
+
+    python -m scripts.build_weather_index cities.csv data/weather.idx
+
+Point WEATHER_DATA_PATH at the output, then restart the workers or call
+POST /api/admin/datasets/reload on each one.
+"""
+import argparse
+import csv
+from app.utils.weather import write_weather_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("csv_path", help="CSV with a header row: city,temp,condition")
+    parser.add_argument("output", help="where to write the index file")
+    args = parser.parse_args()
+
+    with open(args.csv_path, newline="", encoding="utf-8") as f:
+        count = write_weather_file(args.output, csv.DictReader(f))
+    print(f"Wrote {count} cities to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
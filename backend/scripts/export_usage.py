@@ -0,0 +1,42 @@
+"""Archive raw usage_logs to Parquet files, one per time window, resuming from the last checkpoint.
+
+Run it daily (e.g. from cron) after midnight UTC; it exports every full
+window up to --until that is not archived yet. Needs pyarrow.
+
+    python -m scripts.export_usage                          # up to today 00:00 UTC
+    python -m scripts.export_usage --since 2024-01-01       # first run, from a given day
+    python -m scripts.export_usage --window-hours 1         # hourly files
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from app import database
+from app.utils.usage_archive import usage_archive
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None,
+                        help="where to start when there is no checkpoint yet (default: the first event's day)")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="default: today 00:00 UTC")
+    parser.add_argument("--window-hours", type=float, default=24)
+    parser.add_argument("--chunk-rows", type=int, default=100000, help="events held in memory / per row group")
+    args = parser.parse_args()
+
+    until = args.until or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    await database.connect_db()
+    try:
+        archives = await usage_archive.export(
+            database.get_db(), until, since=args.since,
+            window=timedelta(hours=args.window_hours), chunk_rows=args.chunk_rows
+        )
+    finally:
+        await database.close_db()
+
+    for archive in archives:
+        print(f"{archive.file}: {archive.rows} events, {archive.bytes / 2**20:.1f} MiB")
+    print(f"Usage archived up to {usage_archive.checkpoint() or until}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+"""Move an existing regular usage_logs collection into the time-series layout.
+
+Stop the API first: the usage recorder would otherwise recreate usage_logs
+as a regular collection while the copy runs.
+
+    python -m scripts.migrate_usage_logs          # keep usage_logs_legacy afterwards
+    python -m scripts.migrate_usage_logs --drop   # drop it once copied
+"""
+import argparse
+import asyncio
+from app import database
+from app.config import settings
+from app.utils.usage_storage import USAGE_LOGS, ensure_usage_logs, is_timeseries
+
+LEGACY = f"{USAGE_LOGS}_legacy"
+
+
+async def migrate(db, batch_size: int, drop: bool) -> int:
+    if await is_timeseries(db):
+        return 0
+    # Time-series collections can't be renamed, so the old one moves out of the way instead
+    await db[USAGE_LOGS].rename(LEGACY)
+    await ensure_usage_logs(db, timeseries=True, ttl_days=settings.usage_logs_ttl_days)
+
+    copied, batch = 0, []
+    async for doc in db[LEGACY].find({"timestamp": {"$exists": True}}).sort("_id", 1).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            await db[USAGE_LOGS].insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+    if batch:
+        await db[USAGE_LOGS].insert_many(batch, ordered=False)
+        copied += len(batch)
+
+    if drop:
+        await db[LEGACY].drop()
+    return copied
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--drop", action="store_true", help=f"drop {LEGACY} after copying")
+    args = parser.parse_args()
+
+    await database.connect_db()
+    try:
+        copied = await migrate(database.get_db(), args.batch_size, args.drop)
+    finally:
+        await database.close_db()
+    print(f"Copied {copied} usage events into the time-series {USAGE_LOGS}" if copied else f"{USAGE_LOGS} is already time-series or empty")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,26 @@
+"""Usage stats from the Parquet archives alone, without touching MongoDB.
+
+Prints the same shape as GET /api/usage/global (or /api/usage/user/{id}).
+Needs pyarrow.
+
+    python -m scripts.query_usage_archive --since 2024-01-01 --until 2024-02-01
+    python -m scripts.query_usage_archive --since 2024-01-01 --user-id <user_id>
+"""
+import argparse
+from datetime import datetime
+from app.utils.usage_archive import usage_archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--since", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--user-id", default=None)
+    args = parser.parse_args()
+
+    stats = usage_archive.usage_stats(args.since, args.until, user_id=args.user_id)
+    print(stats.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    main()
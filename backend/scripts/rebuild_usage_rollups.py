@@ -0,0 +1,28 @@
+"""Rebuild the usage_daily rollups from raw usage_logs.
+
+    python -m scripts.rebuild_usage_rollups            # everything (with a TTL: every fully retained day)
+    python -m scripts.rebuild_usage_rollups --days 7   # only the last week
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from app import database
+from app.utils.rollups import rebuild_rollups
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=None, help="only rebuild days in this window")
+    args = parser.parse_args()
+
+    since = datetime.utcnow() - timedelta(days=args.days) if args.days else None
+    await database.connect_db()
+    try:
+        since = await rebuild_rollups(database.get_db(), since)
+    finally:
+        await database.close_db()
+    print("Usage rollups rebuilt" + (f" from {since:%Y-%m-%d}" if since else ""))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
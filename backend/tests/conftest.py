@@ -0,0 +1,41 @@
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from app import database
+from app.utils import cache as cache_module, response_cache as response_cache_module
+from app.utils.key_cache import key_cache
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """A fresh in-memory database behind `get_db()`"""
+    mock = AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(database, "db", mock)
+    return mock
+
+
+@pytest.fixture(autouse=True)
+def clear_key_cache():
+    yield
+    key_cache.clear()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the monotonic clock the caches read expiry times from"""
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    monkeypatch.setattr(response_cache_module, "time", clock)
+    return clock
@@ -0,0 +1,93 @@
+from bson import ObjectId
+import asyncio
+import json
+import httpx
+import pytest
+from app.main import app
+from app.routers import services
+from app.utils import gateway
+from app.utils.builtin_services import DEFAULT_SERVICES
+from app.utils.key_cache import KeyContext, key_cache
+from app.utils.quota import QuotaLeaser, get_next_reset_date
+from app.utils.rate_limit import TokenBucketLimiter
+from app.utils.security import hash_api_key
+from app.utils.service_registry import service_registry, spec_from_doc
+
+pytestmark = pytest.mark.anyio
+
+RAW_KEY = "batch_test_key"
+CALLS = [
+    {"id": "a", "service": "random-fact"},
+    {"id": "b", "service": "random-fact"},
+    {"id": "c", "service": "no-such-service"},
+]
+
+
+@pytest.fixture
+async def client(db, monkeypatch):
+    limiter, leaser = TokenBucketLimiter(), QuotaLeaser(lease_size=1)
+    for module in (gateway, services):
+        monkeypatch.setattr(module, "rate_limiter", limiter)
+        monkeypatch.setattr(module, "quota_leaser", leaser)
+    monkeypatch.setattr(service_registry, "_routes", {s["name"]: spec_from_doc(s) for s in DEFAULT_SERVICES})
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://gateway") as c:
+        yield c
+
+
+async def add_key(db, batch_metering: str, rate_limit: int = 100):
+    plan = {"_id": ObjectId(), "monthly_limit": 100, "rate_limit_per_minute": rate_limit,
+            "batch_metering": batch_metering}
+    sub = {"user_id": "u1", "plan_id": str(plan["_id"]), "usage_count": 0, "reset_at": get_next_reset_date()}
+    await db.subscriptions.insert_one(sub)
+    api_key = {"_id": ObjectId(), "user_id": "u1", "allowed_services": [], "is_active": True, "expires_at": None}
+    key_cache.set(hash_api_key(RAW_KEY), KeyContext(api_key, sub, plan))
+
+
+async def run_batch(client, calls=CALLS):
+    r = await client.post("/api/services/batch", json={"requests": calls}, headers={"X-API-Key": RAW_KEY})
+    while services._background:
+        await asyncio.sleep(0.01)
+    return r
+
+
+async def metered(db):
+    events = await db.usage_logs.find({}, {"_id": 0, "endpoint": 1, "status_code": 1}).to_list(None)
+    return sorted((e["endpoint"], e["status_code"]) for e in events)
+
+
+async def quota_used(db):
+    return (await db.subscriptions.find_one({"user_id": "u1"}))["usage_count"]
+
+
+async def test_item_metering_records_every_charged_item(client, db):
+    await add_key(db, "item")
+
+    r = await run_batch(client)
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert sorted((l["id"], l["status"]) for l in lines) == [("a", 200), ("b", 200), ("c", 404)]
+    assert all("endpoint" not in l for l in lines)
+
+    assert await metered(db) == [
+        ("/api/services/batch", 404), ("/api/services/random-fact", 200), ("/api/services/random-fact", 200)
+    ]
+    assert await quota_used(db) == 3
+
+
+async def test_call_metering_records_the_batch_once(client, db):
+    await add_key(db, "call")
+
+    r = await run_batch(client)
+    assert r.status_code == 200
+    assert await metered(db) == [("/api/services/batch", 200)]
+    assert await quota_used(db) == 1
+
+
+async def test_every_item_takes_a_rate_limit_token(client, db):
+    await add_key(db, "call", rate_limit=2)
+
+    r = await run_batch(client)
+    assert (r.status_code, r.json()["detail"]) == (429, "Rate limit exceeded")
+    assert r.headers["X-RateLimit-Remaining"] == "1"
+    # The refused batch spent only the token its call took at the gateway
+    assert (await run_batch(client, CALLS[:1])).status_code == 200
@@ -0,0 +1,41 @@
+from app.utils.cache import TTLCache
+
+
+def test_ttl_expiry(clock):
+    cache = TTLCache(10, ttl=5)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=20)
+
+    clock.now += 5
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert "a" not in cache
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_eviction(clock):
+    cache = TTLCache(2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_byte_budget(clock):
+    cache = TTLCache(10, ttl=60, max_bytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "yyyy")
+    cache.set("a", "zz")
+    assert cache.bytes == 6
+
+    cache.set("c", "wwwwww")
+    assert "b" not in cache
+    assert cache.bytes == 8
+    assert cache.stats()["bytes"] == 8
+
+    cache.pop("a")
+    assert cache.bytes == 6
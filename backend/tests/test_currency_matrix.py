@@ -0,0 +1,43 @@
+from datetime import datetime
+import pytest
+from app.utils.currency_matrix import RateMatrix, UnknownCurrency
+from app.utils.rollups import DAILY, DAILY_GLOBAL, rollup_updates
+
+RATES = {"USD": 1.0, "EUR": 0.5, "gbp": 0.25}
+
+
+def test_cross_rates():
+    matrix = RateMatrix(RATES)
+    assert matrix.codes == ["EUR", "GBP", "USD"]
+    assert matrix.rate("usd", "eur") == 0.5
+    assert matrix.rate("EUR", "GBP") == 0.5
+    assert matrix.rate("GBP", "USD") == 4.0
+    assert matrix.rate("EUR", "EUR") == 1.0
+
+
+def test_convert_many():
+    matrix = RateMatrix(RATES)
+    assert matrix.convert_many([("USD", "GBP", 10), ("eur", "usd", 3)]) == [(0.25, 2.5), (2.0, 6.0)]
+    with pytest.raises(UnknownCurrency) as e:
+        matrix.convert_many([("USD", "EUR", 1), ("USD", "XXX", 1)])
+    assert str(e.value) == "XXX"
+
+
+def test_rebuilds_only_on_change():
+    matrix = RateMatrix(RATES)
+    assert not matrix.update({"usd": 1, "eur": 0.5, "GBP": 0.25})
+    assert matrix.update({**RATES, "EUR": 0.8})
+    assert matrix.rate("EUR", "USD") == 1.25
+    assert matrix.stats() == {"currencies": 3, "rebuilds": 2}
+
+
+def test_rollups_count_items():
+    now = datetime(2024, 5, 1, 12)
+    events = [
+        {"user_id": "u1", "endpoint": "/api/services/currency/convert", "timestamp": now, "status_code": 200, "items": 5},
+        {"user_id": "u1", "endpoint": "/api/services/currency/convert", "timestamp": now, "status_code": 429},
+    ]
+    updates = rollup_updates(events)
+    inc = updates[DAILY][0]._doc["$inc"]
+    assert inc == {"total": 6, "success": 5, "failed": 1, "status.200": 5, "status.429": 1}
+    assert updates[DAILY_GLOBAL][0]._doc["$inc"] == inc
@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi import FastAPI, Request
+import httpx
+import pytest
+from app.utils import gateway
+from app.utils.gateway import GatewayMiddleware
+from app.utils.key_cache import KeyContext, key_cache
+from app.utils.quota import QuotaLeaser, get_next_reset_date
+from app.utils.rate_limit import TokenBucketLimiter
+from app.utils.security import hash_api_key
+from app.utils.service_registry import ServiceSpec, service_registry
+
+pytestmark = pytest.mark.anyio
+
+RAW_KEY = "gw_test_key"
+
+
+def stand_in_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(GatewayMiddleware)
+
+    @app.get("/api/services/available")
+    async def available():
+        return {"public": True}
+
+    @app.api_route("/api/services/{path:path}", methods=["GET", "POST"])
+    async def call(path: str, request: Request):
+        if path == "echo/fail":
+            raise RuntimeError("boom")
+        service = request.state.service
+        return {"service": service.name if service else None, "user_id": request.state.api_key["user_id"]}
+
+    return app
+
+
+@pytest.fixture
+def gateway_state(db, monkeypatch):
+    monkeypatch.setattr(gateway, "rate_limiter", TokenBucketLimiter())
+    monkeypatch.setattr(gateway, "quota_leaser", QuotaLeaser(lease_size=1))
+    monkeypatch.setattr(service_registry, "_routes", {
+        name: ServiceSpec(name, "", None, "http://upstream", None, 0) for name in ("echo", "other")
+    })
+    return db
+
+
+@pytest.fixture
+async def client(gateway_state):
+    transport = httpx.ASGITransport(stand_in_app(), raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as c:
+        yield c
+
+
+async def add_key(db, rate_limit=100, monthly_limit=100, usage_count=0, **key_fields):
+    plan = {"_id": ObjectId(), "name": "test", "monthly_limit": monthly_limit, "rate_limit_per_minute": rate_limit}
+    sub = {"user_id": "u1", "plan_id": str(plan["_id"]), "usage_count": usage_count,
+           "reset_at": get_next_reset_date()}
+    await db.subscriptions.insert_one(sub)
+    api_key = {"_id": ObjectId(), "user_id": "u1", "allowed_services": [], "is_active": True,
+               "expires_at": None, **key_fields}
+    key_cache.set(hash_api_key(RAW_KEY), KeyContext(api_key, sub, plan))
+    return api_key
+
+
+def headers(key=RAW_KEY):
+    return {"X-API-Key": key}
+
+
+async def usage_logs(db):
+    return await db.usage_logs.find({}, {"_id": 0, "endpoint": 1, "status_code": 1}).to_list(None)
+
+
+async def test_admitted_call_is_charged_and_metered(client, gateway_state):
+    db = gateway_state
+    await add_key(db)
+
+    r = await client.get("/api/services/echo/sub/path", headers=headers())
+    assert r.status_code == 200
+    assert r.json() == {"service": "echo", "user_id": "u1"}
+    assert r.headers["X-RateLimit-Limit"] == "100"
+    assert r.headers["X-RateLimit-Remaining"] == "99"
+    assert await usage_logs(db) == [{"endpoint": "/api/services/echo", "status_code": 200}]
+    assert (await db.subscriptions.find_one({"user_id": "u1"}))["usage_count"] == 1
+
+
+@pytest.mark.parametrize("key_fields, detail", [
+    ({"is_active": False}, "API key is revoked"),
+    ({"expires_at": datetime.utcnow() - timedelta(days=1)}, "API key has expired"),
+])
+async def test_unusable_keys_are_refused(client, gateway_state, key_fields, detail):
+    await add_key(gateway_state, **key_fields)
+
+    r = await client.get("/api/services/echo", headers=headers())
+    assert (r.status_code, r.json()["detail"]) == (401, detail)
+    assert await usage_logs(gateway_state) == []
+
+
+async def test_missing_and_unknown_keys(client, gateway_state):
+    r = await client.get("/api/services/echo")
+    assert (r.status_code, r.json()["detail"]) == (401, "Missing API key")
+
+    r = await client.get("/api/services/echo", headers=headers("unknown"))
+    assert (r.status_code, r.json()["detail"]) == (401, "Invalid API key")
+
+
+async def test_unknown_service(client, gateway_state):
+    await add_key(gateway_state)
+
+    r = await client.get("/api/services/missing", headers=headers())
+    assert r.status_code == 404
+    assert await usage_logs(gateway_state) == []
+
+
+async def test_disallowed_service_is_refused_and_metered(client, gateway_state):
+    await add_key(gateway_state, allowed_services=["echo"])
+
+    r = await client.get("/api/services/other", headers=headers())
+    assert r.status_code == 403
+    assert await usage_logs(gateway_state) == [{"endpoint": "/api/services/other", "status_code": 403}]
+    assert (await gateway_state.subscriptions.find_one({"user_id": "u1"}))["usage_count"] == 0
+
+
+async def test_rate_limit(client, gateway_state):
+    await add_key(gateway_state, rate_limit=2)
+
+    statuses = [(await client.get("/api/services/echo", headers=headers())).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    r = await client.get("/api/services/echo", headers=headers())
+    assert r.json()["detail"] == "Rate limit exceeded"
+    assert r.headers["X-RateLimit-Remaining"] == "0"
+    assert int(r.headers["Retry-After"]) >= 1
+    assert len(await usage_logs(gateway_state)) == 2
+
+
+async def test_monthly_quota(client, gateway_state):
+    await add_key(gateway_state, monthly_limit=5, usage_count=4)
+
+    assert (await client.get("/api/services/echo", headers=headers())).status_code == 200
+    r = await client.get("/api/services/echo", headers=headers())
+    assert (r.status_code, r.json()["detail"]) == (429, "Monthly quota exceeded")
+    assert (await gateway_state.subscriptions.find_one({"user_id": "u1"}))["usage_count"] == 5
+
+
+async def test_failed_route_is_metered_as_500(client, gateway_state):
+    await add_key(gateway_state)
+
+    r = await client.get("/api/services/echo/fail", headers=headers())
+    assert r.status_code == 500
+    assert await usage_logs(gateway_state) == [{"endpoint": "/api/services/echo", "status_code": 500}]
+
+
+async def test_public_and_multiplexed_paths_match_exactly(client, gateway_state):
+    await add_key(gateway_state)
+
+    assert (await client.get("/api/services/available")).json() == {"public": True}
+    assert (await client.get("/api/services/available/x")).status_code == 401
+
+    r = await client.post("/api/services/batch", headers=headers())
+    assert r.json()["service"] is None
+    assert (await client.get("/api/services/batch", headers=headers())).status_code == 404
+    assert (await client.post("/api/services/batch/x", headers=headers())).status_code == 404
@@ -0,0 +1,70 @@
+import pytest
+from app.utils.geoip import MOCK_RECORD, GeoIPDatabase, ip_key, write_geoip_file
+
+RANGES = [
+    {"start": "10.0.0.0", "end": "10.0.0.255", "country": "Testland", "city": "Alpha", "isp": "Net A", "timezone": "UTC"},
+    {"start": "10.0.2.0", "end": "10.0.2.127", "country": "Testland", "city": "Beta", "isp": "Net B", "timezone": "UTC"},
+    {"start": "2001:db8::", "end": "2001:db8::ffff", "country": "Sixland", "city": "", "isp": "Net C", "timezone": "Europe/Oslo"},
+]
+
+
+@pytest.fixture
+def geoip(tmp_path):
+    path = str(tmp_path / "geoip.idx")
+    assert write_geoip_file(path, RANGES) == 3
+    return GeoIPDatabase(path)
+
+
+def test_ipv4_keys_sort_as_ipv4_mapped_ipv6():
+    assert ip_key("1.2.3.4") == ip_key("::ffff:1.2.3.4")
+    assert ip_key("0.0.0.0") > ip_key("::1")
+    assert ip_key("255.255.255.255") < ip_key("2001:db8::")
+    assert ip_key("10.0.0.9") < ip_key("10.0.0.10")
+
+
+def test_range_boundaries(geoip):
+    assert geoip.lookup("10.0.0.0")["city"] == "Alpha"
+    assert geoip.lookup("10.0.0.255")["city"] == "Alpha"
+    assert geoip.lookup("10.0.2.127")["city"] == "Beta"
+    for uncovered in ("9.255.255.255", "10.0.1.0", "10.0.2.128", "255.255.255.255", "::1"):
+        assert geoip.lookup(uncovered) == {"ip": uncovered, "country": None, "city": None, "isp": None, "timezone": None}
+
+
+def test_ipv4_and_ipv6_share_one_file(geoip):
+    assert geoip.lookup("::ffff:10.0.2.5")["city"] == "Beta"
+    v6 = geoip.lookup("2001:db8::42")
+    assert v6 == {"ip": "2001:db8::42", "country": "Sixland", "city": None, "isp": "Net C", "timezone": "Europe/Oslo"}
+    assert geoip.lookup("2001:db8::1:0")["country"] is None
+    assert [r["isp"] for r in geoip.lookup_many(["10.0.0.1", "2001:db8::1"])] == ["Net A", "Net C"]
+
+
+def test_cached_answers_are_dropped_on_reload(tmp_path, geoip):
+    assert geoip.lookup("10.0.0.1")["city"] == "Alpha"
+    write_geoip_file(geoip.path, [{**RANGES[0], "city": "Gamma"}])
+    assert geoip.lookup("10.0.0.1")["city"] == "Alpha"
+
+    geoip.reload()
+    assert geoip.lookup("10.0.0.1")["city"] == "Gamma"
+    assert geoip.stats()["ranges"] == 1
+
+
+def test_invalid_addresses_raise(geoip):
+    for db in (geoip, GeoIPDatabase()):
+        with pytest.raises(ValueError):
+            db.lookup("not-an-ip")
+        with pytest.raises(ValueError):
+            db.lookup("10.0.0.256")
+
+
+def test_without_a_file_the_mock_record_is_returned():
+    db = GeoIPDatabase()
+    assert db.lookup("8.8.8.8") == {"ip": "8.8.8.8", **MOCK_RECORD}
+    assert db.stats()["source"] == "mock"
+
+
+def test_overlapping_and_inverted_ranges_are_refused(tmp_path):
+    path = str(tmp_path / "bad.idx")
+    with pytest.raises(ValueError, match="overlaps"):
+        write_geoip_file(path, [RANGES[0], {**RANGES[1], "start": "10.0.0.255"}])
+    with pytest.raises(ValueError, match="ends before"):
+        write_geoip_file(path, [{**RANGES[0], "start": "10.0.1.0"}])
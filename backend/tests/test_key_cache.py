@@ -0,0 +1,100 @@
+import asyncio
+from bson import ObjectId
+import pytest
+from app.utils import key_cache as key_cache_module
+from app.utils.key_cache import KeyCacheInvalidations, KeyContext, KeyContextCache, get_key_context, key_cache
+
+
+def context(user_id="u1", plan_id=None):
+    api_key = {"_id": ObjectId(), "user_id": user_id}
+    plan = {"_id": plan_id} if plan_id else None
+    return KeyContext(api_key, None, plan)
+
+
+def test_key_context_invalidation():
+    cache = KeyContextCache(10, ttl=60)
+    a, b, c = context("u1", "p1"), context("u1", "p2"), context("u2", "p1")
+    for key_hash, ctx in (("ha", a), ("hb", b), ("hc", c)):
+        cache.set(key_hash, ctx)
+
+    cache.invalidate_key(str(a.api_key["_id"]))
+    assert "ha" not in cache and len(cache) == 2
+
+    cache.invalidate_plan("p1")
+    assert "hc" not in cache and "hb" in cache
+
+    cache.invalidate_user("u1")
+    assert len(cache) == 0
+    assert cache.invalidations == 3
+    assert not (cache._by_key or cache._by_user or cache._by_plan)
+
+
+def test_key_context_eviction_drops_index_entries():
+    cache = KeyContextCache(1, ttl=60)
+    first = context("u1", "p1")
+    cache.set("ha", first)
+    cache.set("hb", context("u2"))
+
+    cache.invalidate_user("u1")
+    cache.invalidate_plan("p1")
+    assert cache.invalidations == 0
+    assert list(cache._by_user) == ["u2"]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("invalidate, cached", [
+    (lambda ctx: key_cache.invalidate_user("u1"), False),
+    (lambda ctx: key_cache.invalidate_key(str(ctx.api_key["_id"])), False),
+    (lambda ctx: key_cache.invalidate_plan("p1"), False),
+    (lambda ctx: key_cache.invalidate_user("someone-else"), True),
+])
+async def test_invalidation_during_a_load_is_not_undone(monkeypatch, invalidate, cached):
+    ctx = context("u1", "p1")
+    loading, release = asyncio.Event(), asyncio.Event()
+
+    async def load_key_context(key_hash):
+        loading.set()
+        await release.wait()
+        return ctx
+    monkeypatch.setattr(key_cache_module, "load_key_context", load_key_context)
+
+    stale_loads = key_cache.stale_loads
+    task = asyncio.create_task(get_key_context("h"))
+    await loading.wait()
+    invalidate(ctx)
+    release.set()
+
+    assert await task is ctx
+    assert ("h" in key_cache) is cached
+    assert key_cache.stale_loads - stale_loads == (0 if cached else 1)
+    assert not key_cache._invalidated
+
+    # The next load starts after the invalidation and is cached
+    assert await get_key_context("h") is ctx
+    assert "h" in key_cache
+
+
+@pytest.mark.anyio
+async def test_invalidations_reach_other_workers(db):
+    here, there = KeyContextCache(10, ttl=60), KeyContextCache(10, ttl=60)
+    here_feed, there_feed = KeyCacheInvalidations(here), KeyCacheInvalidations(there)
+    a, b = context("u1", "p1"), context("u2", "p2")
+    for cache in (here, there):
+        cache.set("ha", a)
+        cache.set("hb", b)
+
+    await here_feed.invalidate_user("u1")
+    assert "ha" not in here and "ha" in there
+
+    await there_feed.poll()
+    assert "ha" not in there and "hb" in there
+    assert there_feed.applied == 1
+
+    # Nothing is applied twice, and a worker skips its own entries
+    await there_feed.poll()
+    await here_feed.poll()
+    assert (there_feed.applied, here_feed.applied) == (1, 0)
+
+    await here_feed.invalidate_plan("p2")
+    await there_feed.poll()
+    assert len(there) == 0
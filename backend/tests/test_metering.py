@@ -0,0 +1,148 @@
+from datetime import datetime
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+from app.utils import metering
+from app.utils.metering import UsageRecorder
+from app.utils.rollups import DAILY, DAILY_GLOBAL
+
+pytestmark = pytest.mark.anyio
+
+
+def events(n=4):
+    now = datetime.utcnow()
+    return [
+        {"user_id": f"u{i % 2}", "api_key_id": "k", "endpoint": "/api/services/weather",
+         "timestamp": now, "status_code": 200 if i else 500}
+        for i in range(n)
+    ]
+
+
+class FaultyDb:
+    """Applies writes to `db`, failing the first `failures[collection]` of them after or before applying"""
+
+    def __init__(self, db, failures):
+        self._db = db
+        self.failures = failures
+        self.writes = []
+
+    def __getattr__(self, name):
+        return self[name]
+
+    def __getitem__(self, name):
+        collection, outer = self._db[name], self
+
+        class Faulty:
+            async def insert_many(self, docs, ordered=True):
+                return await outer._write(name, docs, lambda ops: collection.insert_many(ops, ordered=ordered))
+
+            async def bulk_write(self, ops, ordered=True):
+                return await outer._write(name, ops, lambda ops: collection.bulk_write(ops, ordered=ordered))
+
+        return Faulty()
+
+    async def _write(self, name, ops, apply):
+        self.writes.append((name, len(ops)))
+        fault = self.failures.get(name)
+        if fault:
+            self.failures[name] = fault[1:]
+            return await fault[0](ops, apply)
+        return await apply(ops)
+
+
+async def lost_reply(ops, apply):
+    """Stored, but the reply never arrived"""
+    await apply(ops)
+    raise AutoReconnect("connection reset")
+
+
+async def refused(ops, apply):
+    raise AutoReconnect("not primary")
+
+
+async def first_op_fails(ops, apply):
+    if len(ops) > 1:
+        await apply(ops[1:])
+    raise BulkWriteError({"writeErrors": [{"index": 0, "code": 112, "errmsg": "write conflict"}]})
+
+
+@pytest.fixture
+def recorder():
+    return UsageRecorder(flush_interval=0)
+
+
+async def totals(db, collection):
+    docs = await db[collection].find({}, {"_id": 0, "total": 1}).to_list(None)
+    return sum(d["total"] for d in docs)
+
+
+async def test_written_through_outside_the_app(db, recorder):
+    seen = []
+    recorder.add_listener(seen.append)
+    for event in events():
+        await recorder.record(event)
+
+    assert await db.usage_logs.count_documents({}) == 4
+    assert await totals(db, DAILY) == await totals(db, DAILY_GLOBAL) == 4
+    doc = await db[DAILY_GLOBAL].find_one()
+    assert (doc["success"], doc["failed"], doc["status"]) == (3, 1, {"200": 3, "500": 1})
+    assert len(seen) == 4
+
+
+async def test_queued_events_are_flushed_on_stop(db, recorder):
+    await recorder.start()
+    await recorder.record_many(events())
+    await recorder.stop()
+
+    assert await db.usage_logs.count_documents({}) == 4
+    assert recorder.stats()["flushed"] == 4
+
+
+async def test_retry_resumes_after_the_last_stored_step(db, recorder, monkeypatch):
+    faulty = FaultyDb(db, {DAILY_GLOBAL: [refused]})
+    monkeypatch.setattr(metering, "get_db", lambda: faulty)
+
+    await recorder.record_many(events())
+    assert [name for name, _ in faulty.writes] == ["usage_logs", DAILY, DAILY_GLOBAL, DAILY_GLOBAL]
+    assert await db.usage_logs.count_documents({}) == 4
+    assert await totals(db, DAILY) == await totals(db, DAILY_GLOBAL) == 4
+    assert (recorder.flushes, recorder.dropped) == (1, 0)
+
+
+async def test_partial_bulk_failure_retries_only_failed_ops(db, recorder, monkeypatch):
+    faulty = FaultyDb(db, {DAILY: [first_op_fails]})
+    monkeypatch.setattr(metering, "get_db", lambda: faulty)
+
+    await recorder.record_many(events())
+    assert faulty.writes == [("usage_logs", 4), (DAILY, 2), (DAILY, 1), (DAILY_GLOBAL, 1)]
+    assert await totals(db, DAILY) == await totals(db, DAILY_GLOBAL) == 4
+
+
+async def test_inserts_already_stored_are_not_duplicated(db, recorder, monkeypatch):
+    monkeypatch.setattr(metering, "get_db", lambda: FaultyDb(db, {"usage_logs": [lost_reply]}))
+    recorder._timeseries = False
+
+    await recorder.record_many(events())
+    assert await db.usage_logs.count_documents({}) == 4
+    assert await totals(db, DAILY) == 4
+    assert recorder.uncertain == 0
+
+
+async def test_ambiguous_timeseries_insert_is_not_retried(db, recorder, monkeypatch):
+    faulty = FaultyDb(db, {"usage_logs": [lost_reply]})
+    monkeypatch.setattr(metering, "get_db", lambda: faulty)
+    recorder._timeseries = True
+
+    await recorder.record_many(events())
+    assert [name for name, _ in faulty.writes].count("usage_logs") == 1
+    assert await db.usage_logs.count_documents({}) == 4
+    assert await totals(db, DAILY) == 4
+    assert recorder.uncertain == 4
+
+
+async def test_batch_is_dropped_after_max_attempts(db, recorder, monkeypatch):
+    monkeypatch.setattr(metering, "get_db", lambda: FaultyDb(db, {"usage_logs": [refused] * 3}))
+    recorder._timeseries = False
+
+    await recorder.record_many(events())
+    assert (recorder.flushes, recorder.dropped) == (0, 4)
+    assert await db.usage_logs.count_documents({}) == 0
@@ -0,0 +1,74 @@
+from datetime import datetime
+import json
+import httpx
+import pytest
+from app.dependencies import require_admin
+from app.main import app
+from app.utils import pagination
+from app.utils.pagination import NEXT_CURSOR_HEADER, fetch_page
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client(db):
+    app.dependency_overrides[require_admin] = lambda: {"role": "admin"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://gateway") as c:
+        yield c
+    app.dependency_overrides.pop(require_admin)
+
+
+async def add_users(db, n: int):
+    await db.users.insert_many([
+        {"email": f"user{i}@example.com", "role": "user", "is_active": True,
+         "created_at": datetime(2024, 1, 1), "hashed_password": "x"}
+        for i in range(n)
+    ])
+
+
+async def test_pages_follow_the_cursor_to_the_end(client, db):
+    await add_users(db, 5)
+    emails, after = [], None
+    while True:
+        params = {"limit": 2, **({"after": after} if after else {})}
+        r = await client.get("/api/admin/users", params=params)
+        assert r.status_code == 200
+        emails += [u["email"] for u in r.json()]
+        after = r.headers.get(NEXT_CURSOR_HEADER)
+        if after is None:
+            break
+        assert r.json()[-1]["id"] == after
+
+    assert emails == [f"user{i}@example.com" for i in range(5)]
+
+
+async def test_a_full_last_page_has_no_next_cursor(db):
+    await add_users(db, 4)
+    first, after = await fetch_page(db.users, {}, {"email": 1}, None, 2)
+    second, after = await fetch_page(db.users, {}, {"email": 1}, after, 2)
+
+    assert [u["email"] for u in first + second] == [f"user{i}@example.com" for i in range(4)]
+    assert after is None
+
+
+async def test_invalid_cursor_is_a_bad_request(client, db):
+    r = await client.get("/api/admin/users", params={"after": "not-an-id"})
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid cursor"
+
+
+async def test_ndjson_streams_every_document_in_chunks(client, db, monkeypatch):
+    monkeypatch.setattr(pagination, "STREAM_CHUNK_DOCS", 3)
+    await add_users(db, 7)
+    first = await db.users.find_one({"email": "user0@example.com"})
+
+    r = await client.get("/api/admin/users", params={"format": "ndjson"})
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    items = [json.loads(line) for line in r.text.splitlines()]
+    assert [u["email"] for u in items] == [f"user{i}@example.com" for i in range(7)]
+    assert items[0] == {"id": str(first["_id"]), "email": "user0@example.com", "role": "user",
+                        "is_active": True, "created_at": "2024-01-01T00:00:00"}
+    assert "hashed_password" not in items[0]
+
+    r = await client.get("/api/admin/users", params={"format": "ndjson", "after": items[4]["id"]})
+    assert [json.loads(line)["email"] for line in r.text.splitlines()] == ["user5@example.com", "user6@example.com"]
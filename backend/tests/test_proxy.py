@@ -0,0 +1,122 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import httpx
+import pytest
+from app.utils.proxy import UpstreamPool
+
+pytestmark = pytest.mark.anyio
+
+
+def upstream_app() -> FastAPI:
+    """Stand-in backend that reports what reached it"""
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        chunks = [chunk async for chunk in request.stream() if chunk]
+        return JSONResponse({
+            "chunks": len(chunks),
+            "body": b"".join(chunks).decode(),
+            "query": str(request.query_params),
+            "headers": sorted(request.headers.keys()),
+        }, headers={"X-Upstream": "yes", "Keep-Alive": "timeout=5"})
+
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            for i in range(3):
+                yield f"part{i};".encode()
+        return StreamingResponse(body(), media_type="text/plain", headers={"Connection": "close"})
+
+    return app
+
+
+class FailingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, error: Exception):
+        self.error = error
+
+    async def handle_async_request(self, request):
+        raise self.error
+
+
+def gateway_app(pool: UpstreamPool) -> FastAPI:
+    app = FastAPI()
+
+    @app.api_route("/proxy/{name}/{path:path}", methods=["GET", "POST"])
+    async def proxy(name: str, path: str, request: Request):
+        return await pool.forward(name, request, path)
+
+    return app
+
+
+@pytest.fixture
+async def pool():
+    pool = UpstreamPool()
+    pool.register("backend", "http://upstream", transport=httpx.ASGITransport(upstream_app()))
+    pool.register("down", "http://down", transport=FailingTransport(httpx.ConnectError("refused")))
+    pool.register("slow", "http://slow", transport=FailingTransport(httpx.ReadTimeout("timed out")))
+    yield pool
+    await pool.close()
+
+
+@pytest.fixture
+async def client(pool):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(gateway_app(pool)), base_url="http://gateway") as c:
+        yield c
+
+
+async def test_request_body_is_streamed_and_credentials_stripped(client):
+    async def body():
+        for chunk in (b"one,", b"two,", b"three"):
+            yield chunk
+
+    r = await client.post(
+        "/proxy/backend/echo", params={"q": "1"}, content=body(),
+        headers={"X-API-Key": "secret", "Authorization": "Bearer t", "Cookie": "s=1", "X-Trace": "abc"}
+    )
+    assert r.status_code == 200
+    echoed = r.json()
+    assert echoed["body"] == "one,two,three"
+    assert echoed["chunks"] == 3
+    assert echoed["query"] == "q=1"
+    assert "x-trace" in echoed["headers"]
+    assert not {"x-api-key", "authorization", "cookie"} & set(echoed["headers"])
+
+
+async def test_response_is_streamed_without_hop_by_hop_headers(client):
+    r = await client.post("/proxy/backend/echo", content=b"x")
+    assert r.headers["X-Upstream"] == "yes"
+    assert "keep-alive" not in r.headers
+
+    async with client.stream("GET", "/proxy/backend/stream") as r:
+        parts = [chunk async for chunk in r.aiter_bytes()]
+    assert b"".join(parts) == b"part0;part1;part2;"
+    assert r.headers["content-type"].startswith("text/plain")
+    assert "connection" not in r.headers
+
+
+@pytest.mark.parametrize("name, status_code, detail", [
+    ("down", 502, "Upstream unavailable"),
+    ("slow", 504, "Upstream timed out"),
+    ("missing", 404, "Service not found"),
+])
+async def test_upstream_failures(client, name, status_code, detail):
+    r = await client.get(f"/proxy/{name}/anything")
+    assert (r.status_code, r.json()["detail"]) == (status_code, detail)
+
+
+async def test_fetch_buffers_the_decoded_body(pool):
+    status_code, headers, body = await pool.fetch("backend", "/stream", {})
+    assert (status_code, body) == (200, b"part0;part1;part2;")
+    names = {k.lower() for k, _ in headers}
+    assert "content-length" not in names and "connection" not in names
+
+
+async def test_sync_keeps_unchanged_clients(pool):
+    client = pool._clients["backend"]
+    pool.sync({"backend": ("http://upstream", None), "new": ("http://new", 2.0)})
+
+    assert pool._clients["backend"] is client
+    assert "new" in pool and "down" not in pool
+    with pytest.raises(ValueError):
+        pool.register("new", "http://new")
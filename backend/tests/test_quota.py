@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta
+import asyncio
+from bson import ObjectId
+import pytest
+from app.models import SubscriptionCreate
+from app.routers import subscriptions
+from app.utils import quota
+from app.utils.quota import QuotaLeaser, QuotaResetSweeper, get_next_reset_date
+
+pytestmark = pytest.mark.anyio
+
+
+async def subscribe(db, usage_count=0, reset_at=None):
+    await db.subscriptions.insert_one({
+        "user_id": "u1", "plan_id": "p1", "usage_count": usage_count,
+        "reset_at": reset_at or get_next_reset_date()
+    })
+
+
+async def usage_count(db):
+    return (await db.subscriptions.find_one({"user_id": "u1"}))["usage_count"]
+
+
+class SlowSubscriptions:
+    """The subscriptions collection with a delay on every reservation"""
+
+    def __init__(self, collection, delay: float):
+        self._collection = collection
+        self.delay = delay
+        self.calls = 0
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return await self._collection.find_one_and_update(*args, **kwargs)
+
+
+class SlowDb:
+    def __init__(self, db, delay: float):
+        self._db = db
+        self.subscriptions = SlowSubscriptions(db.subscriptions, delay)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+def test_next_reset_date():
+    assert get_next_reset_date(datetime(2024, 5, 17, 12)) == datetime(2024, 6, 1)
+    assert get_next_reset_date(datetime(2024, 12, 31)) == datetime(2025, 1, 1)
+
+
+async def test_leasers_never_exceed_the_monthly_limit(db):
+    await subscribe(db)
+    leasers = [QuotaLeaser(lease_size=10) for _ in range(2)]
+
+    admitted = 0
+    for i in range(40):
+        admitted += await leasers[i % 2].reserve("u1", 25)
+    assert admitted == 25
+    assert await usage_count(db) == 25
+    assert sum(l.rejected for l in leasers) == 15
+
+
+async def test_concurrent_first_calls_share_one_block(db, monkeypatch):
+    await subscribe(db)
+    slow = SlowDb(db, delay=0.005)
+    monkeypatch.setattr(quota, "get_db", lambda: slow)
+    leaser = QuotaLeaser(lease_size=10)
+
+    results = await asyncio.gather(*(leaser.reserve("u1", 100) for _ in range(50)))
+    assert all(results)
+    assert slow.subscriptions.calls == 5
+    assert await usage_count(db) == 50
+    assert leaser.stats()["units_held"] == 0
+
+    # Still on full blocks afterwards, not one round trip per call
+    assert await leaser.reserve("u1", 100)
+    assert slow.subscriptions.calls == 6
+    assert await leaser.reserve("u1", 100)
+    assert slow.subscriptions.calls == 6
+
+
+async def test_concurrent_calls_near_the_limit_get_exactly_what_is_left(db, monkeypatch):
+    await subscribe(db, usage_count=93)
+    monkeypatch.setattr(quota, "get_db", lambda: SlowDb(db, delay=0.005))
+    leaser = QuotaLeaser(lease_size=10)
+
+    results = await asyncio.gather(*(leaser.reserve("u1", 100) for _ in range(20)))
+    assert sum(results) == 7
+    assert await usage_count(db) == 100
+
+
+async def test_units_are_spent_locally_and_returned_on_release(db):
+    await subscribe(db)
+    leaser = QuotaLeaser(lease_size=10)
+
+    for _ in range(3):
+        assert await leaser.reserve("u1", 100)
+    assert leaser.reservations == 1
+    assert await usage_count(db) == 10
+
+    await leaser.release()
+    assert await usage_count(db) == 3
+    assert leaser.stats()["leases"] == 0
+
+
+async def test_cost_larger_than_a_lease(db):
+    await subscribe(db, usage_count=80)
+    leaser = QuotaLeaser(lease_size=10)
+
+    assert await leaser.reserve("u1", 100, cost=15)
+    assert not await leaser.reserve("u1", 100, cost=15)
+    await leaser.release()
+    assert await usage_count(db) == 95
+
+
+async def test_expired_period_is_archived_and_restarted(db):
+    reset_at = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+    await subscribe(db, usage_count=50, reset_at=reset_at)
+    leaser = QuotaLeaser(lease_size=10)
+
+    assert await leaser.reserve("u1", 50)
+    assert leaser.resets == 1
+    sub = await db.subscriptions.find_one({"user_id": "u1"})
+    assert sub["usage_count"] == 10
+    assert sub["reset_at"] == get_next_reset_date()
+    archived = await db.usage_periods.find_one({"user_id": "u1"})
+    assert archived["usage_count"] == 50
+    assert archived["period_end"] == reset_at
+
+
+async def test_lease_from_a_closed_period_comes_off_its_record(db):
+    await subscribe(db, reset_at=datetime.utcnow() + timedelta(seconds=0.2))
+    first, second = QuotaLeaser(lease_size=10), QuotaLeaser(lease_size=10)
+    assert await first.reserve("u1", 100)  # holds 9 units of the closing period
+
+    await asyncio.sleep(0.25)
+    assert await second.reserve("u1", 100)  # rolls the period over
+    assert await first.reserve("u1", 100)
+
+    archived = await db.usage_periods.find_one({"user_id": "u1"})
+    assert archived["usage_count"] == 1
+    assert await usage_count(db) == 20
+
+    await first.release()
+    await second.release()
+    assert await usage_count(db) == 2
+
+
+async def test_plan_change_closes_the_period_for_every_worker(db, monkeypatch):
+    user_id, old_plan, new_plan = str(ObjectId()), ObjectId(), ObjectId()
+    await db.users.insert_one({"_id": ObjectId(user_id)})
+    await db.plans.insert_many([{"_id": old_plan}, {"_id": new_plan}])
+    await db.subscriptions.insert_one({"user_id": user_id, "plan_id": str(old_plan), "usage_count": 0,
+                                       "reset_at": get_next_reset_date(), "created_at": datetime.utcnow()})
+    here, elsewhere = QuotaLeaser(lease_size=10), QuotaLeaser(lease_size=10)
+    monkeypatch.setattr(subscriptions, "quota_leaser", here)
+    assert await here.reserve(user_id, 100)
+    assert await elsewhere.reserve(user_id, 100)
+
+    await subscriptions.assign_plan(SubscriptionCreate(user_id=user_id, plan_id=str(new_plan)), {})
+    # The other worker still spends and then returns units of the closed period
+    assert await elsewhere.reserve(user_id, 100)
+    await elsewhere.release()
+
+    archived = await db.usage_periods.find_one({"user_id": user_id})
+    assert (archived["plan_id"], archived["usage_count"]) == (str(old_plan), 3)
+    sub = await db.subscriptions.find_one({"user_id": user_id})
+    assert (sub["plan_id"], sub["usage_count"]) == (str(new_plan), 0)
+
+    assert await here.reserve(user_id, 100)
+    await here.release()
+    assert (await db.subscriptions.find_one({"user_id": user_id}))["usage_count"] == 1
+
+
+async def test_sweeper_resets_untouched_subscriptions(db):
+    await subscribe(db, usage_count=7, reset_at=datetime.utcnow() - timedelta(days=1))
+    sweeper = QuotaResetSweeper(batch_size=1, pause=0)
+
+    await sweeper.sweep()
+    assert sweeper.resets == 1
+    assert await usage_count(db) == 0
+    assert (await db.usage_periods.find_one({"user_id": "u1"}))["usage_count"] == 7
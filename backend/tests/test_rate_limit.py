@@ -0,0 +1,155 @@
+import asyncio
+import pytest
+from app.utils import rate_limit
+from app.utils.rate_limit import MongoRateLimiter, TokenBucketLimiter
+
+pytestmark = pytest.mark.anyio
+
+NOW = 1000 * 60.0 + 5  # 5s into window 1000
+
+
+async def admitted(limiters, key, limit, calls, now=NOW):
+    allowed = 0
+    for i in range(calls):
+        result = await limiters[i % len(limiters)].acquire(key, limit, now=now)
+        allowed += result.allowed
+    return allowed
+
+
+async def test_instances_sharing_a_db_never_admit_more_than_the_limit(db):
+    limiters = [MongoRateLimiter(lease_size=10) for _ in range(3)]
+
+    assert await admitted(limiters, "user", 25, 60) == 25
+    assert (await db.rate_limits.find_one({"_id": "user:1000"}))["count"] >= 25
+
+
+class SlowDb:
+    """Delays every reservation, so concurrent requests overlap"""
+
+    def __init__(self, db, delay: float):
+        self._db = db
+        self.delay = delay
+        self.calls = 0
+
+    def __getitem__(self, name):
+        collection = self._db[name]
+        outer = self
+
+        class Slow:
+            def __getattr__(self, attr):
+                return getattr(collection, attr)
+
+            async def find_one_and_update(self, *args, **kwargs):
+                outer.calls += 1
+                await asyncio.sleep(outer.delay)
+                return await collection.find_one_and_update(*args, **kwargs)
+
+        return Slow()
+
+
+@pytest.mark.parametrize("limit, admitted, round_trips", [(100, 50, 5), (25, 25, 3)])
+async def test_a_burst_on_one_instance_shares_its_leases(db, monkeypatch, limit, admitted, round_trips):
+    slow = SlowDb(db, delay=0.005)
+    monkeypatch.setattr(rate_limit, "get_db", lambda: slow)
+    limiter = MongoRateLimiter(lease_size=10)
+
+    results = await asyncio.gather(*(limiter.acquire("user", limit, now=NOW) for _ in range(50)))
+    assert sum(r.allowed for r in results) == admitted
+    assert slow.calls == round_trips
+    assert (await db.rate_limits.find_one({"_id": "user:1000"}))["count"] == round_trips * 10
+
+
+async def test_exact_admission_at_the_limit(db):
+    limiters = [MongoRateLimiter(lease_size=1) for _ in range(2)]
+
+    assert await admitted(limiters, "user", 7, 7) == 7
+    result = await limiters[0].acquire("user", 7, now=NOW)
+    assert not result.allowed
+    assert result.remaining == 0
+    assert result.retry_after == pytest.approx(55)
+
+
+async def test_exhausted_window_rejects_without_io(db):
+    limiter = MongoRateLimiter(lease_size=5)
+    assert await admitted([limiter], "user", 5, 5) == 5
+    await limiter.acquire("user", 5, now=NOW)  # learns the window is spent
+    reservations = limiter.reservations
+
+    assert await admitted([limiter], "user", 5, 10) == 0
+    assert limiter.reservations == reservations
+    assert limiter.rejected == 11
+
+
+async def test_window_rollover(db):
+    limiter = MongoRateLimiter(lease_size=10)
+    assert await admitted([limiter], "user", 3, 5) == 3
+
+    later = NOW + 60
+    result = await limiter.acquire("user", 3, now=later)
+    assert result.allowed
+    assert result.remaining == 2
+    assert result.reset_after == pytest.approx(55)
+    assert await db.rate_limits.count_documents({}) == 2
+    assert (await db.rate_limits.find_one({"_id": "user:1001"}))["count"] == 3
+
+
+async def test_lease_accounting(db):
+    limiter = MongoRateLimiter(lease_size=10)
+
+    result = await limiter.acquire("user", 100, now=NOW)
+    assert result.remaining == 99
+    assert limiter.reservations == 1
+    assert (await db.rate_limits.find_one({"_id": "user:1000"}))["count"] == 10
+
+    assert await admitted([limiter], "user", 100, 9) == 9
+    assert limiter.reservations == 1
+
+    await limiter.acquire("user", 100, now=NOW)
+    assert limiter.reservations == 2
+    assert (await db.rate_limits.find_one({"_id": "user:1000"}))["count"] == 20
+
+    # A cost above the lease size reserves the whole cost at once
+    result = await limiter.acquire("user", 100, cost=15, now=NOW)
+    assert result.allowed
+    assert limiter.reservations == 3
+    assert (await db.rate_limits.find_one({"_id": "user:1000"}))["count"] == 35
+
+
+async def test_tokens_leased_by_another_instance_are_not_reissued(db):
+    first, second = MongoRateLimiter(lease_size=10), MongoRateLimiter(lease_size=10)
+    assert (await first.acquire("user", 15, now=NOW)).allowed  # leases 10, holds 9
+
+    assert await admitted([second], "user", 15, 10) == 5
+    assert await admitted([first], "user", 15, 10) == 9
+
+
+async def test_keys_are_counted_separately(db):
+    limiter = MongoRateLimiter(lease_size=10)
+    assert await admitted([limiter], "a", 2, 3) == 2
+    assert await admitted([limiter], "b", 2, 3) == 2
+    limiter.reset("a")
+    assert limiter.stats()["leases"] == 1
+
+
+def test_token_bucket_refills_at_the_limit_rate():
+    limiter = TokenBucketLimiter()
+    assert all(limiter.hit("user", 60, now=0.0).allowed for _ in range(60))
+
+    rejected = limiter.hit("user", 60, now=0.0)
+    assert not rejected.allowed
+    assert rejected.retry_after == pytest.approx(1.0)
+    assert rejected.headers()["Retry-After"] == "1"
+
+    assert limiter.hit("user", 60, now=1.0).allowed
+    assert not limiter.hit("user", 60, now=1.0).allowed
+    assert limiter.hit("user", 60, cost=5, now=6.0).allowed
+
+
+def test_token_bucket_drops_idle_buckets():
+    limiter = TokenBucketLimiter(max_buckets=2)
+    for i, key in enumerate("abc"):
+        limiter.hit(key, 10, now=float(i))
+    assert limiter.stats()["buckets"] == 2
+
+    limiter.hit("d", 10, now=100.0)
+    assert limiter.stats()["buckets"] == 1
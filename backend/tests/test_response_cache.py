@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from app.utils.response_cache import ResponseCache
+
+
+def loader(body=b"ok", status_code=200, headers=(), calls=None, delay=0.0):
+    async def load():
+        if calls is not None:
+            calls.append(1)
+        await asyncio.sleep(delay)
+        return status_code, list(headers), body
+    return load
+
+
+@pytest.mark.anyio
+async def test_concurrent_misses_share_one_load(clock):
+    cache = ResponseCache(10, 1000)
+    calls = []
+
+    results = await asyncio.gather(*(cache.get("k", 10, loader(calls=calls, delay=0.01)) for _ in range(5)))
+    assert len(calls) == 1
+    assert cache.coalesced == 4
+    assert {state for _, state in results} == {"MISS"}
+
+    entry, state = await cache.get("k", 10, loader(calls=calls))
+    assert (entry.body, state) == (b"ok", "HIT")
+    assert len(calls) == 1
+
+
+@pytest.mark.anyio
+async def test_stale_entry_is_served_while_refreshing(clock):
+    cache = ResponseCache(10, 1000, stale_seconds=30)
+    await cache.get("k", 10, loader(b"old"))
+
+    clock.now += 15
+    entry, state = await cache.get("k", 10, loader(b"new"))
+    assert (entry.body, state) == (b"old", "STALE")
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    entry, state = await cache.get("k", 10, loader(b"newer"))
+    assert (entry.body, state) == (b"new", "HIT")
+
+    clock.now += 45
+    entry, state = await cache.get("k", 10, loader(b"newest"))
+    assert (entry.body, state) == (b"newest", "MISS")
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("status_code, headers", [
+    (500, []),
+    (200, [("Cache-Control", "no-store")]),
+    (200, [("cache-control", "private, max-age=60")]),
+])
+async def test_uncacheable_responses_are_not_stored(clock, status_code, headers):
+    cache = ResponseCache(10, 1000)
+    calls = []
+
+    for _ in range(2):
+        entry, state = await cache.get("k", 10, loader(status_code=status_code, headers=headers, calls=calls))
+        assert (entry.status_code, state) == (status_code, "MISS")
+    assert len(calls) == 2
@@ -0,0 +1,40 @@
+import pytest
+from app.utils.builtin_services import DEFAULT_SERVICES
+from app.utils.service_registry import ServiceRegistry
+
+pytestmark = pytest.mark.anyio
+
+
+async def service_names(db):
+    return {s["name"] for s in await db.services.find({}, {"name": 1}).to_list(None)}
+
+
+async def test_builtins_are_seeded_once(db):
+    registry = ServiceRegistry()
+    await registry.seed()
+    assert await service_names(db) == {s["name"] for s in DEFAULT_SERVICES}
+
+    await db.services.delete_one({"name": "random-fact"})
+    await registry.seed()
+    assert "random-fact" not in await service_names(db)
+
+
+async def test_existing_databases_are_not_reseeded(db):
+    await db.services.insert_one({"name": "custom", "upstream": "http://custom", "enabled": True})
+    await db.registry_versions.insert_one({"_id": "services", "version": 3})
+
+    registry = ServiceRegistry()
+    await registry.seed()
+    assert await service_names(db) == {"custom"}
+    assert await registry._current_version() == 3
+
+
+async def test_load_builds_the_route_table(db):
+    registry = ServiceRegistry()
+    await registry.seed()
+    await db.services.update_one({"name": "weather"}, {"$set": {"enabled": False}})
+    await registry.load()
+
+    assert registry.get("weather") is None
+    assert registry.get("currency").endpoint == "/api/services/currency"
+    assert registry.version == 0
@@ -0,0 +1,29 @@
+import pytest
+from app.utils import usage_storage
+from app.utils.usage_storage import TIMESTAMP_INDEX, TTL_INDEX, ensure_usage_logs
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def regular_layout(monkeypatch):
+    # mongomock has no listCollections; the layout check is not what's under test here
+    async def is_timeseries(db):
+        return False
+    monkeypatch.setattr(usage_storage, "is_timeseries", is_timeseries)
+
+
+async def timestamp_indexes(db):
+    indexes = await db.usage_logs.index_information()
+    return {name: info.get("expireAfterSeconds") for name, info in indexes.items() if info["key"] == [("timestamp", 1)]}
+
+
+async def test_regular_layout_always_has_one_timestamp_index(db, regular_layout):
+    await ensure_usage_logs(db)
+    assert await timestamp_indexes(db) == {TIMESTAMP_INDEX: None}
+
+    await ensure_usage_logs(db, ttl_days=30)
+    assert await timestamp_indexes(db) == {TTL_INDEX: 30 * 86400}
+
+    await ensure_usage_logs(db)
+    assert await timestamp_indexes(db) == {TIMESTAMP_INDEX: None}
@@ -0,0 +1,71 @@
+from datetime import datetime
+from bson import ObjectId
+import asyncio
+import pytest
+from app.utils.quota import get_next_reset_date
+from app.utils.rollups import DAILY, day_of
+from app.utils.usage_stream import UsageStream
+
+pytestmark = pytest.mark.anyio
+
+
+def event(endpoint="/api/services/weather", status_code=200, **fields):
+    return {"user_id": "u1", "endpoint": endpoint, "status_code": status_code,
+            "timestamp": datetime.utcnow(), **fields}
+
+
+@pytest.fixture
+async def stream(db):
+    plan = await db.plans.insert_one({"monthly_limit": 10})
+    await db.subscriptions.insert_one({"user_id": "u1", "plan_id": str(plan.inserted_id), "usage_count": 4,
+                                       "reset_at": get_next_reset_date()})
+    await db[DAILY].insert_one({"_id": ObjectId(), "user_id": "u1", "day": day_of(datetime.utcnow()),
+                                "endpoint": "/api/services/weather", "total": 3, "success": 2})
+    stream = UsageStream(interval=0.01, queue_size=2, refresh_seconds=60)
+    stream._task = asyncio.create_task(stream._run())
+    yield stream
+    stream._task.cancel()
+
+
+async def test_subscribe_starts_from_rollups_and_subscription(stream):
+    queue = await stream.subscribe("u1")
+    snapshot = queue.get_nowait()
+
+    assert (snapshot["total_requests"], snapshot["successful_requests"], snapshot["failed_requests"]) == (3, 2, 1)
+    assert snapshot["requests_by_endpoint"] == {"/api/services/weather": 3}
+    assert (snapshot["quota"]["used"], snapshot["quota"]["remaining"]) == (4, 6)
+
+
+async def test_events_move_counters_and_quota_together(stream):
+    queue = await stream.subscribe("u1")
+    queue.get_nowait()
+
+    stream.publish([event(), event("/api/services/batch", 404), event(items=5), {**event(), "user_id": "u2"}])
+    snapshot = await asyncio.wait_for(queue.get(), 1)
+
+    assert (snapshot["total_requests"], snapshot["successful_requests"]) == (10, 8)
+    assert snapshot["requests_by_endpoint"] == {"/api/services/weather": 9, "/api/services/batch": 1}
+    assert (snapshot["quota"]["used"], snapshot["quota"]["remaining"]) == (11, 0)
+    assert stream.updates_sent == 1
+
+
+async def test_slow_readers_keep_the_latest_snapshots(stream):
+    queue = await stream.subscribe("u1")
+    for _ in range(3):
+        stream.publish([event()])
+        await asyncio.sleep(0.03)
+
+    assert queue.qsize() == 2
+    assert stream.dropped == 2
+    latest = [queue.get_nowait()["total_requests"] for _ in range(2)]
+    assert latest == [5, 6]
+
+
+async def test_last_unsubscribe_drops_the_feed(stream):
+    first, second = await stream.subscribe("u1"), await stream.subscribe("u1")
+    assert stream.stats()["subscribers"] == 2
+
+    stream.unsubscribe("u1", first)
+    stream.unsubscribe("u1", second)
+    assert stream.stats()["users"] == 0
+    stream.publish([event()])
@@ -0,0 +1,86 @@
+import struct
+import pytest
+from app.utils.mmap_index import MappedRecords, write_records
+from app.utils.weather import NAME_SIZE, WEATHER_MAGIC, WEATHER_RECORD, WeatherIndex, write_weather_file
+
+CITIES = [
+    {"city": "London", "temp": 12, "condition": "Cloudy"},
+    {"city": "São Paulo", "temp": 27, "condition": "Sunny"},
+    {"city": "Zürich", "temp": -3, "condition": "Snow"},
+    {"city": "Austin", "temp": 30, "condition": "Clear"},
+]
+
+
+@pytest.fixture
+def weather_file(tmp_path):
+    path = str(tmp_path / "weather.idx")
+    assert write_weather_file(path, CITIES) == 4
+    return path
+
+
+@pytest.mark.parametrize("path", [False, True])
+def test_lookups_ignore_case_and_whitespace(weather_file, path):
+    index = WeatherIndex(CITIES, weather_file if path else None)
+
+    assert index.get(" london ") == {"city": "London", "temp": 12, "condition": "Cloudy"}
+    assert index.get("SÃO PAULO")["temp"] == 27
+    assert index.get("zürich")["temp"] == -3
+    assert index.get("Paris") is None
+    assert index.get_many(["austin", "nowhere"]) == {"austin": CITIES[3], "nowhere": None}
+    assert len(index) == 4
+
+
+def test_every_record_is_found_by_binary_search(tmp_path):
+    path = str(tmp_path / "weather.idx")
+    cities = [{"city": f"City {i:04d}", "temp": i % 40, "condition": "Fair"} for i in range(1000)]
+    write_weather_file(path, reversed(cities))
+    index = WeatherIndex([], path)
+
+    assert all(index.get(c["city"]) == c for c in cities)
+    assert index.get("City 1000") is None
+    assert index.get("A" * (NAME_SIZE + 5)) is None
+    assert index.sample() in cities
+
+
+def test_reload_picks_up_a_rebuilt_file(weather_file):
+    index = WeatherIndex([], weather_file)
+    write_weather_file(weather_file, [{"city": "Oslo", "temp": 1, "condition": "Rain"}])
+    assert index.get("London") is not None
+
+    index.reload()
+    assert index.get("London") is None
+    assert index.get("oslo")["condition"] == "Rain"
+    assert index.stats()["reloads"] == 2
+
+
+def test_bad_files_are_rejected(tmp_path, weather_file):
+    with pytest.raises(ValueError, match="not a"):
+        MappedRecords(weather_file, b"OTHERIDX", WEATHER_RECORD, NAME_SIZE)
+
+    with open(weather_file, "rb") as f:
+        data = f.read()
+    truncated = tmp_path / "truncated.idx"
+    truncated.write_bytes(data[:-1])
+    with pytest.raises(ValueError, match="truncated"):
+        MappedRecords(str(truncated), WEATHER_MAGIC, WEATHER_RECORD, NAME_SIZE)
+
+
+def test_duplicate_keys_and_long_names_are_refused(tmp_path):
+    with pytest.raises(ValueError, match="Duplicate"):
+        write_weather_file(str(tmp_path / "dup.idx"), [CITIES[0], {**CITIES[0], "city": "LONDON"}])
+    with pytest.raises(ValueError, match="longer"):
+        write_weather_file(str(tmp_path / "long.idx"), [{**CITIES[0], "city": "x" * (NAME_SIZE + 1)}])
+
+
+def test_bisect_over_duplicate_free_keys(tmp_path):
+    record = struct.Struct("<4sI")
+    path = str(tmp_path / "ints.idx")
+    write_records(path, b"TESTIDX1", record, 4, [(k.to_bytes(4, "big"), k) for k in range(0, 100, 10)])
+    records = MappedRecords(path, b"TESTIDX1", record, 4)
+
+    assert records.bisect_left((30).to_bytes(4, "big")) == 3
+    assert records.bisect_right((30).to_bytes(4, "big")) == 4
+    assert records.bisect_right((35).to_bytes(4, "big")) == 4
+    assert records.find((35).to_bytes(4, "big")) is None
+    assert records.find((90).to_bytes(4, "big")) == ((90).to_bytes(4, "big"), 90)
+    records.close()
@@ -6,6 +6,7 @@ export interface Plan {
   monthly_limit: number
   rate_limit_per_minute: number
   allowed_services: string[]
+  batch_metering?: 'call' | 'item'
   created_at: string
 }
 